@@ -1,3 +1,7 @@
+import json
+import os
+import time
+
 SRD_CONF_SAMPLERATE = 0
 OUTPUT_ANN = 0
 OUTPUT_PYTHON = 1
@@ -19,6 +23,7 @@ class Decoder:
 	binary = ()
 	samplenum = 0
 	matched = ()
+	binary_outputs = ()
 
 	def has_channel(self, channel):
 		return self.cObj.HasChannel(channel)
@@ -26,11 +31,285 @@ class Decoder:
 	def wait(self, conds = None):
 		result = self.cObj.Wait(conds)
 		if result == None:
-			raise Exception("Terminated")
+			# The input has ended (or decoding was stopped). Decoders can catch
+			# EOFError to put what they gathered over the whole input.
+			raise EOFError("Terminated")
 		return result
 
 	def put(self, startsample, endsample, output_id, data):
 		self.cObj.Put(startsample, endsample, output_id, data)
 
 	def register(self, output_type, proto_id = None, meta = None):
-		return self.cObj.Register(output_type, meta)
\ No newline at end of file
+		output_id = self.cObj.Register(output_type, meta)
+		if output_type == OUTPUT_BINARY:
+			self.binary_outputs = self.binary_outputs + (output_id,)
+		return output_id
+
+	def is_subscribed(self, output_id):
+		"""
+		Whether anything consumes the values put to a registered output.
+		Hosts that cannot tell (the desktop application) are assumed to
+		consume the annotations and OUTPUT_PYTHON values, but not the binary
+		outputs, so pcapng streams and other dumps are only built for hosts
+		that ask for them.
+		"""
+		subscribed = getattr(self.cObj, "IsSubscribed", None)
+		if subscribed == None:
+			return output_id not in self.binary_outputs
+		return bool(subscribed(output_id))
+
+	def subscribed_annotations(self):
+		"""
+		The annotation classes that are kept: the classes of the annotation
+		rows that are shown, none at all when decoding headless. Hosts that
+		cannot tell keep all.
+
+		Formatting the texts of annotations often costs more than decoding
+		the bits behind them. A decoder can fetch this set (and the
+		is_subscribed() state of its other outputs) once when decoding
+		starts, and skip building the annotations of the other classes and
+		the values of outputs nobody consumes. What the consumers get is the
+		same either way.
+		"""
+		subscribed = getattr(self.cObj, "SubscribedAnnotations", None)
+		if subscribed == None:
+			return set(range(len(self.annotations)))
+		return set(subscribed())
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		if _profiling != None:
+			_wrap_decode(cls)
+
+# Profiling
+#
+# Opt-in instrumentation, enabled with enable_profiling() or by setting the
+# SIGROKDECODE_PROFILE environment variable to a directory before this module
+# is imported (SIGROKDECODE_CPROFILE=1 adds a cProfile dump per run).
+# While enabled, wait(), put() and register() are replaced by counting
+# versions and the decode() method of every decoder is timed, splitting the
+# wall time between the host (the cObj calls) and the decoder's own code.
+# Disabled, the shim runs exactly the methods above.
+
+OUTPUT_NAMES = { OUTPUT_ANN: "ann", OUTPUT_PYTHON: "python", OUTPUT_BINARY: "binary", OUTPUT_LOGIC: "logic", OUTPUT_META: "meta" }
+
+_profiling = None
+
+class DecoderStats:
+
+	def __init__(self, decoder):
+		self.cls = type(decoder)
+		self.decoder = getattr(self.cls, "id", self.cls.__module__)
+		self.waits = 0
+		self.samples_skipped = 0
+		self.max_skip = 0
+		self.skip_histogram = {}
+		self.condition_kinds = {}
+		self.output_types = {}
+		self.puts = {}
+		self.annotation_classes = {}
+		self.host_time = 0.0
+		self.decoder_time = 0.0
+
+	def report(self):
+		annotations = self.cls.annotations
+		classes = {}
+		for index, count in sorted(self.annotation_classes.items(), key = lambda item: str(item[0])):
+			name = annotations[index][0] if isinstance(index, int) and 0 <= index < len(annotations) else str(index)
+			classes[name] = count
+		return {
+			"decoder": self.decoder,
+			"waits": self.waits,
+			"samples_skipped": self.samples_skipped,
+			"mean_skip": self.samples_skipped / self.waits if self.waits else 0,
+			"max_skip": self.max_skip,
+			"skip_histogram": { str(k): v for k, v in sorted(self.skip_histogram.items()) },
+			"condition_kinds": dict(sorted(self.condition_kinds.items())),
+			"puts": { OUTPUT_NAMES.get(k, "unknown"): v for k, v in self.puts.items() },
+			"annotation_classes": classes,
+			"host_seconds": self.host_time,
+			"decoder_seconds": self.decoder_time,
+			"wall_seconds": self.host_time + self.decoder_time,
+		}
+
+class _Profiling:
+
+	def __init__(self, directory, cprofile):
+		self.directory = directory
+		self.cprofile = cprofile
+		self.runs = []
+		self.stack = []
+		self.last = time.perf_counter()
+		self.profiler = None
+		self.dumps = 0
+
+	def stats(self, decoder):
+		stats = decoder.__dict__.get("_profile_stats")
+		if stats == None:
+			stats = decoder._profile_stats = DecoderStats(decoder)
+			self.runs.append(stats)
+		return stats
+
+	# Time is charged to whatever is on top of the stack, so a stacked
+	# decoder fed from inside a put() is not counted as host time of the
+	# decoder below it.
+
+	def enter(self, stats, host):
+		self.charge()
+		self.stack.append((stats, host))
+
+	def leave(self):
+		self.charge()
+		self.stack.pop()
+
+	def charge(self):
+		now = time.perf_counter()
+		if self.stack:
+			stats, host = self.stack[-1]
+			if host:
+				stats.host_time += now - self.last
+			else:
+				stats.decoder_time += now - self.last
+		self.last = now
+
+	def begin_run(self):
+		if self.cprofile and self.profiler == None:
+			import cProfile
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+
+	def end_run(self, stats):
+		if self.profiler != None:
+			self.profiler.disable()
+			if self.directory:
+				self.dumps += 1
+				self.profiler.dump_stats(os.path.join(self.directory, "{}-{}-{}.prof".format(stats.decoder, os.getpid(), self.dumps)))
+			self.profiler = None
+		if self.directory:
+			write_profile_report(os.path.join(self.directory, "sigrokdecode-profile-{}.json".format(os.getpid())))
+
+def _count_conditions(stats, conds):
+	kinds = stats.condition_kinds
+	if conds == None:
+		kinds["skip"] = kinds.get("skip", 0) + 1
+		return
+	if isinstance(conds, dict):
+		conds = [conds]
+	for cond in conds:
+		for key, value in cond.items():
+			kind = "skip" if key == "skip" else value
+			kinds[kind] = kinds.get(kind, 0) + 1
+
+def _profiled_wait(self, conds = None):
+	stats = _profiling.stats(self)
+	_count_conditions(stats, conds)
+	before = self.samplenum
+	_profiling.enter(stats, True)
+	try:
+		result = self.cObj.Wait(conds)
+	finally:
+		_profiling.leave()
+	stats.waits += 1
+	if result == None:
+		raise EOFError("Terminated")
+	skipped = max(0, self.samplenum - before)
+	stats.samples_skipped += skipped
+	if skipped > stats.max_skip:
+		stats.max_skip = skipped
+	bucket = 1 << (skipped.bit_length() - 1) if skipped else 0
+	stats.skip_histogram[bucket] = stats.skip_histogram.get(bucket, 0) + 1
+	return result
+
+def _profiled_put(self, startsample, endsample, output_id, data):
+	stats = _profiling.stats(self)
+	output_type = stats.output_types.get(output_id)
+	stats.puts[output_type] = stats.puts.get(output_type, 0) + 1
+	if output_type == OUTPUT_ANN:
+		stats.annotation_classes[data[0]] = stats.annotation_classes.get(data[0], 0) + 1
+	_profiling.enter(stats, True)
+	try:
+		self.cObj.Put(startsample, endsample, output_id, data)
+	finally:
+		_profiling.leave()
+
+def _profiled_register(self, output_type, proto_id = None, meta = None):
+	output_id = _plain["register"](self, output_type, proto_id, meta)
+	_profiling.stats(self).output_types[output_id] = output_type
+	return output_id
+
+def _profiled_decode(decode):
+	def wrapper(self, *args):
+		if _profiling == None:
+			return decode(self, *args)
+		stats = _profiling.stats(self)
+		# A decode() without arguments runs a logic decoder over the whole
+		# capture; it delimits the runs that are reported and profiled.
+		run = not _profiling.stack and not args
+		if run:
+			_profiling.begin_run()
+		_profiling.enter(stats, False)
+		try:
+			return decode(self, *args)
+		finally:
+			_profiling.leave()
+			if run:
+				_profiling.end_run(stats)
+	wrapper.__wrapped__ = decode
+	return wrapper
+
+def _wrap_decode(cls):
+	decode = cls.__dict__.get("decode")
+	if decode != None and not hasattr(decode, "__wrapped__"):
+		cls.decode = _profiled_decode(decode)
+
+def _unwrap_decode(cls):
+	decode = cls.__dict__.get("decode")
+	if decode != None and hasattr(decode, "__wrapped__"):
+		cls.decode = decode.__wrapped__
+
+def _subclasses(cls):
+	for sub in cls.__subclasses__():
+		yield sub
+		yield from _subclasses(sub)
+
+_plain = { "wait": Decoder.wait, "put": Decoder.put, "register": Decoder.register }
+
+def enable_profiling(directory = None, cprofile = False):
+	"""
+	Start collecting statistics for every decoder instance. With a
+	directory, a JSON report is written there after each logic decoder run,
+	and with cprofile also a cProfile dump of the run.
+	"""
+	global _profiling
+	if directory:
+		os.makedirs(directory, exist_ok = True)
+	_profiling = _Profiling(directory, cprofile)
+	Decoder.wait = _profiled_wait
+	Decoder.put = _profiled_put
+	Decoder.register = _profiled_register
+	for cls in _subclasses(Decoder):
+		_wrap_decode(cls)
+
+def disable_profiling():
+	global _profiling
+	_profiling = None
+	for name, method in _plain.items():
+		setattr(Decoder, name, method)
+	for cls in _subclasses(Decoder):
+		_unwrap_decode(cls)
+
+def profiling_enabled():
+	return _profiling != None
+
+def profile_report():
+	"""Statistics of every decoder instance seen since profiling was enabled."""
+	if _profiling == None:
+		return { "runs": [] }
+	return { "runs": [stats.report() for stats in _profiling.runs] }
+
+def write_profile_report(path):
+	with open(path, "w") as f:
+		json.dump(profile_report(), f, indent = 2)
+
+if os.environ.get("SIGROKDECODE_PROFILE"):
+	enable_profiling(os.environ["SIGROKDECODE_PROFILE"], os.environ.get("SIGROKDECODE_CPROFILE", "") not in ("", "0"))
\ No newline at end of file
@@ -21,10 +21,12 @@
 # - Support the optional RESET# pin, detect cold and warm reset.
 # - Split slot values into audio samples of their respective width and
 #   frequency (either on user provided parameters, or from inspection of
-#   decoded register access).
+#   decoded register access). The WAV output takes all valid audio slots
+#   as 20bit samples at the measured frame rate.
 
 import sigrokdecode as srd
 from common.srdhelper import SrdIntEnum
+from common.wav import WavStream
 
 class ChannelError(Exception):
     pass
@@ -36,7 +38,7 @@ a = 'BITS_OUT BITS_IN SLOT_RAW_OUT SLOT_RAW_IN WARN ERROR'.split() + \
     ['SLOT_OUT_' + s for s in slots] + ['SLOT_IN_' + s for s in slots]
 Ann = SrdIntEnum.from_list('Ann', a)
 
-Bin = SrdIntEnum.from_str('Bin', 'FRAME_OUT FRAME_IN SLOT_RAW_OUT SLOT_RAW_IN')
+Bin = SrdIntEnum.from_str('Bin', 'FRAME_OUT FRAME_IN SLOT_RAW_OUT SLOT_RAW_IN WAV_OUT WAV_IN')
 
 class Decoder(srd.Decoder):
     api_version = 3
@@ -111,6 +113,8 @@ class Decoder(srd.Decoder):
         ('frame-in', 'Frame bits, input data'),
         ('slot-raw-out', 'Raw slot bits, output data'),
         ('slot-raw-in', 'Raw slot bits, input data'),
+        ('wav-out', 'Audio slots, output data (WAV)'),
+        ('wav-in', 'Audio slots, input data (WAV)'),
         # TODO: Which (other) binary classes to implement?
         # - Are binary annotations per audio slot useful?
         # - Assume 20bit per slot, in 24bit units? Or assume 16bit
@@ -143,6 +147,9 @@ class Decoder(srd.Decoder):
             1: self.handle_slot_01,
             2: self.handle_slot_02,
         }
+        self.wav = {True: WavStream(), False: WavStream()}
+        self.wav_slots = {True: None, False: None}
+        self.binary_used = False
 
     def start(self):
         self.out_binary = self.register(srd.OUTPUT_BINARY)
@@ -151,6 +158,8 @@ class Decoder(srd.Decoder):
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            for wav in self.wav.values():
+                wav.samplerate = value
 
     def bits_to_int(self, bits):
         # Convert MSB-first bit sequence to integer value.
@@ -201,18 +210,43 @@ class Decoder(srd.Decoder):
         data = self.bits_to_bin_ann(data)
         self.putb(0, count, Bin.FRAME_IN, data)
 
+    def flush_frame_audio(self):
+        # Emit the valid audio slots (3 to 11) of a frame as one frame of
+        # a WAV stream per direction. The slots of the first frame with
+        # audio data are the channels of the stream, slots that are not
+        # valid in later frames are silent.
+        for is_out, cls in ((True, Bin.WAV_OUT), (False, Bin.WAV_IN)):
+            audio = self.frame_audio[is_out]
+            if not audio:
+                continue
+            if self.wav_slots[is_out] is None:
+                self.wav_slots[is_out] = sorted(audio)
+            values = [audio.get(idx, 0) for idx in self.wav_slots[is_out]]
+            data = self.wav[is_out].frame(self.frame_ss_list[0], values, 20)
+            if data:
+                self.putb(0, len(self.frame_ss_list) - 1, cls, data)
+
+    def flush_audio(self):
+        # Emit the audio frames that are not out yet, at the end of input.
+        for is_out, cls in ((True, Bin.WAV_OUT), (False, Bin.WAV_IN)):
+            data = self.wav[is_out].flush()
+            if data and self.frame_ss_list:
+                self.putb(0, len(self.frame_ss_list) - 1, cls, data)
+
     def start_frame(self, ss):
         # Mark the start of a frame.
         if self.frame_ss_list:
             # Flush bits if we had a frame before the frame which is
             # starting here.
             self.flush_frame_bits()
+            self.flush_frame_audio()
         self.frame_ss_list = [ss]
         self.frame_bits_out = []
         self.frame_bits_in = []
         self.frame_slot_data_out = []
         self.frame_slot_data_in = []
         self.have_slots = {True: None, False: None}
+        self.frame_audio = {True: {}, False: {}}
 
     def handle_slot_dummy(self, slotidx, bitidx, bitcount, is_out, data):
         # Handle slot x, default/fallback handler.
@@ -249,6 +283,9 @@ class Decoder(srd.Decoder):
         data_bin = data_bin.to_bytes(2, byteorder = 'big')
         self.putb(bitidx, bitcount, anncls, data_bin)
 
+        if self.binary_used and 3 <= slotidx <= 11:
+            self.frame_audio[is_out][slotidx] = data
+
     def handle_slot_00(self, slotidx, bitidx, bitcount, is_out, data):
         # Handle slot 0, TAG.
         slotpos = self.frame_slot_lens[slotidx]
@@ -452,6 +489,7 @@ class Decoder(srd.Decoder):
         if not have_sdo and not have_sdi:
             raise ChannelError('Either SDATA_OUT or SDATA_IN (or both) are required.')
         have_reset = self.has_channel(Pin.RESET)
+        self.binary_used = self.is_subscribed(self.out_binary)
 
         # Data is sampled at falling CLK edges. Annotations need to span
         # the period between rising edges. SYNC rises one cycle _before_
@@ -464,14 +502,18 @@ class Decoder(srd.Decoder):
             prev_sync[-1] = pins[Pin.SYNC]
             pins = self.wait({Pin.BIT_CLK: 'r'})
         bit_ss = self.samplenum
-        while True:
-            pins = self.wait({Pin.BIT_CLK: 'f'})
-            prev_sync.pop(0)
-            prev_sync.append(pins[Pin.SYNC])
-            self.wait({Pin.BIT_CLK: 'r'})
-            if prev_sync[0] == 0 and prev_sync[1] == 1:
-                self.start_frame(bit_ss)
-            self.handle_bits(bit_ss, self.samplenum,
-                    pins[Pin.SDATA_OUT] if have_sdo else None,
-                    pins[Pin.SDATA_IN] if have_sdi else None)
-            bit_ss = self.samplenum
+        try:
+            while True:
+                pins = self.wait({Pin.BIT_CLK: 'f'})
+                prev_sync.pop(0)
+                prev_sync.append(pins[Pin.SYNC])
+                self.wait({Pin.BIT_CLK: 'r'})
+                if prev_sync[0] == 0 and prev_sync[1] == 1:
+                    self.start_frame(bit_ss)
+                self.handle_bits(bit_ss, self.samplenum,
+                        pins[Pin.SDATA_OUT] if have_sdo else None,
+                        pins[Pin.SDATA_IN] if have_sdi else None)
+                bit_ss = self.samplenum
+        except EOFError:
+            self.flush_audio()
+            raise
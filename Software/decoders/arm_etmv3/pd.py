@@ -18,8 +18,8 @@
 ##
 
 import sigrokdecode as srd
-import subprocess
-import re
+from common.objdump import load_symbols
+from common.traceprofile import TraceProfile
 
 # See ETMv3 Signal Protocol table 7-11: 'Encoding of Exception[8:0]'.
 exc_names = [
@@ -171,6 +171,7 @@ class Decoder(srd.Decoder):
     )
 
     def __init__(self):
+        self.symbols = None
         self.reset()
 
     def reset(self):
@@ -182,80 +183,27 @@ class Decoder(srd.Decoder):
         self.current_pc = 0
         self.current_loc = None
         self.current_func = None
-        self.next_instr_lookup = {}
-        self.file_lookup = {}
-        self.func_lookup = {}
-        self.disasm_lookup = {}
-        self.source_lookup = {}
+        # Executed functions and lines, call graph and exception durations.
+        self.trace_profile = TraceProfile()
+        self.after_call = False
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.shown_anns = self.subscribed_annotations()
         self.load_objdump()
 
     def load_objdump(self):
-        '''Parse disassembly obtained from objdump into two tables:
-        next_instr_lookup: Find the next PC addr from current PC.
-        disasm_lookup: Find the instruction text from current PC.
-        source_lookup: Find the source code line from current PC.
+        '''Load the lookup tables of the ELF file: the function, source
+        location and source line of an address, and the text and next
+        addresses (in sequence and when the branch is taken) of the
+        instruction at an address.
         '''
         if not (self.options['objdump'] and self.options['elffile']):
             return
 
-        opts = [self.options['objdump']]
-        opts += self.options['objdump_opts'].split()
-        opts += [self.options['elffile']]
-
-        try:
-            disasm = subprocess.check_output(opts)
-        except subprocess.CalledProcessError:
-            return
-
-        disasm = disasm.decode('utf-8', 'replace')
-
-        instpat = re.compile('\s*([0-9a-fA-F]+):\t+([0-9a-fA-F ]+)\t+([a-zA-Z][^;]+)\s*;?.*')
-        branchpat = re.compile('(b|bl|b..|bl..|cbnz|cbz)(?:\.[wn])?\s+(?:r[0-9]+,\s*)?([0-9a-fA-F]+)')
-        filepat = re.compile('[^\s]+[/\\\\]([a-zA-Z0-9._-]+:[0-9]+)(?:\s.*)?')
-        funcpat = re.compile('[0-9a-fA-F]+\s*<([^>]+)>:.*')
-
-        prev_src = ''
-        prev_file = ''
-        prev_func = ''
-
-        for line in disasm.split('\n'):
-            m = instpat.match(line)
-            if m:
-                addr = int(m.group(1), 16)
-                raw = m.group(2)
-                disas = m.group(3).strip().replace('\t', ' ')
-                self.disasm_lookup[addr] = disas
-                self.source_lookup[addr] = prev_src
-                self.file_lookup[addr] = prev_file
-                self.func_lookup[addr] = prev_func
-
-                # Next address in direct sequence.
-                ilen = len(raw.replace(' ', '')) // 2
-                next_n = addr + ilen
-
-                # Next address if branch is taken.
-                bm = branchpat.match(disas)
-                if bm:
-                    next_e = int(bm.group(2), 16)
-                else:
-                    next_e = next_n
-
-                self.next_instr_lookup[addr] = (next_n, next_e)
-            else:
-                m = funcpat.match(line)
-                if m:
-                    prev_func = m.group(1)
-                    prev_src = None
-                else:
-                    m = filepat.match(line)
-                    if m:
-                        prev_file = m.group(1)
-                        prev_src = None
-                    else:
-                        prev_src = line.strip()
+        self.symbols = load_symbols(self.options['objdump'],
+            self.options['objdump_opts'], self.options['elffile'],
+            instructions=True)
 
     def flush_current_loc(self):
         if self.current_loc is not None:
@@ -284,20 +232,27 @@ class Decoder(srd.Decoder):
 
         tdelta = max(1, (self.prevsample - self.startsample) / len(exec_status))
 
+        symbols = self.symbols
         for i, exec_status in enumerate(exec_status):
             pc = self.current_pc
-            default_next = pc + 2 if self.cpu_state == 'thumb' else pc + 4
-            target_n, target_e = self.next_instr_lookup.get(pc, (default_next, default_next))
+            instr = symbols.instruction(pc) if symbols is not None else None
+            if instr is not None:
+                new_dis, target_n, target_e = instr
+            else:
+                new_dis = None
+                target_n = target_e = pc + 2 if self.cpu_state == 'thumb' else pc + 4
             ss = self.startsample + round(tdelta * i)
             es = self.startsample + round(tdelta * (i+1))
 
-            self.put(ss, es, self.out_ann,
-                     [5, ['PC 0x%08x' % pc, '0x%08x' % pc, '%08x' % pc]])
+            if 5 in self.shown_anns:
+                self.put(ss, es, self.out_ann,
+                         [5, ['PC 0x%08x' % pc, '0x%08x' % pc, '%08x' % pc]])
 
-            new_loc = self.file_lookup.get(pc)
-            new_src = self.source_lookup.get(pc)
-            new_dis = self.disasm_lookup.get(pc)
-            new_func = self.func_lookup.get(pc)
+            new_loc = new_src = new_func = None
+            if symbols is not None:
+                new_loc = symbols.location(pc)
+                new_src = symbols.source(pc)
+                new_func = symbols.function(pc)
 
             # Report source line only when it changes.
             if self.current_loc is not None:
@@ -319,13 +274,21 @@ class Decoder(srd.Decoder):
             else:
                 self.current_func[1] = es
 
+            self.trace_profile.execute(new_func or '0x%08x' % pc, new_loc,
+                self.after_call)
+            # Calls are taken branches with link.
+            self.after_call = bool(exec_status and new_dis and \
+                new_dis.split()[0] in ('bl', 'blx'))
+
             # Report instruction every time.
             if new_dis:
                 if exec_status:
-                    a = [6, ['Executed: ' + new_dis, new_dis, new_dis.split()[0]]]
-                else:
-                    a = [7, ['Not executed: ' + new_dis, new_dis, new_dis.split()[0]]]
-                self.put(ss, es, self.out_ann, a)
+                    if 6 in self.shown_anns:
+                        self.put(ss, es, self.out_ann,
+                            [6, ['Executed: ' + new_dis, new_dis, new_dis.split()[0]]])
+                elif 7 in self.shown_anns:
+                    self.put(ss, es, self.out_ann,
+                        [7, ['Not executed: ' + new_dis, new_dis, new_dis.split()[0]]])
 
             if exec_status:
                 self.current_pc = target_e
@@ -386,6 +349,7 @@ class Decoder(srd.Decoder):
             return [0, ['Synchronization']]
 
     def handle_exception_exit(self, buf):
+        self.trace_profile.exception_exit(self.startsample)
         return [2, ['Exception exit']]
 
     def handle_exception_entry(self, buf):
@@ -426,6 +390,8 @@ class Decoder(srd.Decoder):
             # Reset location when the trace has been interrupted.
             self.flush_current_loc()
             self.flush_current_func()
+            self.trace_profile.restart()
+            self.after_call = False
 
         self.last_branch = addr
         self.current_pc = addr
@@ -510,8 +476,11 @@ class Decoder(srd.Decoder):
             if exc:
                 if exc < len(exc_names):
                     txt += ', exception %s' % exc_names[exc]
+                    self.trace_profile.exception_enter(exc_names[exc], self.startsample)
                 else:
                     txt += ', exception 0x%02x' % exc
+                    self.trace_profile.exception_enter('0x%02x' % exc, self.startsample)
+                self.after_call = False
             if cancel:
                 txt += ', instr cancelled'
             if altisa:
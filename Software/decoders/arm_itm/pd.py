@@ -19,8 +19,8 @@
 
 import sigrokdecode as srd
 import string
-import subprocess
-import re
+from common.objdump import load_symbols
+from common.traceprofile import TraceProfile
 
 ARM_EXCEPTIONS = {
     0: 'Thread',
@@ -81,6 +81,7 @@ class Decoder(srd.Decoder):
     )
 
     def __init__(self):
+        self.symbols = None
         self.reset()
 
     def reset(self):
@@ -90,50 +91,20 @@ class Decoder(srd.Decoder):
         self.prevsample = 0
         self.dwt_timestamp = 0
         self.current_mode = None
-        self.file_lookup = {}
-        self.func_lookup = {}
+        # Functions and lines of the PC samples, and exception durations.
+        self.trace_profile = TraceProfile()
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.load_objdump()
 
     def load_objdump(self):
-        '''Parse disassembly obtained from objdump into a lookup tables'''
+        '''Load the function and source location tables of the ELF file.'''
         if not (self.options['objdump'] and self.options['elffile']):
             return
 
-        opts = [self.options['objdump']]
-        opts += self.options['objdump_opts'].split()
-        opts += [self.options['elffile']]
-
-        try:
-            disasm = subprocess.check_output(opts)
-        except subprocess.CalledProcessError:
-            return
-
-        disasm = disasm.decode('utf-8', 'replace')
-
-        instpat = re.compile('\s*([0-9a-fA-F]+):\t+([0-9a-fA-F ]+)\t+([a-zA-Z][^;]+)\s*;?.*')
-        filepat = re.compile('[^\s]+[/\\\\]([a-zA-Z0-9._-]+:[0-9]+)(?:\s.*)?')
-        funcpat = re.compile('[0-9a-fA-F]+\s*<([^>]+)>:.*')
-
-        prev_file = ''
-        prev_func = ''
-
-        for line in disasm.split('\n'):
-            m = instpat.match(line)
-            if m:
-                addr = int(m.group(1), 16)
-                self.file_lookup[addr] = prev_file
-                self.func_lookup[addr] = prev_func
-            else:
-                m = funcpat.match(line)
-                if m:
-                    prev_func = m.group(1)
-                else:
-                    m = filepat.match(line)
-                    if m:
-                        prev_file = m.group(1)
+        self.symbols = load_symbols(self.options['objdump'],
+            self.options['objdump_opts'], self.options['elffile'])
 
     def get_packet_type(self, byte):
         '''Identify packet type based on its first byte.
@@ -173,8 +144,10 @@ class Decoder(srd.Decoder):
             self.current_mode = (self.startsample, new_mode)
 
     def location_change(self, pc):
-        new_loc = self.file_lookup.get(pc)
-        new_func = self.func_lookup.get(pc)
+        if self.symbols is None:
+            return
+        new_loc = self.symbols.location(pc)
+        new_func = self.symbols.function(pc)
         ss = self.startsample
         es = self.prevsample
 
@@ -184,6 +157,13 @@ class Decoder(srd.Decoder):
         if new_func is not None:
             self.put(ss, es, self.out_ann, [11, [new_func]])
 
+    def profile_pc(self, pc):
+        func = loc = None
+        if self.symbols is not None:
+            func = self.symbols.function(pc)
+            loc = self.symbols.location(pc)
+        self.trace_profile.execute(func or '0x%08x' % pc, loc)
+
     def fallback(self, buf):
         ptype = self.get_packet_type(buf[0])
         return [0, [('Unhandled %s: ' % ptype) + ' '.join(['%02x' % b for b in buf])]]
@@ -219,16 +199,25 @@ class Decoder(srd.Decoder):
             excstr = ARM_EXCEPTIONS.get(excnum, 'IRQ %d' % (excnum - 16))
             if event == 1:
                 self.mode_change(excstr)
+                self.trace_profile.exception_enter(excstr, self.startsample)
                 return [5, ['Enter: ' + excstr, 'E ' + excstr]]
             elif event == 2:
                 self.mode_change(None)
+                self.trace_profile.exception_exit(self.startsample, excstr)
                 return [5, ['Exit: ' + excstr, 'X ' + excstr]]
             elif event == 3:
                 self.mode_change(excstr)
+                self.trace_profile.exception_resume(self.startsample,
+                    excstr if excnum else None)
                 return [5, ['Resume: ' + excstr, 'R ' + excstr]]
         elif pid == 2:
+            if plen == 1:
+                # The core was sleeping when the PC was to be sampled.
+                self.trace_profile.execute('[sleep]')
+                return [6, ['PC: sleeping', 'Sleep']]
             pc = buf[1] | (buf[2] << 8) | (buf[3] << 16) | (buf[4] << 24)
             self.location_change(pc)
+            self.profile_pc(pc)
             return [6, ['PC: 0x%08x' % pc]]
         elif (buf[0] & 0xC4) == 0x84:
             comp = (buf[0] & 0x30) >> 4
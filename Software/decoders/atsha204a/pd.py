@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from common.crc import Crc
 
 WORD_ADDR_RESET         = 0x00
 WORD_ADDR_SLEEP         = 0x01
@@ -92,6 +93,9 @@ STATUS = {
     0xff: 'CRC / communications error',
 }
 
+# CRC-16 over the bits of every byte LSB first, sent low byte first.
+crc16 = Crc(16, 0x8005, refin=True)
+
 class Decoder(srd.Decoder):
     api_version = 3
     id = 'atsha204a'
@@ -150,7 +154,7 @@ class Decoder(srd.Decoder):
             self.put_param1(b[3])
             self.put_param2([b[4], b[5]])
             self.put_data(b[6:-2])
-            self.put_crc([b[-2], b[-1]])
+            self.put_crc([b[-2], b[-1]], b[1:-2])
 
     def output_rx_bytes(self):
         b = self.bytes
@@ -158,16 +162,16 @@ class Decoder(srd.Decoder):
         self.put_count(b[0])
         if self.waddr == WORD_ADDR_RESET:
             self.put_data([b[1]])
-            self.put_crc([b[2], b[3]])
+            self.put_crc([b[2], b[3]], b[0:2])
             self.put_status(b[0][0], b[-1][1], b[1][2])
         elif self.waddr == WORD_ADDR_COMMAND:
             if count == 4: # Status / Error.
                 self.put_data([b[1]])
-                self.put_crc([b[2], b[3]])
+                self.put_crc([b[2], b[3]], b[0:2])
                 self.put_status(b[0][0], b[-1][1], b[1][2])
             else:
                 self.put_data(b[1:-2])
-                self.put_crc([b[-2], b[-1]])
+                self.put_crc([b[-2], b[-1]], b[0:-2])
 
     def putx(self, s, data):
         self.put(s[0], s[1], self.out_ann, data)
@@ -276,8 +280,13 @@ class Decoder(srd.Decoder):
         else:
             self.putz(s[0][0], s[-1][1], [5, ['Data: %s' % ' '.join(format(i[2], '02x') for i in s)]])
 
-    def put_crc(self, s):
+    def put_crc(self, s, covered):
         self.puty(s, [6, ['CRC: {:02X} {:02X}'.format(s[0][2], s[1][2])]])
+        # The CRC covers count, opcode/status, params and data.
+        crc = crc16.calc_bytes(i[2] for i in covered)
+        if crc != s[0][2] | (s[1][2] << 8):
+            self.put_warning(s[0][0], s[1][1], 'CRC mismatch: expecting {:02X} {:02X}'.format(
+                crc & 0xff, crc >> 8))
 
     def put_status(self, ss, es, status):
         self.putz(ss, es, [7, ['Status: %s' % STATUS[status]]])
@@ -18,6 +18,8 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+from common.crc import CRC15_CAN, CRC17_CAN_FD, CRC21_CAN_FD
+from common.pcap import LINKTYPE_CAN_SOCKETCAN, PcapngWriter, socketcan_frame
 from common.srdhelper import bitpack_msb
 import sigrokdecode as srd
 
@@ -70,17 +72,24 @@ class Decoder(srd.Decoder):
         ('fields', 'Fields', tuple(range(15))),
         ('warnings', 'Warnings', (16,)),
     )
+    binary = (
+        ('pcap', 'Frames (pcapng)'),
+    )
 
     def __init__(self):
         self.reset()
 
     def reset(self):
         self.samplerate = None
+        self.shown_anns = set(range(len(self.annotations)))
+        self.python_used = True
+        self.binary_used = False
         self.reset_variables()
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.out_python = self.register(srd.OUTPUT_PYTHON)
+        self.out_binary = self.register(srd.OUTPUT_BINARY)
 
     def set_bit_rate(self, bitrate):
         self.bit_width = float(self.samplerate) / float(bitrate)
@@ -97,9 +106,12 @@ class Decoder(srd.Decoder):
             self.samplerate = value
             self.bit_width = float(self.samplerate) / float(self.options['nominal_bitrate'])
             self.sample_point = (self.bit_width / 100.0) * self.options['sample_point']
+            self.pcap = PcapngWriter(LINKTYPE_CAN_SOCKETCAN, self.samplerate, 'can')
 
     # Generic helper for CAN bit annotations.
     def putg(self, ss, es, data):
+        if data[0] not in self.shown_anns:
+            return
         left, right = int(self.sample_point), int(self.bit_width - self.sample_point)
         self.put(ss - left, es + right, self.out_ann, data)
 
@@ -120,8 +132,24 @@ class Decoder(srd.Decoder):
         self.putg(self.ss_block, self.samplenum, data)
 
     def putpy(self, data):
+        if not self.python_used:
+            return
         self.put(self.ss_packet, self.es_packet, self.out_python, data)
 
+    def putpcap(self):
+        # The frame as SocketCAN's struct can_frame or canfd_frame.
+        if not self.binary_used:
+            return
+        extended = self.frame_type == 'extended'
+        rtr = self.rtr_type == 'remote'
+        brs = esi = False
+        if self.fd:
+            brs, esi = self.bits[35:37] if extended else self.bits[16:18]
+        frame = socketcan_frame(self.fullid, self.frame_bytes, extended, rtr,
+            self.fd, brs, esi, self.dlc if rtr else None)
+        self.put(self.ss_packet, self.es_packet, self.out_binary,
+            [0, self.pcap.packet(self.ss_packet, frame)])
+
     def reset_variables(self):
         self.state = 'IDLE'
         self.sof = self.frame_type = self.dlc = None
@@ -160,6 +188,9 @@ class Decoder(srd.Decoder):
         # But not in the CRC delimiter, ACK, and end of frame fields.
         if len(self.bits) > self.last_databit + 17:
             return False
+        # CAN FD frames have fixed stuff bits in the CRC field instead.
+        if self.fd and len(self.bits) > self.last_databit + 1:
+            return False
         last_6_bits = self.rawbits[-6:]
         if last_6_bits not in ([0, 0, 0, 0, 0, 1], [1, 1, 1, 1, 1, 0]):
             return False
@@ -169,7 +200,17 @@ class Decoder(srd.Decoder):
         return True
 
     def is_valid_crc(self, crc_bits):
-        return True # TODO
+        if not self.fd:
+            crc = CRC15_CAN.calc_bits(self.bits[:self.last_databit + 1])
+            return crc == bitpack_msb(crc_bits)
+
+        # The CAN FD CRC field has a fixed stuff bit before every 4 bits.
+        # The CRC covers the dynamic stuff bits and the stuff count.
+        field = self.rawbits[self.crc_start:self.crc_start + self.crc_len]
+        bits = [b for i, b in enumerate(field) if i % 5]
+        crc = CRC17_CAN_FD if len(bits) == 4 + 17 else CRC21_CAN_FD
+        expected = crc.calc_bits(self.rawbits[:self.crc_start] + bits[:4])
+        return expected == bitpack_msb(bits[4:])
 
     def decode_error_frame(self, bits):
         pass # TODO
@@ -185,8 +226,9 @@ class Decoder(srd.Decoder):
         # Remember start of CRC sequence (see below).
         if bitnum == (self.last_databit + 1):
             self.ss_block = self.samplenum
+            self.crc_start = len(self.rawbits) - 1
             if self.fd:
-                if dlc2len(self.dlc) < 16:
+                if dlc2len(self.dlc) <= 16:
                     self.crc_len = 27 # 17 + SBC + stuff bits
                 else:
                     self.crc_len = 32 # 21 + SBC + stuff bits
@@ -196,7 +238,7 @@ class Decoder(srd.Decoder):
         # CRC sequence (15 bits, 17 bits or 21 bits)
         elif bitnum == (self.last_databit + self.crc_len):
             if self.fd:
-                if dlc2len(self.dlc) < 16:
+                if dlc2len(self.dlc) <= 16:
                     crc_type = "CRC-17"
                 else:
                     crc_type = "CRC-21"
@@ -246,6 +288,7 @@ class Decoder(srd.Decoder):
             py_data = tuple([self.frame_type, self.fullid, self.rtr_type,
                 self.dlc, self.frame_bytes])
             self.putpy(py_data)
+            self.putpcap()
             self.reset_variables()
             return True
 
@@ -314,6 +357,8 @@ class Decoder(srd.Decoder):
                 x = self.dlc_start + 4 + (8 * i)
                 b = bitpack_msb(self.bits[x:x + 8])
                 self.frame_bytes.append(b)
+                if 0 not in self.shown_anns:
+                    continue
                 ss = self.ss_databytebits[i * 8]
                 es = self.ss_databytebits[((i + 1) * 8) - 1]
                 self.putg(ss, es, [0, ['Data byte %d: 0x%02x' % (i, b),
@@ -414,6 +459,8 @@ class Decoder(srd.Decoder):
                 x = self.dlc_start + 4 + (8 * i)
                 b = bitpack_msb(self.bits[x:x + 8])
                 self.frame_bytes.append(b)
+                if 0 not in self.shown_anns:
+                    continue
                 ss = self.ss_databytebits[i * 8]
                 es = self.ss_databytebits[((i + 1) * 8) - 1]
                 self.putg(ss, es, [0, ['Data byte %d: 0x%02x' % (i, b),
@@ -440,10 +487,11 @@ class Decoder(srd.Decoder):
 
         # If this is a stuff bit, remove it from self.bits and ignore it.
         if self.is_stuff_bit():
-            self.putx([15, [str(can_rx)]])
+            if 15 in self.shown_anns:
+                self.putx([15, [str(can_rx)]])
             self.curbit += 1 # Increase self.curbit (bitnum is not affected).
             return
-        else:
+        elif 17 in self.shown_anns:
             self.putx([17, [str(can_rx)]])
 
         # Bit 0: Start of frame (SOF) bit
@@ -501,6 +549,12 @@ class Decoder(srd.Decoder):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
 
+        self.shown_anns = self.subscribed_annotations()
+        self.python_used = self.is_subscribed(self.out_python)
+        self.binary_used = self.is_subscribed(self.out_binary)
+        if self.binary_used:
+            self.put(0, 0, self.out_binary, [0, self.pcap.header()])
+
         while True:
             # State machine.
             if self.state == 'IDLE':
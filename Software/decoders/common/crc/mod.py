@@ -0,0 +1,200 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+
+import binascii
+
+__all__ = [
+    'Crc', 'reflect',
+    'CRC5_USB', 'CRC15_CAN', 'CRC16_IBM_3740', 'CRC16_MAXIM_DOW',
+    'CRC16_MODBUS', 'CRC16_USB', 'CRC17_CAN_FD', 'CRC21_CAN_FD',
+    'CRC32_ISO_HDLC',
+]
+
+def reflect(value, width):
+    '''Reverse the order of the lowest width bits of value.'''
+    result = 0
+    for _ in range(width):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+class Crc:
+    '''
+    A CRC in the usual parameterised model (width, poly, init, refin,
+    refout, xorout), as used by the CRC catalogues.
+
+    Messages can be given as bytes, as bit sequences in transmission order
+    (lists of 0/1 or '0'/'1' strings) or as integers with a bit count.
+    Bytes go through table lookups, several bytes per step (slice-by-N)
+    for CRCs of up to 8 * slices bits; the other forms are packed into
+    bytes first and only the leftover bits are shifted in one by one.
+    '''
+
+    def __init__(self, width, poly, init=0, refin=False, refout=False, xorout=0, slices=4):
+        self.width = width
+        self.poly = poly
+        self.init = init
+        self.refin = refin
+        self.refout = refout
+        self.xorout = xorout
+        self.mask = (1 << width) - 1
+
+        # MSB first register, widened to at least one byte.
+        self._pad = max(0, 8 - width)
+        self._table = self._msb_tables(max(width, 8), 1)[0]
+
+        # Tables for calc_bytes(), in the register orientation of refin.
+        self.slices = slices if width <= 8 * slices else 1
+        if refin:
+            self._slices = self._lsb_tables(self.slices)
+        else:
+            self._slices = self._msb_tables(8 * self.slices, self.slices) \
+                if self.slices > 1 else None
+
+        # Use the C implementations where they match.
+        self._native = None
+        if (width, poly, init, refin, refout, xorout) == \
+                (32, 0x04c11db7, 0xffffffff, True, True, 0xffffffff):
+            self._native = binascii.crc32
+        elif (width, poly, refin, refout) == (16, 0x1021, False, False):
+            self._native = lambda data: binascii.crc_hqx(data, init) ^ xorout
+
+    def _msb_tables(self, bits, count):
+        '''Tables for a register of the given size, the CRC in its top bits.'''
+        top = 1 << (bits - 1)
+        mask = (1 << bits) - 1
+        poly = self.poly << (bits - self.width)
+        first = []
+        for n in range(256):
+            reg = n << (bits - 8)
+            for _ in range(8):
+                reg = ((reg << 1) ^ poly if reg & top else reg << 1) & mask
+            first.append(reg)
+        # Table k gives the effect of a byte followed by k zero bytes.
+        tables = [first]
+        for _ in range(count - 1):
+            prev = tables[-1]
+            tables.append([((v << 8) & mask) ^ first[v >> (bits - 8)] for v in prev])
+        return tables
+
+    def _lsb_tables(self, count):
+        poly = reflect(self.poly, self.width)
+        first = []
+        for n in range(256):
+            reg = n
+            for _ in range(8):
+                reg = (reg >> 1) ^ poly if reg & 1 else reg >> 1
+            first.append(reg)
+        tables = [first]
+        for _ in range(count - 1):
+            prev = tables[-1]
+            tables.append([(v >> 8) ^ first[v & 0xff] for v in prev])
+        return tables
+
+    def _finish(self, reg, reflected):
+        '''Apply refout and xorout to a register in either orientation.'''
+        if reflected != self.refout:
+            reg = reflect(reg, self.width)
+        return reg ^ self.xorout
+
+    def calc_bytes(self, data):
+        '''CRC of a bytes-like object or a sequence of byte values.'''
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+        if self._native is not None:
+            return self._native(data)
+
+        n = self.slices
+        end = len(data) - len(data) % n if n > 1 else 0
+        if self.refin:
+            reg = reflect(self.init, self.width)
+            tables = self._slices
+            if n > 1:
+                for i in range(0, end, n):
+                    x = reg ^ int.from_bytes(data[i:i + n], 'little')
+                    reg = 0
+                    for k in range(n):
+                        reg ^= tables[n - 1 - k][(x >> (8 * k)) & 0xff]
+            table = tables[0]
+            for b in data[end:]:
+                reg = table[(reg ^ b) & 0xff] ^ (reg >> 8)
+            return self._finish(reg, True)
+
+        if n > 1:
+            bits = 8 * n
+            reg = self.init << (bits - self.width)
+            tables = self._slices
+            for i in range(0, end, n):
+                x = reg ^ int.from_bytes(data[i:i + n], 'big')
+                reg = 0
+                for k in range(n):
+                    reg ^= tables[k][(x >> (8 * k)) & 0xff]
+            reg >>= bits - self.width
+        else:
+            reg = self.init
+        return self._finish(self._msb_bytes(reg, data[end:]), False)
+
+    def _msb_bytes(self, reg, data):
+        '''Shift bytes into an MSB first register (not padded).'''
+        pad = self._pad
+        bits = self.width + pad
+        mask = (1 << bits) - 1
+        table = self._table
+        reg <<= pad
+        for b in data:
+            reg = ((reg << 8) & mask) ^ table[((reg >> (bits - 8)) ^ b) & 0xff]
+        return reg >> pad
+
+    def _msb_bits(self, reg, value, count):
+        '''Shift the count lowest bits of value, MSB first, into the register.'''
+        top = 1 << (self.width - 1)
+        for i in range(count - 1, -1, -1):
+            feedback = bool(reg & top) != bool((value >> i) & 1)
+            reg = (reg << 1) & self.mask
+            if feedback:
+                reg ^= self.poly
+        return reg
+
+    def calc_int(self, value, count):
+        '''CRC of the count lowest bits of value, sent MSB first.'''
+        head = count % 8
+        reg = self._msb_bits(self.init, value >> (count - head), head)
+        rest = count - head
+        if rest:
+            data = (value & ((1 << rest) - 1)).to_bytes(rest // 8, 'big')
+            reg = self._msb_bytes(reg, data)
+        return self._finish(reg, False)
+
+    def calc_bits(self, bits):
+        '''CRC of a sequence of bits in transmission order.'''
+        if not isinstance(bits, str):
+            bits = ''.join('1' if b else '0' for b in bits)
+        return self.calc_int(int(bits, 2) if bits else 0, len(bits))
+
+# Common CRCs, named and parameterised as in the CRC catalogues, except
+# for CAN FD: ISO 11898-1 starts the CRC-17/21 register with its top bit
+# set, where the catalogues list an init of 0.
+CRC5_USB = Crc(5, 0x05, 0x1f, True, True, 0x1f)
+CRC15_CAN = Crc(15, 0x4599)
+CRC16_IBM_3740 = Crc(16, 0x1021, 0xffff)
+CRC16_MAXIM_DOW = Crc(16, 0x8005, 0, True, True, 0xffff)
+CRC16_MODBUS = Crc(16, 0x8005, 0xffff, True, True)
+CRC16_USB = Crc(16, 0x8005, 0xffff, True, True, 0xffff)
+CRC17_CAN_FD = Crc(17, 0x1685b, 1 << 16)
+CRC21_CAN_FD = Crc(21, 0x102899, 1 << 20)
+CRC32_ISO_HDLC = Crc(32, 0x04c11db7, 0xffffffff, True, True, 0xffffffff)
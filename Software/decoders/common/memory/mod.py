@@ -0,0 +1,282 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+
+# Sparse images of the memory behind a memory chip, rebuilt from the
+# reads, writes and erases a decoder sees. Only the pages that were
+# touched are kept, each with a mask of the bytes whose contents are
+# known, and with the operations on it in sample order, so the contents
+# at any earlier sample can be looked up afterwards.
+
+import bisect
+
+__all__ = ['MemoryImage', 'PAGE_SIZE']
+
+PAGE_SIZE = 4096
+HEX_RECORD = 16
+
+class _Page:
+    __slots__ = ('data', 'known', 'samples', 'ops')
+
+    def __init__(self, size, erased=None):
+        if erased is None:
+            self.data = bytearray(size)
+            self.known = bytearray(size)
+        else:
+            self.data = bytearray([erased]) * size
+            self.known = bytearray([1]) * size
+        # Start samples of the operations, and (kind, start, end, data)
+        # per operation, data being None for erases.
+        self.samples = []
+        self.ops = []
+
+class MemoryImage:
+    '''
+    Contents of a memory as far as they were seen. Addresses are byte
+    addresses, samples the start samples of the operations.
+
+    read() records what was read, write() overwrites (EEPROMs, SD cards),
+    program() clears bits only, as programming flash does, and erase()
+    sets bytes to the erased value. size is the size of the memory when
+    the decoder knows it; erase_all() of a memory of unknown size erases
+    every address, including those never touched.
+    '''
+
+    def __init__(self, size=None, erased=0xFF, page_size=PAGE_SIZE):
+        self.size = size
+        self.erased = erased
+        self.page_size = page_size
+        self._pages = {}
+        # Start samples of erase_all() calls with no size to erase.
+        self._chip_erases = []
+
+    def __bool__(self):
+        return bool(self._pages) or bool(self._chip_erases)
+
+    def _page(self, index):
+        page = self._pages.get(index)
+        if page is None:
+            erased = self.erased if self._chip_erases else None
+            page = self._pages[index] = _Page(self.page_size, erased)
+        return page
+
+    def _update(self, sample, kind, address, length, data=None, wrap=None):
+        '''Apply an operation to the pages it touches, page by page.'''
+        if wrap:
+            # Accesses that run past the end of a device page (or of the
+            # whole memory, for reads) continue at its start, as with page
+            # programs of SPI flash. Of more than a page, the bytes of the
+            # last pass remain.
+            base = address - address % wrap
+            offset = address - base
+            if len(data) > wrap:
+                offset = (offset + len(data) - wrap) % wrap
+                data = data[-wrap:]
+                length = wrap
+            if offset + length > wrap:
+                first = wrap - offset
+                self._update(sample, kind, base + offset, first, data[:first])
+                self._update(sample, kind, base, length - first, data[first:])
+                return
+            address = base + offset
+
+        end = address + length
+        while address < end:
+            index, offset = divmod(address, self.page_size)
+            n = min(end - address, self.page_size - offset)
+            page = self._page(index)
+            if kind == 'erase':
+                page.data[offset:offset + n] = bytes([self.erased]) * n
+                value = None
+            else:
+                value = bytes(data[:n])
+                data = data[n:]
+                if kind == 'program':
+                    old = page.data[offset:offset + n]
+                    known = page.known[offset:offset + n]
+                    value = bytes(v & o if k else v for v, o, k in zip(value, old, known))
+                page.data[offset:offset + n] = value
+            page.known[offset:offset + n] = b'\x01' * n
+            op = (kind, offset, offset + n, value)
+            if not page.samples or page.samples[-1] <= sample:
+                page.samples.append(sample)
+                page.ops.append(op)
+            else:
+                i = bisect.bisect_right(page.samples, sample)
+                page.samples.insert(i, sample)
+                page.ops.insert(i, op)
+            address += n
+
+    def read(self, sample, address, data, wrap=None):
+        '''
+        Record bytes that were read from the memory. With wrap, reads
+        past the end of a wrap sized area continue at its start.
+        '''
+        self._update(sample, 'read', address, len(data), data, wrap)
+
+    def write(self, sample, address, data, wrap=None):
+        '''
+        Record bytes written to the memory. With wrap, writes past the end
+        of a wrap sized device page continue at its start.
+        '''
+        self._update(sample, 'write', address, len(data), data, wrap)
+
+    def program(self, sample, address, data, wrap=None):
+        '''Like write(), but bits can only be cleared, as in flash.'''
+        self._update(sample, 'program', address, len(data), data, wrap)
+
+    def erase(self, sample, address, length):
+        '''Record the erase of length bytes from address on.'''
+        self._update(sample, 'erase', address, length)
+
+    def erase_all(self, sample):
+        '''Record the erase of the whole memory.'''
+        if self.size is not None:
+            self.erase(sample, 0, self.size)
+            return
+        self._chip_erases.append(sample)
+        for page in self._pages.values():
+            page.data[:] = bytes([self.erased]) * self.page_size
+            page.known[:] = b'\x01' * self.page_size
+
+    def value_at(self, address, sample=None):
+        '''
+        The byte at address as of the given sample (after the operations
+        starting at it), or now. None when it is not known.
+        '''
+        index, offset = divmod(address, self.page_size)
+        page = self._pages.get(index)
+        if sample is None:
+            if page is not None:
+                return page.data[offset] if page.known[offset] else None
+            return self.erased if self._chip_erases else None
+
+        value, found = None, None
+        if page is not None:
+            for i in range(bisect.bisect_right(page.samples, sample) - 1, -1, -1):
+                kind, start, end, data = page.ops[i]
+                if start <= offset < end:
+                    value = self.erased if data is None else data[offset - start]
+                    found = page.samples[i]
+                    break
+        i = bisect.bisect_right(self._chip_erases, sample)
+        if i and (found is None or self._chip_erases[i - 1] > found):
+            return self.erased
+        return value
+
+    def history(self, address):
+        '''The operations that set the byte at address, as (sample, kind, value).'''
+        index, offset = divmod(address, self.page_size)
+        page = self._pages.get(index)
+        ops = []
+        if page is not None:
+            for sample, (kind, start, end, data) in zip(page.samples, page.ops):
+                if start <= offset < end:
+                    value = self.erased if data is None else data[offset - start]
+                    ops.append((sample, kind, value))
+        ops.extend((sample, 'erase', self.erased) for sample in self._chip_erases)
+        ops.sort(key=lambda op: op[0])
+        return ops
+
+    def coverage(self):
+        '''The ranges of known bytes, as sorted (start, end) pairs, end excluded.'''
+        ranges = []
+        for index in sorted(self._pages):
+            known = self._pages[index].known
+            base = index * self.page_size
+            start = known.find(1)
+            while start >= 0:
+                end = known.find(0, start)
+                if end < 0:
+                    end = len(known)
+                if ranges and ranges[-1][1] == base + start:
+                    ranges[-1] = (ranges[-1][0], base + end)
+                else:
+                    ranges.append((base + start, base + end))
+                start = known.find(1, end)
+        return ranges
+
+    def chunks(self, fill=None):
+        '''
+        The contents as (address, bytes) in address order. Unknown bytes
+        are left out, or with fill, filled in between the first and the
+        last known byte.
+        '''
+        if fill is None:
+            for start, end in self.coverage():
+                while start < end:
+                    index, offset = divmod(start, self.page_size)
+                    n = min(end - start, self.page_size - offset)
+                    yield start, bytes(self._pages[index].data[offset:offset + n])
+                    start += n
+            return
+
+        ranges = self.coverage()
+        if not ranges:
+            return
+        filler = bytes([fill]) * self.page_size
+        first = ranges[0][0] // self.page_size
+        last = (ranges[-1][1] - 1) // self.page_size
+        for index in range(first, last + 1):
+            page = self._pages.get(index)
+            if page is None:
+                data = filler
+            else:
+                data = bytes(d if k else fill for d, k in zip(page.data, page.known))
+            start = max(index * self.page_size, ranges[0][0])
+            end = min((index + 1) * self.page_size, ranges[-1][1])
+            base = index * self.page_size
+            yield start, data[start - base:end - base]
+
+    def write_image(self, f, fill=None):
+        '''
+        Write the contents from the first to the last known byte to a
+        binary file, unknown bytes as fill (the erased value by default).
+        Returns the address of the first byte, None when nothing is known.
+        '''
+        base = None
+        for address, data in self.chunks(self.erased if fill is None else fill):
+            if base is None:
+                base = address
+            f.write(data)
+        return base
+
+    def intel_hex(self):
+        '''
+        The known contents as the lines of an Intel HEX file, with
+        extended linear address records for addresses past 64 KiB.
+        '''
+        upper = 0
+        for address, data in self.chunks():
+            i = 0
+            while i < len(data):
+                a = address + i
+                if a >> 32:
+                    raise ValueError('Intel HEX has 32 bit addresses, 0x%x is past them' % a)
+                if a >> 16 != upper:
+                    upper = a >> 16
+                    yield _hex_record(0, 4, upper.to_bytes(2, 'big'))
+                # Records do not cross a 64 KiB boundary.
+                n = min(HEX_RECORD, len(data) - i, 0x10000 - (a & 0xFFFF))
+                yield _hex_record(a & 0xFFFF, 0, data[i:i + n])
+                i += n
+        yield _hex_record(0, 1, b'')
+
+def _hex_record(address, kind, data):
+    record = bytes([len(data), address >> 8, address & 0xFF, kind]) + bytes(data)
+    checksum = -sum(record) & 0xFF
+    return ':' + record.hex().upper() + '%02X' % checksum
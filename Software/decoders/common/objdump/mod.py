@@ -0,0 +1,267 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+
+# Functions, source locations and instructions of the addresses of an ELF
+# file, parsed from objdump's disassembly. Consecutive instructions of the
+# same function (or source line) make up one address range, kept in
+# sorted arrays that are searched with bisect, so a table is about as
+# large as the number of functions and lines rather than instructions.
+# Parsed tables are cached on disk, keyed by a hash of the ELF file and
+# the objdump command line, and in memory for the decoders started again
+# in the same process.
+
+from array import array
+import bisect
+import hashlib
+import json
+import os
+import re
+import subprocess
+
+__all__ = ['RangeTable', 'SymbolTable', 'load_symbols', 'cache_directory']
+
+# Bump when the parsing or the cache layout changes; older files are ignored.
+CACHE_VERSION = 1
+
+instpat = re.compile(r'\s*([0-9a-fA-F]+):\t+([0-9a-fA-F ]+)\t+([a-zA-Z][^;]+)\s*;?.*')
+branchpat = re.compile(r'(b|bl|b..|bl..|cbnz|cbz)(?:\.[wn])?\s+(?:r[0-9]+,\s*)?([0-9a-fA-F]+)')
+filepat = re.compile(r'[^\s]+[/\\]([a-zA-Z0-9._-]+:[0-9]+)(?:\s.*)?')
+funcpat = re.compile(r'[0-9a-fA-F]+\s*<([^>]+)>:.*')
+
+class RangeTable:
+    '''Values of address ranges, as sorted start and end (excluded) arrays.'''
+
+    def __init__(self, starts=(), ends=(), values=()):
+        self.starts = array('Q', starts)
+        self.ends = array('Q', ends)
+        self.values = list(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, start, end, value):
+        '''Add a range, merged with the previous one when it continues it.'''
+        if self.values and self.ends[-1] == start and self.values[-1] == value:
+            self.ends[-1] = end
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(value)
+
+    def sort(self):
+        '''Order the ranges, for disassemblies listing sections out of order.'''
+        if all(a <= b for a, b in zip(self.starts, self.starts[1:])):
+            return
+        ranges = sorted(zip(self.starts, self.ends, self.values), key=lambda r: r[0])
+        self.__init__(*zip(*ranges))
+
+    def index(self, address):
+        '''Index of the range holding address, -1 when there is none.'''
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i >= 0 and address < self.ends[i]:
+            return i
+        return -1
+
+    def get(self, address, default=None):
+        i = self.index(address)
+        return self.values[i] if i >= 0 else default
+
+    def to_json(self):
+        return [self.starts.tolist(), self.ends.tolist(), self.values]
+
+    @classmethod
+    def from_json(cls, content):
+        return cls(*content)
+
+class SymbolTable:
+    '''
+    Lookup tables of a disassembly: functions, file:line locations and
+    source lines by address range and, when parsed with instructions,
+    the text, length and branch target of every instruction.
+    '''
+
+    def __init__(self):
+        self.functions = RangeTable()
+        self.locations = RangeTable()
+        self.sources = RangeTable()
+        self.addresses = array('Q')
+        self.lengths = array('B')
+        self.texts = []
+        # Branch instructions only, by address.
+        self.targets = {}
+
+    @classmethod
+    def parse(cls, disasm, instructions=False):
+        '''
+        Parse objdump -lSC output. instructions keeps the instructions,
+        which only decoders following the program flow need.
+        '''
+        table = cls()
+        strings = {}
+        prev_src = ''
+        prev_file = ''
+        prev_func = ''
+
+        for line in disasm.split('\n'):
+            m = instpat.match(line)
+            if m:
+                addr = int(m.group(1), 16)
+                raw = m.group(2)
+                ilen = len(raw.replace(' ', '')) // 2
+                end = addr + max(ilen, 1)
+                table.functions.add(addr, end, prev_func)
+                table.locations.add(addr, end, prev_file)
+                table.sources.add(addr, end, prev_src)
+                if instructions:
+                    disas = m.group(3).strip().replace('\t', ' ')
+                    table.addresses.append(addr)
+                    table.lengths.append(min(ilen, 255))
+                    # Instructions repeat a lot, share their strings.
+                    table.texts.append(strings.setdefault(disas, disas))
+                    bm = branchpat.match(disas)
+                    if bm:
+                        table.targets[addr] = int(bm.group(2), 16)
+            else:
+                m = funcpat.match(line)
+                if m:
+                    prev_func = m.group(1)
+                    prev_src = None
+                else:
+                    m = filepat.match(line)
+                    if m:
+                        prev_file = m.group(1)
+                        prev_src = None
+                    else:
+                        prev_src = line.strip()
+
+        table.sort()
+        return table
+
+    def sort(self):
+        self.functions.sort()
+        self.locations.sort()
+        self.sources.sort()
+        if any(a > b for a, b in zip(self.addresses, self.addresses[1:])):
+            order = sorted(range(len(self.addresses)), key=self.addresses.__getitem__)
+            self.addresses = array('Q', (self.addresses[i] for i in order))
+            self.lengths = array('B', (self.lengths[i] for i in order))
+            self.texts = [self.texts[i] for i in order]
+
+    def function(self, address):
+        return self.functions.get(address)
+
+    def location(self, address):
+        return self.locations.get(address)
+
+    def source(self, address):
+        return self.sources.get(address)
+
+    def instruction(self, address):
+        '''
+        Text, next address and next address when the branch is taken of
+        the instruction at address, None when there is no instruction.
+        '''
+        i = bisect.bisect_left(self.addresses, address)
+        if i == len(self.addresses) or self.addresses[i] != address:
+            return None
+        next_n = address + self.lengths[i]
+        return self.texts[i], next_n, self.targets.get(address, next_n)
+
+    def to_json(self):
+        return {
+            'functions': self.functions.to_json(),
+            'locations': self.locations.to_json(),
+            'sources': self.sources.to_json(),
+            'addresses': self.addresses.tolist(),
+            'lengths': self.lengths.tolist(),
+            'texts': self.texts,
+            'targets': [[a, t] for a, t in self.targets.items()],
+        }
+
+    @classmethod
+    def from_json(cls, content):
+        table = cls()
+        table.functions = RangeTable.from_json(content['functions'])
+        table.locations = RangeTable.from_json(content['locations'])
+        table.sources = RangeTable.from_json(content['sources'])
+        table.addresses = array('Q', content['addresses'])
+        table.lengths = array('B', content['lengths'])
+        table.texts = content['texts']
+        table.targets = {a: t for a, t in content['targets']}
+        return table
+
+def cache_directory():
+    '''Where parsed tables are cached, following the XDG base directories.'''
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'sigrokdecode', 'objdump')
+
+def _cache_key(objdump, opts, elffile, instructions):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, objdump, opts, instructions]).encode('utf-8'))
+    with open(elffile, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Tables already loaded by this process, by ELF file state and options.
+_loaded = {}
+
+def load_symbols(objdump, opts, elffile, instructions=False, cache=True):
+    '''
+    The SymbolTable of an ELF file, from the cache when it was parsed
+    before. opts is the objdump options string. Returns None when objdump
+    fails. With cache false, objdump is always run and nothing is stored.
+    '''
+    try:
+        stat = os.stat(elffile)
+    except OSError:
+        stat = None
+    state = (os.path.abspath(elffile), stat.st_size, stat.st_mtime_ns) if stat else None
+    memo = (state, objdump, opts, instructions)
+    if cache and state is not None and memo in _loaded:
+        return _loaded[memo]
+
+    path = None
+    if cache and state is not None:
+        path = os.path.join(cache_directory(),
+            _cache_key(objdump, opts, elffile, instructions) + '.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                table = SymbolTable.from_json(json.load(f))
+            _loaded[memo] = table
+            return table
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    try:
+        disasm = subprocess.check_output([objdump] + opts.split() + [elffile])
+    except subprocess.CalledProcessError:
+        return None
+    table = SymbolTable.parse(disasm.decode('utf-8', 'replace'), instructions)
+
+    if path is not None:
+        _loaded[memo] = table
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(table.to_json(), f, separators=(',', ':'))
+            os.replace(temp, path)
+        except OSError:
+            pass
+    return table
@@ -0,0 +1,136 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+# pcapng blocks, see https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng-02.html.
+# Decoders put the blocks to an OUTPUT_BINARY class as they decode: the
+# header() once, then one packet() per frame, so that a consumer can
+# append them to a file and never hold the whole capture.
+
+import struct
+
+__all__ = [
+    'LINKTYPE_USER0', 'LINKTYPE_USER1', 'LINKTYPE_I2C_LINUX', 'LINKTYPE_USB_LINUX_MMAPPED',
+    'LINKTYPE_CAN_SOCKETCAN', 'LINKTYPE_USB_2_0', 'INBOUND', 'OUTBOUND',
+    'PcapngWriter', 'socketcan_frame', 'i2c_linux_message',
+]
+
+# Link types, see https://www.tcpdump.org/linktypes.html. Protocols without
+# one of their own use the user-defined types.
+LINKTYPE_USER0 = 147
+LINKTYPE_USER1 = 148
+LINKTYPE_I2C_LINUX = 209
+LINKTYPE_USB_LINUX_MMAPPED = 220
+LINKTYPE_CAN_SOCKETCAN = 227
+LINKTYPE_USB_2_0 = 288
+
+# Directions of the epb_flags option.
+INBOUND = 1
+OUTBOUND = 2
+
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+def _options(options):
+    '''Option list of a block, from (code, bytes value) pairs.'''
+    data = b''
+    for code, value in options:
+        data += struct.pack('>HH', code, len(value)) + value
+        data += b'\x00' * (-len(value) % 4)
+    if data:
+        data += b'\x00\x00\x00\x00' # opt_endofopt
+    return data
+
+def _block(block_type, body):
+    '''A block of the given type, body padded to 32 bits.'''
+    body += b'\x00' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack('>II', block_type, length) + body + struct.pack('>I', length)
+
+class PcapngWriter:
+    '''
+    The blocks of a pcapng section with a single interface of the given
+    link type. Timestamps are in nanoseconds, from sample numbers at the
+    samplerate (sample numbers are used as is when it is not known).
+    '''
+
+    def __init__(self, linktype, samplerate=None, name=None, snaplen=0):
+        self.linktype = linktype
+        self.samplerate = samplerate
+        self.name = name
+        self.snaplen = snaplen
+
+    def header(self):
+        '''Section header and interface description blocks.'''
+        shb = struct.pack('>IHHq', BYTE_ORDER_MAGIC, 1, 0, -1)
+        shb += _options([(4, b'sigrok protocol decoders')]) # shb_userappl
+        options = [(9, b'\x09')] # if_tsresol, 10^-9 s
+        if self.name:
+            options.insert(0, (2, self.name.encode())) # if_name
+        idb = struct.pack('>HHI', self.linktype, 0, self.snaplen) + _options(options)
+        return _block(0x0A0D0D0A, shb) + _block(0x00000001, idb)
+
+    def timestamp(self, sample):
+        if not self.samplerate:
+            return sample
+        return sample * 10**9 // self.samplerate
+
+    def packet(self, sample, data, direction=None):
+        '''Enhanced packet block of data, captured at the given sample.'''
+        ts = self.timestamp(sample)
+        data = bytes(data)
+        body = struct.pack('>IIIII', 0, ts >> 32, ts & 0xFFFFFFFF, len(data), len(data))
+        body += data + b'\x00' * (-len(data) % 4)
+        if direction is not None:
+            body += _options([(2, struct.pack('>I', direction))]) # epb_flags
+        return _block(0x00000006, body)
+
+# SocketCAN frame flags, see linux/can.h.
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CANFD_BRS = 0x01
+CANFD_ESI = 0x02
+CANFD_FDF = 0x04
+
+def socketcan_frame(can_id, data, extended=False, rtr=False, fd=False, brs=False, esi=False,
+        length=None):
+    '''
+    A CAN frame as struct can_frame or struct canfd_frame, for
+    LINKTYPE_CAN_SOCKETCAN (with the CAN ID in network byte order).
+    length is the DLC of remote frames, which have no data.
+    '''
+    can_id |= CAN_EFF_FLAG if extended else 0
+    can_id |= CAN_RTR_FLAG if rtr else 0
+    size = 64 if fd else 8
+    # Classic frames carry 8 bytes at most, whatever their DLC claims.
+    data = bytes(data)[:size]
+    if length is None:
+        length = len(data)
+    flags = 0
+    if fd:
+        flags = CANFD_FDF | (CANFD_BRS if brs else 0) | (CANFD_ESI if esi else 0)
+    return struct.pack('>IBBBB', can_id, length, flags, 0, 0) + data.ljust(size, b'\x00')
+
+# Message flags of the Linux I2C pseudo-header.
+I2C_M_RD = 0x0001
+
+def i2c_linux_message(address_byte, data, bus=0):
+    '''
+    One I2C message with the Linux pseudo-header: the bus number, the
+    flags (read when the address byte has its R/W bit set), then the
+    address byte and the data bytes as transferred.
+    '''
+    flags = I2C_M_RD if address_byte & 1 else 0
+    return struct.pack('>BI', bus, flags) + bytes([address_byte]) + bytes(data)
@@ -0,0 +1,108 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+from math import ceil, sqrt
+
+__all__ = ['Summary', 'format_time', 'summary_texts']
+
+def format_time(t):
+    '''A time in seconds as text, with three decimals in a fitting unit.'''
+    if t == 0:
+        return '0 s'
+    for scale, unit in ((1, 's'), (1e-3, 'ms'), (1e-6, 'μs'), (1e-9, 'ns')):
+        if abs(t) >= scale:
+            return '%.3f %s' % (t / scale, unit)
+    return '%.3f ps' % (t * 1e12)
+
+class Summary:
+    '''
+    Statistics of a series of values (periods, duty cycles, delays) that
+    are gathered one value (or one batch of values) at a time: count, min,
+    max, mean, standard deviation and percentiles.
+
+    Only a histogram of the values is kept, so memory depends on the number
+    of distinct values, which stays small for values counted in samples.
+    The statistics are computed from the sorted histogram, so they do not
+    depend on the order the values were added in.
+    '''
+
+    def __init__(self, percentiles=(50, 90, 99)):
+        self.percentiles = percentiles
+        self.histogram = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value, count=1):
+        self.histogram[value] = self.histogram.get(value, 0) + count
+        self.count += count
+
+    def update(self, values, counts=None):
+        '''Add a batch of values, with their counts (1 each by default).'''
+        if counts is None:
+            for value in values:
+                self.add(value)
+            return
+        for value, count in zip(values, counts):
+            self.add(value, count)
+
+    def sorted(self, divisor=1):
+        '''The histogram as a list of (value / divisor, count), by value.'''
+        return [(value / divisor, self.histogram[value]) for value in sorted(self.histogram)]
+
+    def stats(self, divisor=1):
+        '''
+        The statistics as a dict with the keys count, min, max, mean,
+        stddev (of the population) and p<N> for each percentile (nearest
+        rank), the values divided by divisor (a samplerate turns sample
+        counts into seconds). None while empty.
+        '''
+        if not self.count:
+            return None
+        items = self.sorted()
+        d = divisor
+        n = self.count
+        mean = sum(value * count for value, count in items) / n
+        variance = sum(count * (value - mean) ** 2 for value, count in items) / n
+        result = {
+            'count': n,
+            'min': items[0][0] / d,
+            'max': items[-1][0] / d,
+            'mean': mean / d,
+            'stddev': sqrt(variance) / d,
+        }
+        ranks = sorted((max(1, ceil(p * n / 100)), p) for p in self.percentiles)
+        seen, i = 0, 0
+        for value, count in items:
+            seen += count
+            while i < len(ranks) and ranks[i][0] <= seen:
+                result['p%g' % ranks[i][1]] = value / d
+                i += 1
+        return result
+
+def summary_texts(label, stats, fmt=format_time):
+    '''Annotation texts (longest first) for the result of Summary.stats().'''
+    percentiles = ', '.join('%s %s' % (key, fmt(value))
+        for key, value in stats.items() if key[0] == 'p')
+    return [
+        '%s: %d, min %s, max %s, mean %s, stddev %s, %s' % (label, stats['count'],
+            fmt(stats['min']), fmt(stats['max']), fmt(stats['mean']),
+            fmt(stats['stddev']), percentiles),
+        '%s: mean %s, stddev %s' % (label, fmt(stats['mean']), fmt(stats['stddev'])),
+        'Mean %s' % fmt(stats['mean']),
+    ]
@@ -0,0 +1,161 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+
+# Execution profiles of trace decoders: instead of an annotation per
+# sampled or traced PC, counters of the functions, source lines and call
+# stacks they were in, of the calls between functions and of the time
+# spent in exceptions. The call stacks are written in the collapsed
+# format ("main;work;helper 42" per line) flame graph tools read.
+
+from collections import Counter
+
+from common.stats import Summary
+
+__all__ = ['TraceProfile']
+
+class TraceProfile:
+    '''
+    Counters of the code locations a trace passed through.
+
+    execute() counts hits of a function, at the top of the current call
+    stack, which it updates: returning to a function on the stack pops
+    the frames above it, a call pushes one, other changes (jumps, tail
+    calls, PC samples) replace the top frame. Exceptions push a frame
+    named after them in brackets, which the functions called from the
+    handler go above, and returns do not cross.
+    '''
+
+    def __init__(self):
+        self.hits = 0
+        self.functions = Counter()
+        self.lines = Counter()
+        self.stacks = Counter()
+        self.calls = Counter()
+        self.exceptions = {}
+        self.stack = []
+        # Exceptions being handled, as (stack depth, name, entry sample).
+        self._handling = []
+        self._key = ()
+
+    def __bool__(self):
+        return self.hits > 0 or bool(self.exceptions)
+
+    def _base(self):
+        return self._handling[-1][0] + 1 if self._handling else 0
+
+    def execute(self, function, location=None, call=False, count=1):
+        '''
+        Count count hits of function (at the source location, when known).
+        call tells that the function was entered by a call instruction.
+        '''
+        stack = self.stack
+        if not stack or stack[-1] != function:
+            base = self._base()
+            try:
+                # Returns go back to the innermost frame of the function.
+                depth = len(stack) - 1 - stack[::-1].index(function)
+            except ValueError:
+                depth = -1
+            if depth >= base:
+                del stack[depth + 1:]
+            elif call and len(stack) > base:
+                self.calls[stack[-1], function] += 1
+                stack.append(function)
+            elif len(stack) > base:
+                stack[-1] = function
+            else:
+                stack.append(function)
+            self._key = tuple(stack)
+
+        self.hits += count
+        self.functions[function] += count
+        if location:
+            self.lines[location] += count
+        self.stacks[self._key] += count
+
+    def exception_enter(self, name, sample):
+        '''The start of the handling of exception name, at sample.'''
+        self._handling.append((len(self.stack), name, sample))
+        self.stack.append('[%s]' % name)
+        self._key = tuple(self.stack)
+
+    def exception_exit(self, sample, name=None):
+        '''
+        The end of the handling of exception name (the innermost one when
+        None), at sample. Exceptions nested in it end with it.
+        '''
+        names = [h[1] for h in self._handling]
+        if not names or (name is not None and name not in names):
+            return
+        i = len(names) - 1 if name is None else len(names) - 1 - names[::-1].index(name)
+        for depth, exc, entry in self._handling[i:]:
+            summary = self.exceptions.get(exc)
+            if summary is None:
+                summary = self.exceptions[exc] = Summary()
+            summary.add(sample - entry)
+        del self.stack[self._handling[i][0]:]
+        del self._handling[i:]
+        self._key = tuple(self.stack)
+
+    def exception_resume(self, sample, name=None):
+        '''
+        Execution went back to the handler of exception name, or to thread
+        mode with None: the exceptions nested in it ended at sample.
+        '''
+        names = [h[1] for h in self._handling]
+        if name is None:
+            if names:
+                self.exception_exit(sample, names[0])
+        elif name in names:
+            i = len(names) - 1 - names[::-1].index(name)
+            if i + 1 < len(names):
+                self.exception_exit(sample, names[i + 1])
+
+    def restart(self):
+        '''Forget the call stack, when the trace was interrupted.'''
+        self.stack = []
+        self._handling = []
+        self._key = ()
+
+    def collapsed(self):
+        '''The call stacks with their hits, as lines of collapsed stacks.'''
+        for stack, count in sorted(self.stacks.items()):
+            if stack:
+                yield '%s %d' % (';'.join(stack), count)
+
+    def summary(self, samplerate=None):
+        '''
+        The counters as a dict for JSON: hits per function and per source
+        line, calls as [caller, callee, count] and the statistics of the
+        exception durations (see common.stats.Summary), in seconds with a
+        samplerate and in samples otherwise.
+        '''
+        divisor = samplerate or 1
+        exceptions = {}
+        for name, summary in sorted(self.exceptions.items()):
+            stats = summary.stats(divisor)
+            stats['total'] = sum(v * c for v, c in summary.sorted(divisor))
+            exceptions[name] = stats
+        return {
+            'hits': self.hits,
+            'functions': dict(self.functions.most_common()),
+            'lines': dict(self.lines.most_common()),
+            'calls': [[a, b, n] for (a, b), n in self.calls.most_common()],
+            'exceptions': exceptions,
+            'unit': 's' if samplerate else 'samples',
+        }
@@ -0,0 +1,177 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+# Streamed WAV files. Decoders put the bytes a WavStream returns to an
+# OUTPUT_BINARY class, the consumer appends them to a file and calls
+# finish() once the decoder is done: the header is written before the
+# length is known, with a JUNK chunk that finish() turns into the ds64
+# chunk of an RF64 file (EBU Tech 3306) when the data exceeds 4 GiB.
+
+import struct
+
+__all__ = ['WavStream', 'finish', 'STANDARD_RATES']
+
+# Audio rates the rate measured from the capture is snapped to.
+STANDARD_RATES = (8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000,
+    88200, 96000, 176400, 192000)
+
+# Frames per put, and the rate used when the capture has no samplerate.
+BATCH_FRAMES = 4096
+DEFAULT_RATE = 48000
+
+UNKNOWN_SIZE = 0xFFFFFFFF
+DS64_SIZE = 28
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+KSDATAFORMAT_SUBTYPE_PCM = bytes.fromhex('0100000000001000800000aa00389b71')
+
+def _chunk(fourcc, data, size=None):
+    return fourcc + struct.pack('<I', len(data) if size is None else size) + data
+
+def _audio_rate(frames, seconds):
+    rate = frames / seconds
+    nearest = min(STANDARD_RATES, key=lambda r: abs(r - rate))
+    return nearest if abs(nearest - rate) <= nearest * 0.01 else int(round(rate))
+
+class WavStream:
+    '''
+    Audio frames (one value per channel, MSB-first words as received)
+    turned into a WAV file. The first frame sets the channel count and
+    the word width; the frame rate is measured over the first batch of
+    frames, from their start samples at the capture's samplerate.
+
+    frame() and flush() return the bytes to put next, the header in
+    front of the first batch.
+    '''
+
+    def __init__(self, samplerate=None, batch_frames=BATCH_FRAMES):
+        self.samplerate = samplerate
+        self.batch_frames = batch_frames
+        self.channels = None
+        self.bits = None
+        self.width = None
+        self.rate = None
+        self.frames = 0
+        self._first = self._last = None
+        self._values = []
+
+    def frame(self, sample, values, bits):
+        '''Add a frame starting at the given sample, of bits wide words.'''
+        if self.channels is None:
+            self.channels = len(values)
+            self.bits = bits
+            self.width = (bits + 7) // 8
+        if self._first is None:
+            self._first = sample
+        self._last = sample
+        values = list(values[:self.channels])
+        values += [0] * (self.channels - len(values))
+        # Words are left aligned in their container, as WAV expects.
+        shift = self.width * 8 - bits
+        if shift >= 0:
+            self._values.extend(v << shift for v in values)
+        else:
+            self._values.extend(v >> -shift for v in values)
+        self.frames += 1
+        if len(self._values) < self.batch_frames * self.channels:
+            return b''
+        return self.flush()
+
+    def flush(self):
+        '''The frames that were not returned yet.'''
+        if not self._values:
+            return b''
+        data = b''
+        if self.rate is None:
+            self.rate = self.measure_rate()
+            data = self.header()
+        data += self.pack(self._values)
+        self._values = []
+        return data
+
+    def measure_rate(self):
+        frames = len(self._values) // self.channels
+        if not self.samplerate or frames < 2 or self._last <= self._first:
+            return DEFAULT_RATE
+        return _audio_rate(frames - 1, (self._last - self._first) / self.samplerate)
+
+    def header(self):
+        '''RIFF header up to the data chunk, with the sizes left open.'''
+        align = self.channels * self.width
+        fmt = struct.pack('<HIIHH', self.channels, self.rate, self.rate * align,
+            align, self.width * 8)
+        if self.channels > 2 or self.width > 2 or self.bits != self.width * 8:
+            fmt = struct.pack('<H', WAVE_FORMAT_EXTENSIBLE) + fmt + \
+                struct.pack('<HHI', 22, self.bits, 0) + KSDATAFORMAT_SUBTYPE_PCM
+        else:
+            fmt = struct.pack('<H', WAVE_FORMAT_PCM) + fmt
+        h = _chunk(b'RIFF', b'WAVE', UNKNOWN_SIZE)
+        h += _chunk(b'JUNK', bytes(DS64_SIZE))
+        h += _chunk(b'fmt ', fmt)
+        h += _chunk(b'data', b'', UNKNOWN_SIZE)
+        return h
+
+    def pack(self, values):
+        mask = (1 << (self.width * 8)) - 1
+        if self.width == 1:
+            # 8 bit WAV samples are unsigned.
+            return bytes((v ^ 0x80) & mask for v in values)
+        if self.width == 2:
+            return struct.pack('<%dH' % len(values), *(v & mask for v in values))
+        if self.width == 4:
+            return struct.pack('<%dI' % len(values), *(v & mask for v in values))
+        return b''.join((v & mask).to_bytes(self.width, 'little') for v in values)
+
+def finish(f):
+    '''
+    Fill in the sizes of a streamed WAV file, given as a file object
+    open for reading and writing. Files over 4 GiB become RF64 files.
+    '''
+    length = f.seek(0, 2)
+    f.seek(0)
+    head = f.read(12)
+    if head[:4] != b'RIFF' or head[8:] != b'WAVE':
+        return
+    pos, junk, block_align = 12, None, 1
+    while True:
+        f.seek(pos)
+        fourcc, size = struct.unpack('<4sI', f.read(8))
+        if fourcc == b'data':
+            break
+        if fourcc == b'JUNK':
+            junk = pos
+        elif fourcc == b'fmt ':
+            block_align = struct.unpack('<12xH', f.read(14))[0]
+        pos += 8 + size + (size & 1)
+    data_size = length - pos - 8
+    if data_size & 1:
+        f.seek(0, 2)
+        f.write(b'\x00')
+        length += 1
+    if length - 8 <= 0xFFFFFFFF:
+        f.seek(4)
+        f.write(struct.pack('<I', length - 8))
+        f.seek(pos + 4)
+        f.write(struct.pack('<I', data_size))
+    elif junk is not None:
+        f.seek(0)
+        f.write(b'RF64' + struct.pack('<I', UNKNOWN_SIZE))
+        f.seek(junk)
+        f.write(_chunk(b'ds64', struct.pack('<QQQI', length - 8, data_size,
+            data_size // block_align, 0)))
+        f.seek(pos + 4)
+        f.write(struct.pack('<I', UNKNOWN_SIZE))
@@ -20,6 +20,21 @@
 import sigrokdecode as srd
 from .lists import *
 
+'''
+OUTPUT_PYTHON format:
+
+Packet:
+[<ptype>, <pdata>]
+
+<ptype>, <pdata>:
+ - 'FORWARD', [<address>, <data>]
+ - 'BACKWARD', <data>
+
+<address> is the first byte of a forward frame (address and select bit),
+<data> the command/data byte of a forward frame or the reply byte of a
+backward frame.
+'''
+
 class SamplerateError(Exception):
     pass
 
@@ -31,7 +46,7 @@ class Decoder(srd.Decoder):
     desc = 'Digital Addressable Lighting Interface (DALI) protocol.'
     license = 'gplv2+'
     inputs = ['logic']
-    outputs = []
+    outputs = ['dali']
     tags = ['Embedded/industrial', 'Lighting']
     channels = (
         {'id': 'dali', 'name': 'DALI', 'desc': 'DALI data line'},
@@ -67,6 +82,7 @@ class Decoder(srd.Decoder):
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.old_dali = 1 if self.options['polarity'] == 'active-low' else 0
 
     def metadata(self, key, value):
@@ -80,6 +96,10 @@ class Decoder(srd.Decoder):
         ss, es = self.ss_es_bits[bit1][0], self.ss_es_bits[bit2][1]
         self.put(ss, es, self.out_ann, data)
 
+    def putpy(self, length, data):
+        ss, es = self.ss_es_bits[0][0], self.ss_es_bits[length - 1][1]
+        self.put(ss, es, self.out_python, data)
+
     def handle_bits(self, length):
         a, c, f, g, b = 0, 0, 0, 0, self.bits
         # Individual raw bits.
@@ -105,6 +125,7 @@ class Decoder(srd.Decoder):
             s = ['Reply: %d' % f, 'Rply: %d' % f,
                  'Rep: %d' % f, 'R: %d' % f, 'R']
             self.putb(1, 8, [6, s])
+            self.putpy(length, ['BACKWARD', f])
             return
 
         # FORWARD FRAME
@@ -194,18 +215,32 @@ class Decoder(srd.Decoder):
             s = ['Arc Power Level: %d' % c, 'Level: %d' % c,
                  'Lev: %d' % c, 'L: %d' % c, 'L']
         self.putb(9, 16, [5, s])
+        self.putpy(length, ['FORWARD', [f, c]])
 
     def reset_decoder_state(self):
         self.edges, self.bits, self.ss_es_bits = [], [], []
         self.state = 'IDLE'
 
+    def conditions(self, dali):
+        '''Conditions for the next sample the state machine acts upon.'''
+        # Samples which differ from the previous level, and the timeout
+        # which takes the place of a missing mid-bit edge.
+        if dali is None or dali != self.old_dali:
+            return None
+        if self.state == 'IDLE':
+            return {0: 'e'}
+        timeout = self.edges[-1] + int(self.halfbit * 1.5) - self.samplenum
+        if timeout <= 0:
+            return {0: 'e'}
+        return [{0: 'e'}, {'skip': timeout}]
+
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
         bit = 0
+        dali = None
         while True:
-            # TODO: Come up with more appropriate self.wait() conditions.
-            (dali,) = self.wait()
+            (dali,) = self.wait(self.conditions(dali))
             if self.options['polarity'] == 'active-high':
                 dali ^= 1 # Invert.
 
@@ -19,6 +19,7 @@
 ##
 
 import sigrokdecode as srd
+from common.crc import CRC16_MAXIM_DOW
 
 # Dictionary of FUNCTION commands and their names.
 commands_2432 = {
@@ -44,21 +45,9 @@ family_codes = {
     0x23: ('DS2433', commands_2433),
 }
 
-# Calculate the CRC-16 checksum.
+# CRC-16 checksum.
 # Initial value: 0x0000, xor-in: 0x0000, polynom 0x8005, xor-out: 0xffff.
-def crc16(byte_array):
-    reverse = 0xa001 # Use the reverse polynom to make algo simpler.
-    crc = 0x0000 # Initial value.
-    # Reverse CRC calculation.
-    for byte in byte_array:
-        for bit in range(8):
-            if (byte ^ crc) & 1:
-                crc = (crc >> 1) ^ reverse
-            else:
-                crc >>= 1
-            byte >>= 1
-    crc ^= 0xffff # Invert CRC.
-    return crc
+crc16 = CRC16_MAXIM_DOW.calc_bytes
 
 class Decoder(srd.Decoder):
     api_version = 3
@@ -19,6 +19,18 @@
 
 import sigrokdecode as srd
 
+'''
+OUTPUT_PYTHON format:
+
+Packet:
+[<ptype>, <pdata>]
+
+<ptype>, <pdata>:
+ - 'LEVEL', <data>
+
+<data> is the dimmer level byte of a frame.
+'''
+
 class SamplerateError(Exception):
     pass
 
@@ -30,7 +42,7 @@ class Decoder(srd.Decoder):
     desc = 'Digital Serial Interface (DSI) lighting protocol.'
     license = 'gplv2+'
     inputs = ['logic']
-    outputs = []
+    outputs = ['dsi']
     tags = ['Embedded/industrial', 'Lighting']
     channels = (
         {'id': 'dsi', 'name': 'DSI', 'desc': 'DSI data line'},
@@ -61,6 +73,7 @@ class Decoder(srd.Decoder):
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.old_dsi = 1 if self.options['polarity'] == 'active-low' else 0
 
     def metadata(self, key, value):
@@ -100,19 +113,34 @@ class Decoder(srd.Decoder):
             s = ['Level: %d%%' % g, 'Lev: %d%%' % g,
                  'Lev: %d%%' % g, 'L: %d' % g, 'D']
             self.putb(1, 8, [2, s])
+            ss, es = self.ss_es_bits[0][0], self.ss_es_bits[8][1]
+            self.put(ss, es, self.out_python, ['LEVEL', f])
             return
 
     def reset_decoder_state(self):
         self.edges, self.bits, self.ss_es_bits = [], [], []
         self.state = 'IDLE'
 
+    def conditions(self):
+        '''Conditions for the next sample the state machine acts upon.'''
+        # Samples which differ from the previous level, and the timeout
+        # which takes the place of a missing mid-bit edge.
+        if self.dsi is None or self.dsi != self.old_dsi:
+            return None
+        if self.state == 'IDLE':
+            return {0: 'e'}
+        timeout = self.edges[-1] + int(self.halfbit * 1.5) - self.samplenum
+        if timeout <= 0:
+            return {0: 'e'}
+        return [{0: 'e'}, {'skip': timeout}]
+
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
         bit = 0
+        self.dsi = None
         while True:
-            # TODO: Come up with more appropriate self.wait() conditions.
-            (self.dsi,) = self.wait()
+            (self.dsi,) = self.wait(self.conditions())
             if self.options['polarity'] == 'active-high':
                 self.dsi ^= 1 # Invert.
 
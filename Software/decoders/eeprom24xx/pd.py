@@ -19,6 +19,7 @@
 
 import copy
 import sigrokdecode as srd
+from common.memory import MemoryImage
 from .lists import *
 
 class Decoder(srd.Decoder):
@@ -85,6 +86,8 @@ class Decoder(srd.Decoder):
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.chip = chips[self.options['chip']]
         self.addr_counter = self.options['addr_counter']
+        # EEPROM contents as seen in reads and writes.
+        self.memory = MemoryImage(self.chip['size'])
 
     def putb(self, data):
         self.put(self.ss_block, self.es_block, self.out_ann, data)
@@ -159,7 +162,17 @@ class Decoder(srd.Decoder):
             (s, p[3]), 'Data byte: %02X' % p[3], \
             'Byte: %02X' % p[3], 'DB: %02X' % p[3], '%02X' % p[3]]])
 
+    def update_memory(self, ss, addr, data, write):
+        if write:
+            wrap = self.chip['page_size'] if self.chip['page_wraparound'] else None
+            self.memory.write(ss, addr, data, wrap)
+        else:
+            # Sequential reads roll over at the end of the memory.
+            self.memory.read(ss, addr % self.chip['size'], data, self.chip['size'])
+
     def put_data_bytes(self, idx, cls, s):
+        self.update_memory(self.packets[idx][0], self.addr_counter,
+            self.bytebuf[self.chip['addr_bytes']:], cls in (9, 10))
         for p in self.packets[idx:]:
             self.put_data_byte(p)
             self.addr_counter += 1
@@ -220,6 +233,8 @@ class Decoder(srd.Decoder):
             self.putb([11, ['Current address read: %02X' % self.bytebuf[0],
                        'Current address read', 'Cur addr read', 'CAR', 'C']])
             self.putbin([0, bytes([self.bytebuf[0]])])
+            self.update_memory(self.packets[1][0], self.addr_counter,
+                self.bytebuf[:1], False)
             self.addr_counter += 1
         elif self.is_random_access_read:
             # Random access read: word address, one data byte.
@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from common.memory import MemoryImage
 
 class Decoder(srd.Decoder):
     api_version = 3
@@ -60,6 +61,10 @@ class Decoder(srd.Decoder):
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.addresssize = self.options['addresssize']
         self.wordsize = self.options['wordsize']
+        # EEPROM contents as seen in reads, writes and erases. Words are
+        # stored MSB-first, at byte addresses.
+        self.wordbytes = (self.wordsize + 7) // 8
+        self.memory = MemoryImage((1 << self.addresssize) * self.wordbytes)
 
     def put_address(self, data):
         # Get address (MSb first).
@@ -69,6 +74,10 @@ class Decoder(srd.Decoder):
         self.put(data[0].ss, data[-1].es, self.out_ann,
                  [0, ['Address: 0x%04x' % a, 'Addr: 0x%04x' % a, '0x%04x' % a]])
         self.put(data[0].ss, data[-1].es, self.out_binary, [0, bytes([a])])
+        return a
+
+    def word_bytes(self, word):
+        return (word & ((1 << self.wordsize) - 1)).to_bytes(self.wordbytes, 'big')
 
     def put_word(self, si, data):
         # Decode word (MSb first).
@@ -93,6 +102,7 @@ class Decoder(srd.Decoder):
                      self.out_ann, [idx, ['Data: 0x%04x' % word, '0x%04x' % word]])
             self.put(data[0].ss, data[-1].es, self.out_binary,
                      [1, bytes([(word & 0xff00) >> 8, word & 0xff])])
+        return word
 
     def decode(self, ss, es, data):
         if len(data) < (2 + self.addresssize):
@@ -105,36 +115,43 @@ class Decoder(srd.Decoder):
             # READ instruction.
             self.put(data[0].ss, data[1].es,
                      self.out_ann, [0, ['Read word', 'READ']])
-            self.put_address(data[2:2 + self.addresssize])
+            a = self.put_address(data[2:2 + self.addresssize])
 
             # Get all words.
             word_start = 2 + self.addresssize
+            words = b''
             while len(data) - word_start > 0:
                 # Check if there are enough bits for a word.
                 if len(data) - word_start < self.wordsize:
                     self.put(data[word_start].ss, data[len(data) - 1].es,
                              self.out_ann, [2, ['Not enough word bits']])
                     break
-                self.put_word(False, data[word_start:word_start + self.wordsize])
+                words += self.word_bytes(self.put_word(False,
+                    data[word_start:word_start + self.wordsize]))
                 # Go to next word.
                 word_start += self.wordsize
+            # Sequential reads roll over at the end of the memory.
+            self.memory.read(data[0].ss, a * self.wordbytes, words,
+                self.memory.size)
         elif opcode == 1:
             # WRITE instruction.
             self.put(data[0].ss, data[1].es,
                      self.out_ann, [0, ['Write word', 'WRITE']])
-            self.put_address(data[2:2 + self.addresssize])
+            a = self.put_address(data[2:2 + self.addresssize])
             # Get word.
             if len(data) < 2 + self.addresssize + self.wordsize:
                 self.put(data[2 + self.addresssize].ss,
                          data[len(data) - 1].ss,
                          self.out_ann, [2, ['Not enough word bits']])
             else:
-                self.put_word(True, data[2 + self.addresssize:2 + self.addresssize + self.wordsize])
+                word = self.put_word(True, data[2 + self.addresssize:2 + self.addresssize + self.wordsize])
+                self.memory.write(data[0].ss, a * self.wordbytes, self.word_bytes(word))
         elif opcode == 3:
             # ERASE instruction.
             self.put(data[0].ss, data[1].es,
                      self.out_ann, [0, ['Erase word', 'ERASE']])
-            self.put_address(data[2:2 + self.addresssize])
+            a = self.put_address(data[2:2 + self.addresssize])
+            self.memory.erase(data[0].ss, a * self.wordbytes, self.wordbytes)
         elif opcode == 0:
             if data[2].si == 1 and data[3].si == 1:
                 # WEN instruction.
@@ -149,6 +166,7 @@ class Decoder(srd.Decoder):
                 self.put(data[0].ss, data[2 + self.addresssize - 1].es,
                          self.out_ann, [0, ['Erase all memory',
                                             'Erase all', 'ERAL']])
+                self.memory.erase_all(data[0].ss)
             elif data[2].si == 0 and data[3].si == 1:
                 # WRAL instruction.
                 self.put(data[0].ss, data[2 + self.addresssize - 1].es,
@@ -160,4 +178,6 @@ class Decoder(srd.Decoder):
                              data[len(data) - 1].ss,
                              self.out_ann, [2, ['Not enough word bits']])
                 else:
-                    self.put_word(True, data[2 + self.addresssize:2 + self.addresssize + self.wordsize])
+                    word = self.put_word(True, data[2 + self.addresssize:2 + self.addresssize + self.wordsize])
+                    self.memory.write(data[0].ss, 0,
+                        self.word_bytes(word) * (1 << self.addresssize))
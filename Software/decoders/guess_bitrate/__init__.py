@@ -34,7 +34,13 @@ samplerate used to sample the respective channel. For good results it is
 recommended to use a logic analyzer samplerate that is much higher than
 the expected bitrate/baudrate that might be used on the channel.
 
-The last annotation emitted by the decoder will be the best bitrate guess.
+The bitrate is fitted to the widths of all pulses seen so far, which makes
+it robust against glitches. It is reported after 16 pulses, and then every
+time their number doubles, together with the share of the pulses that it
+explains (the confidence) and the nearest standard baudrate. At the end of
+the capture, it is reported for all pulses once more (unless the last
+report already covered them), so the last annotation emitted by the
+decoder will be the best bitrate guess.
 '''
 
 from .pd import Decoder
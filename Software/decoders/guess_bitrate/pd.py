@@ -18,10 +18,87 @@
 ##
 
 import sigrokdecode as srd
+from math import log
 
 class SamplerateError(Exception):
     pass
 
+# Common UART (and other serial) bitrates, to name the nearest one.
+STANDARD_BITRATES = (
+    50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800, 9600,
+    14400, 19200, 28800, 31250, 38400, 56000, 57600, 76800, 115200, 128000,
+    230400, 250000, 256000, 460800, 500000, 576000, 921600, 1000000,
+    1152000, 1500000, 2000000, 2500000, 3000000, 3500000, 4000000,
+)
+
+# Pulses of up to this many bit times are fitted. Longer ones are idle
+# periods between frames and tell nothing about the bit time.
+MAX_BITS = 16
+
+# Widths whose pulses make less than this share of all pulses are taken
+# for glitches, and not as candidates for the bit time.
+GLITCH_SHARE = 0.005
+
+# The estimate is reported after this many pulses, and then every time
+# their number doubles.
+FIRST_REPORT = 16
+
+def clusters(histogram):
+    # Group the widths of a histogram (width: count) that lie within 10%
+    # of each other, as (mean width, count) per group, shortest first.
+    groups = []
+    for width in sorted(histogram):
+        count = histogram[width]
+        if groups and width <= groups[-1][0] * 1.1 + 1:
+            groups[-1][1] += count
+            groups[-1][2] += width * count
+        else:
+            groups.append([width, count, width * count])
+    return [(total / count, count) for _, count, total in groups]
+
+def fit(histogram, unit):
+    # Refine a bit time on the pulses that are close to one of its
+    # multiples. Returns the refined bit time, the number of those pulses,
+    # and the number of pulses considered (those not longer than MAX_BITS).
+    tolerance = max(unit / 4, 1)
+    widths = bits = matched = considered = 0
+    for width in sorted(histogram):
+        count = histogram[width]
+        n = round(width / unit)
+        if n > MAX_BITS:
+            break
+        considered += count
+        if n and abs(width - n * unit) <= tolerance:
+            widths += width * count
+            bits += n * count
+            matched += count
+    return (widths / bits if bits else unit), matched, considered
+
+def estimate(histogram):
+    # The bit time (in samples) that best explains a histogram of pulse
+    # widths, and the share of the pulses it explains, or None. Candidates
+    # are the shortest (non-glitch) width and its fractions, in case no
+    # single-bit pulses were seen. A fraction explains at least as many
+    # pulses as the whole, so it has to explain clearly more to be taken.
+    total = sum(histogram.values())
+    groups = [g for g in clusters(histogram) if g[1] >= total * GLITCH_SHARE]
+    if not groups:
+        return None
+    best = None
+    for divisor in range(1, 5):
+        unit = groups[0][0] / divisor
+        if unit < 1:
+            break
+        for _ in range(3):
+            unit, matched, considered = fit(histogram, unit)
+        confidence = matched / considered if considered else 0.0
+        if best is None or confidence > best[1] + 0.05:
+            best = (unit, confidence)
+    return best
+
+def nearest_standard(bitrate):
+    return min(STANDARD_BITRATES, key=lambda b: abs(log(bitrate / b)))
+
 class Decoder(srd.Decoder):
     api_version = 3
     id = 'guess_bitrate'
@@ -37,10 +114,12 @@ class Decoder(srd.Decoder):
     )
     annotations = (
         ('bitrate', 'Bitrate / baudrate'),
+        ('standard', 'Nearest standard bitrate'),
+    )
+    annotation_rows = (
+        ('bitrates', 'Bitrates', (0,)),
+        ('standards', 'Standard bitrates', (1,)),
     )
-
-    def putx(self, data):
-        self.put(self.ss_edge, self.samplenum, self.out_ann, data)
 
     def __init__(self):
         self.reset()
@@ -50,30 +129,62 @@ class Decoder(srd.Decoder):
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_bitrate = self.register(srd.OUTPUT_META,
+                meta=(int, 'Bitrate', 'Estimated bitrate'))
 
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
 
+    def report(self, ss, es, histogram):
+        # Emit the estimate for the pulse widths seen so far.
+        guess = estimate(histogram)
+        if guess is None:
+            return
+        unit, confidence = guess
+        bitrate = int(float(self.samplerate) / unit)
+        if bitrate < 1:
+            return
+        percent = int(confidence * 100)
+        self.put(ss, es, self.out_ann, [0, [
+            'Bitrate: %d (confidence %d%%)' % (bitrate, percent),
+            '%d (%d%%)' % (bitrate, percent), '%d' % bitrate]])
+        standard = nearest_standard(bitrate)
+        deviation = (bitrate - standard) * 100.0 / standard
+        self.put(ss, es, self.out_ann, [1, [
+            'Nearest standard: %d (%+.1f%%)' % (standard, deviation),
+            'Std: %d' % standard, '%d' % standard]])
+        self.put(ss, es, self.out_bitrate, bitrate)
+
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
 
         # Get the first edge on the data line.
         self.wait({0: 'e'})
-        self.ss_edge = self.samplenum
-
-        # Get any subsequent edge on the data line. Get the smallest
-        # distance between any two transitions, assuming it corresponds
-        # to one bit time of the respective bitrate of the input stream.
-        # This heuristics keeps getting better for longer captures.
-        bitwidth = None
-        while True:
-            self.wait({0: 'e'})
-
-            b = self.samplenum - self.ss_edge
-            if bitwidth is None or b < bitwidth:
-                bitwidth = b
-                bitrate = int(float(self.samplerate) / float(b))
-                self.putx([0, ['%d' % bitrate]])
-            self.ss_edge = self.samplenum
+        self.ss_edge = last = self.samplenum
+
+        # Collect the distances between subsequent edges in a histogram.
+        # Rather than trusting the smallest one, which a single glitch
+        # ruins, the bit time is fitted to all of them (see estimate()).
+        # The estimate covers all pulses so far, and is reported each time
+        # their number doubles. It keeps getting better for longer captures.
+        histogram = {}
+        pulses, reported, report = 0, 0, FIRST_REPORT
+        try:
+            while True:
+                self.wait({0: 'e'})
+
+                b = self.samplenum - last
+                histogram[b] = histogram.get(b, 0) + 1
+                last = self.samplenum
+                pulses += 1
+                if pulses == report:
+                    self.report(self.ss_edge, self.samplenum, histogram)
+                    self.ss_edge = self.samplenum
+                    reported, report = pulses, report * 2
+        except EOFError:
+            # The estimate over all pulses, unless the last report was.
+            if pulses > reported:
+                self.report(self.ss_edge, last, histogram)
+            raise
@@ -21,6 +21,7 @@
 # TODO: Implement support for inverting SDA/SCL levels (0->1 and 1->0).
 # TODO: Implement support for detecting various bus errors.
 
+from common.pcap import LINKTYPE_I2C_LINUX, PcapngWriter, i2c_linux_message
 from common.srdhelper import bitpack_msb
 import sigrokdecode as srd
 
@@ -107,6 +108,7 @@ class Decoder(srd.Decoder):
         ('address-write', 'Address write'),
         ('data-read', 'Data read'),
         ('data-write', 'Data write'),
+        ('pcap', 'Messages (pcapng)'),
     )
 
     def __init__(self):
@@ -123,10 +125,17 @@ class Decoder(srd.Decoder):
         self.pdu_bits = 0
         self.data_bits = []
         self.bitwidth = 0
+        self.message = []
+        self.ss_message = None
+        self.pcap = PcapngWriter(LINKTYPE_I2C_LINUX, name='i2c')
+        self.shown_anns = set(range(len(self.annotations)))
+        self.python_used = True
+        self.binary_used = False
 
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            self.pcap.samplerate = value
 
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
@@ -136,14 +145,28 @@ class Decoder(srd.Decoder):
                 meta=(int, 'Bitrate', 'Bitrate from Start bit to Stop bit'))
 
     def putg(self, ss, es, cls, text):
+        if cls not in self.shown_anns:
+            return
         self.put(ss, es, self.out_ann, [cls, text])
 
     def putp(self, ss, es, data):
+        if not self.python_used:
+            return
         self.put(ss, es, self.out_python, data)
 
     def putb(self, ss, es, data):
+        if not self.binary_used:
+            return
         self.put(ss, es, self.out_binary, data)
 
+    def put_message(self, es):
+        # The bytes since the last (repeated) START as one message of the
+        # Linux I2C pcap format, the address byte first.
+        if self.message:
+            data = i2c_linux_message(self.message[0], self.message[1:])
+            self.putb(self.ss_message, es, [4, self.pcap.packet(self.ss_message, data)])
+        self.message = []
+
     def _wants_start(self):
         # Check whether START is required (to sync to the input stream).
         return self.pdu_start is None
@@ -160,6 +183,8 @@ class Decoder(srd.Decoder):
         return self.data_bits is None or len(self.data_bits) < 8
 
     def handle_start(self, ss, es):
+        self.put_message(ss)
+        self.ss_message = ss
         if self.is_repeat_start:
             cmd = 'START REPEAT'
         else:
@@ -201,6 +226,8 @@ class Decoder(srd.Decoder):
         # Get the byte value. Address and data are transmitted MSB-first.
         d = bitpack_msb(self.data_bits, 0)
         ss_byte, es_byte = self.data_bits[0][1], self.data_bits[-1][2]
+        if self.binary_used:
+            self.message.append(d)
 
         # Process the address bytes at the start of a transfer. The
         # first byte will carry the R/W bit, and all of the 7bit address
@@ -263,10 +290,11 @@ class Decoder(srd.Decoder):
 
         self.putb(ss_byte, es_byte, [bin_class, bytes([d])])
 
-        for bit_value, ss_bit, es_bit in lsb_bits:
-            cls, texts = proto['BIT'][0], proto['BIT'][1:]
-            texts = [t.format(b = bit_value) for t in texts]
-            self.putg(ss_bit, es_bit, cls, texts)
+        cls = proto['BIT'][0]
+        if cls in self.shown_anns:
+            for bit_value, ss_bit, es_bit in lsb_bits:
+                texts = [t.format(b = bit_value) for t in proto['BIT'][1:]]
+                self.putg(ss_bit, es_bit, cls, texts)
 
         if is_address and has_rw_bit:
             # Assign the last bit's location to the R/W annotation.
@@ -278,8 +306,9 @@ class Decoder(srd.Decoder):
             self.putg(ss_bit, es_bit, cls, w)
 
         cls, texts = proto[cmd][0], proto[cmd][1:]
-        texts = [t.format(b = d) for t in texts]
-        self.putg(ss_byte, es_byte, cls, texts)
+        if cls in self.shown_anns:
+            texts = [t.format(b = d) for t in texts]
+            self.putg(ss_byte, es_byte, cls, texts)
 
     def get_ack(self, ss, es, value):
         ss_bit, es_bit = ss, es
@@ -306,6 +335,7 @@ class Decoder(srd.Decoder):
             self.pdu_start = None
             self.pdu_bits = 0
 
+        self.put_message(es)
         cmd = 'STOP'
         self.putp(ss, es, [cmd, None])
         cls, texts = proto[cmd][0], proto[cmd][1:]
@@ -315,6 +345,12 @@ class Decoder(srd.Decoder):
         self.data_bits.clear()
 
     def decode(self):
+        self.shown_anns = self.subscribed_annotations()
+        self.python_used = self.is_subscribed(self.out_python)
+        self.binary_used = self.is_subscribed(self.out_binary)
+        if self.binary_used:
+            self.put(0, 0, self.out_binary, [4, self.pcap.header()])
+
         # Check for several bus conditions. Determine sample numbers
         # here and pass ss, es, and bit values to handling routines.
         while True:
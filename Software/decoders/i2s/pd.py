@@ -18,7 +18,7 @@
 ##
 
 import sigrokdecode as srd
-import struct
+from common.wav import WavStream
 
 '''
 OUTPUT_PYTHON format:
@@ -69,7 +69,9 @@ class Decoder(srd.Decoder):
         self.first_sample = None
         self.ss_block = None
         self.wordlength = -1
-        self.wrote_wav_header = False
+        self.wav = WavStream()
+        self.wav_left = None
+        self.binary_used = False
 
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
@@ -79,6 +81,7 @@ class Decoder(srd.Decoder):
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            self.wav.samplerate = value
 
     def putpb(self, data):
         self.put(self.ss_block, self.samplenum, self.out_python, data)
@@ -103,29 +106,34 @@ class Decoder(srd.Decoder):
         return 'I²S: %d %d-bit samples received at %sHz' % \
             (self.samplesreceived, self.wordlength, samplerate)
 
-    def wav_header(self):
-        # Chunk descriptor
-        h  = b'RIFF'
-        h += b'\x24\x80\x00\x00' # Chunk size (2084)
-        h += b'WAVE'
-        # Fmt subchunk
-        h += b'fmt '
-        h += b'\x10\x00\x00\x00' # Subchunk size (16 bytes)
-        h += b'\x01\x00'         # Audio format (0x0001 == PCM)
-        h += b'\x02\x00'         # Number of channels (2)
-        h += b'\x80\x3e\x00\x00' # Samplerate (16000)
-        h += b'\x00\xfa\x00\x00' # Byterate (64000)
-        h += b'\x04\x00'         # Blockalign (4)
-        h += b'\x20\x00'         # Bits per sample (32)
-        # Data subchunk
-        h += b'data'
-        h += b'\xff\xff\xff\xff' # Subchunk size (4G bytes) TODO
-        return h
-
-    def wav_sample(self, sample):
-        return struct.pack('<I', self.data)
+    def wav_sample(self, idx):
+        # Pair each right word with the left word before it. The stream
+        # batches the frames and puts the header in front of the first
+        # batch, once the frame rate is known.
+        if not self.binary_used:
+            return
+        if idx == 0:
+            self.wav_left = (self.ss_block, self.data)
+            return
+        if self.wav_left is None:
+            return
+        ss, left = self.wav_left
+        self.wav_left = None
+        data = self.wav.frame(ss, [left, self.data], self.bitcount)
+        if data:
+            self.putbin([0, data])
 
     def decode(self):
+        self.binary_used = self.is_subscribed(self.out_binary)
+        try:
+            self.decode_words()
+        except EOFError:
+            data = self.wav.flush()
+            if data:
+                self.put(self.ss_block, self.samplenum, self.out_binary, [0, data])
+            raise
+
+    def decode_words(self):
         while True:
             # Wait for a rising edge on the SCK pin.
             sck, ws, sd = self.wait({0: 'r'})
@@ -139,11 +147,6 @@ class Decoder(srd.Decoder):
 
             # Only submit the sample, if we received the beginning of it.
             if self.ss_block is not None:
-
-                if not self.wrote_wav_header:
-                    self.put(0, 0, self.out_binary, [0, self.wav_header()])
-                    self.wrote_wav_header = True
-
                 self.samplesreceived += 1
 
                 sck = self.wait({0: 'f'})
@@ -156,7 +159,7 @@ class Decoder(srd.Decoder):
                 self.putpb(['DATA', [c3, self.data]])
                 self.putb([idx, ['%s: %s' % (c1, v), '%s: %s' % (c2, v),
                                  '%s: %s' % (c3, v), c3]])
-                self.putbin([0, self.wav_sample(self.data)])
+                self.wav_sample(idx)
 
                 # Check that the data word was the correct length.
                 if self.wordlength != -1 and self.wordlength != self.bitcount:
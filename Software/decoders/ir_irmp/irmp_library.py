@@ -153,6 +153,36 @@ class IrmpLibrary:
         self._lib.irmp_get_result_data(ctypes.byref(self._data))
         return True
 
+    def add_samples(self, levels):
+        '''
+        Feed a buffer of samples (one level per library sample, e.g. bytes).
+        Returns the result data of every frame detected in it.
+        '''
+
+        return self.add_runs((level, 1) for level in levels)
+
+    def add_runs(self, runs):
+        '''
+        Feed (level, count) pairs, each a level held for count library
+        samples. Returns the result data of every frame detected in them.
+        Start and end are counted in library samples since the last state
+        reset, like for single samples.
+
+        The library only exports a per-sample entry point, so this still
+        makes one library call per sample. It is no faster than calling
+        add_one_sample() in a loop, it just saves the caller that loop.
+        '''
+
+        add = self._lib.irmp_add_one_sample
+        frames = []
+        for level, count in runs:
+            level = int(level)
+            for _ in range(count):
+                if add(level):
+                    self._lib.irmp_get_result_data(ctypes.byref(self._data))
+                    frames.append(self.get_result_data())
+        return frames
+
     def get_result_data(self):
         if not self._data:
             return None
@@ -127,13 +127,21 @@ class Decoder(srd.Decoder):
         self.rate_factor = int(self.samplerate / lib_rate)
         active = 0 if self.options['polarity'] == 'active-low' else 1
 
+        # Library sample n is the capture sample n * rate_factor. Rather
+        # than waiting for each of them, wait for edges and feed the level
+        # held up to there in one call. Stable periods are fed in steps of
+        # about a millisecond, so frames which end in a long idle period
+        # are reported without waiting for the next edge.
+        step = max(1, lib_rate // 1000) * self.rate_factor
+        fed = 0
+
         ir, = self.wait()
         with self.irmp:
             self.irmp.reset_state()
             while True:
-                if active == 1:
-                    ir = 1 - ir
-                if self.irmp.add_one_sample(ir):
-                    data = self.irmp.get_result_data()
+                level = 1 - ir if active == 1 else ir
+                ir, = self.wait([{0: 'e'}, {'skip': step}])
+                count = -(-self.samplenum // self.rate_factor) - fed
+                for data in self.irmp.add_runs([(level, count)]):
                     self.putframe(data)
-                ir, = self.wait([{'skip': self.rate_factor}])
+                fed += count
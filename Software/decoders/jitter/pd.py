@@ -18,6 +18,21 @@
 ##
 
 import sigrokdecode as srd
+from common.stats import Summary, summary_texts
+
+'''
+OUTPUT_PYTHON format:
+
+Packet:
+['SUMMARY', <stats>]
+
+Put once, at the end of the input, spanning all jitter measurements.
+<stats> is a dict with the statistics of the jitter values, in seconds:
+'count', 'min', 'max', 'mean', 'stddev' and the percentiles 'p50', 'p90',
+'p99'. 'histogram' holds the distinct jitter values with their counts as
+a list of (seconds, count) tuples, and 'clk_missed' and 'sig_missed' the
+numbers of missed transitions.
+'''
 
 # Helper dictionary for edge detection.
 edge_detector = {
@@ -37,7 +52,7 @@ class Decoder(srd.Decoder):
     desc = 'Retrieves the timing jitter between two digital signals.'
     license = 'gplv2+'
     inputs = ['logic']
-    outputs = []
+    outputs = ['jitter']
     tags = ['Clock/timing', 'Util']
     channels = (
         {'id': 'clk', 'name': 'Clock', 'desc': 'Clock reference channel'},
@@ -48,16 +63,20 @@ class Decoder(srd.Decoder):
             'default': 'rising', 'values': ('rising', 'falling', 'both')},
         {'id': 'sig_polarity', 'desc': 'Resulting signal edge polarity',
             'default': 'rising', 'values': ('rising', 'falling', 'both')},
+        {'id': 'annotate', 'desc': 'Annotate every jitter value',
+            'default': 'yes', 'values': ('yes', 'no')},
     )
     annotations = (
         ('jitter', 'Jitter value'),
         ('clk_miss', 'Clock miss'),
         ('sig_miss', 'Signal miss'),
+        ('summary', 'Summary'),
     )
     annotation_rows = (
         ('jitter_vals', 'Jitter values', (0,)),
         ('clk_misses', 'Clock misses', (1,)),
         ('sig_misses', 'Signal misses', (2,)),
+        ('summaries', 'Summary', (3,)),
     )
     binary = (
         ('ascii-float', 'Jitter values as newline-separated ASCII floats'),
@@ -74,11 +93,15 @@ class Decoder(srd.Decoder):
         self.sig_start = None
         self.clk_missed = 0
         self.sig_missed = 0
+        self.first_clk = None
+        self.summary = Summary()
 
     def start(self):
         self.clk_edge = edge_detector[self.options['clk_polarity']]
         self.sig_edge = edge_detector[self.options['sig_polarity']]
+        self.annotate = self.options['annotate'] == 'yes'
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.out_clk_missed = self.register(srd.OUTPUT_META,
             meta=(int, 'Clock missed', 'Clock transition missed'))
@@ -120,6 +143,17 @@ class Decoder(srd.Decoder):
     def putm(self, data):
         self.put(self.samplenum, self.samplenum, self.out_ann, data)
 
+    def put_summary(self):
+        stats = self.summary.stats(self.samplerate)
+        if stats is None:
+            return
+        stats['histogram'] = self.summary.sorted(self.samplerate)
+        stats['clk_missed'] = self.clk_missed
+        stats['sig_missed'] = self.sig_missed
+        ss, es = self.first_clk, self.sig_start
+        self.put(ss, es, self.out_ann, [3, summary_texts('Jitter', stats)])
+        self.put(ss, es, self.out_python, ['SUMMARY', stats])
+
     def handle_clk(self, clk, sig):
         if self.clk_start == self.samplenum:
             # Clock transition already treated.
@@ -160,8 +194,12 @@ class Decoder(srd.Decoder):
             self.state = 'CLK'
             # Calculate and report the timing jitter.
             delta = (self.sig_start - self.clk_start) / self.samplerate
-            self.putx(delta)
+            if self.annotate:
+                self.putx(delta)
             self.putb(delta)
+            if self.first_clk is None:
+                self.first_clk = self.clk_start
+            self.summary.add(self.sig_start - self.clk_start)
             return False
         else:
             if self.clk_start != self.samplenum \
@@ -179,20 +217,27 @@ class Decoder(srd.Decoder):
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
-        while True:
-            # Wait for a transition on CLK and/or SIG.
-            clk, sig = self.wait([{0: 'e'}, {1: 'e'}])
-
-            # State machine:
-            # For each sample we can move 2 steps forward in the state machine.
+        try:
             while True:
-                # Clock state has the lead.
-                if self.state == 'CLK':
-                    if self.handle_clk(clk, sig):
-                        break
-                if self.state == 'SIG':
-                    if self.handle_sig(clk, sig):
-                        break
-
-            # Save current CLK/SIG values for the next round.
-            self.oldclk, self.oldsig = clk, sig
+                # Wait for a transition on CLK and/or SIG.
+                clk, sig = self.wait([{0: 'e'}, {1: 'e'}])
+                self.handle_transition(clk, sig)
+        except EOFError:
+            # The statistics of all jitter values.
+            self.put_summary()
+            raise
+
+    def handle_transition(self, clk, sig):
+        # State machine:
+        # For each sample we can move 2 steps forward in the state machine.
+        while True:
+            # Clock state has the lead.
+            if self.state == 'CLK':
+                if self.handle_clk(clk, sig):
+                    break
+            if self.state == 'SIG':
+                if self.handle_sig(clk, sig):
+                    break
+
+        # Save current CLK/SIG values for the next round.
+        self.oldclk, self.oldsig = clk, sig
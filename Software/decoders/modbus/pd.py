@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from common.crc import CRC16_MODBUS
 from math import ceil
 
 RX = 0
@@ -167,15 +168,7 @@ class Modbus_ADU:
             # have to calculate a CRC on something shorter.
             raise Exception('Could not calculate CRC: message too short')
 
-        result = 0xFFFF
-        magic_number = 0xA001 # As defined in the modbus specification.
-        for byte in self.data[:last_byte - 1]:
-            result = result ^ byte.data
-            for i in range(8):
-                LSB = result & 1
-                result = result >> 1
-                if (LSB): # If the LSB is true.
-                    result = result ^ magic_number
+        result = CRC16_MODBUS.calc_bytes(byte.data for byte in self.data[:last_byte - 1])
         byte1 = result & 0xFF
         byte2 = (result & 0xFF00) >> 8
         return (byte1, byte2)
@@ -323,7 +323,7 @@ class Decoder(srd.Decoder):
             self.format_string = '{{:0{}x}}'.format((self.bitcount + 4 - 1) // 4)
         return [self.format_string.format(value)]
 
-    def decode(self):
+    def setup(self):
         channels = [ch for ch in range(_max_channels) if self.has_channel(ch)]
         have_clk = Pin.CLK in channels
         if have_clk:
@@ -362,6 +362,11 @@ class Decoder(srd.Decoder):
             'hex': self.format_hex,
         }.get(self.options['format'])
         self.format_string = None
+        self.wait_cond = wait_cond
+
+    def decode(self):
+        self.setup()
+        wait_cond = self.wait_cond
 
         pins = self.wait()
         ss = self.samplenum
@@ -193,7 +193,7 @@ class Decoder(srd.Decoder):
         # Pass the current item to the word accumulation logic.
         self.queue_word(now, item, bus_width)
 
-    def decode(self):
+    def setup(self):
         # Determine which (optional) channels have input data. Insist in
         # a non-empty input data set. Cope with sparse connection maps.
         # Store enough state to later "compress" sampled input data.
@@ -218,6 +218,14 @@ class Decoder(srd.Decoder):
         self.fmt_item = "{{:0{}x}}".format(num_digits)
         num_digits = (num_word_bits + 4 - 1) // 4
         self.fmt_word = "{{:0{}x}}".format(num_digits)
+        self.data_indices = data_indices
+        self.num_item_bits = num_item_bits
+
+    def decode(self):
+        self.setup()
+        data_indices = self.data_indices
+        num_item_bits = self.num_item_bits
+        has_data = [idx for idx in data_indices if idx is not None]
 
         # Determine .wait() conditions, depending on the presence of a
         # clock signal. Either inspect samples on the configured edge of
@@ -33,6 +33,7 @@
 #   the spec, and errs towards the usability side.
 
 import sigrokdecode as srd
+from common.crc import Crc, CRC32_ISO_HDLC, reflect
 import struct
 
 ANN_RX_INFO, ANN_HDR_CFG, ANN_PKT_LEN, ANN_META_CRC, ANN_TX_INFO, \
@@ -42,28 +43,8 @@ ANN_RELATION, \
 ANN_WARN, \
     = range(13)
 
-def calc_crc8(data):
-    crc = 0
-    for b in data:
-        crc ^= b
-        for i in range(8):
-            odd = crc % 2
-            crc >>= 1
-            if odd:
-                crc ^= 0x97
-    return crc
-
-def calc_crc32(data):
-    crc = 0xffffffff
-    for b in data:
-        crc ^= b
-        for i in range(8):
-            odd = crc % 2
-            crc >>= 1
-            if odd:
-                crc ^= 0xedb88320
-    crc ^= 0xffffffff
-    return crc
+# The CRC-8 is given with its reversed polynomial 0x97.
+crc8 = Crc(8, reflect(0x97, 8), refin=True, refout=True)
 
 class Decoder(srd.Decoder):
     api_version = 3
@@ -389,7 +370,8 @@ class Decoder(srd.Decoder):
         # Check received against expected checksum. Emit warnings.
         warn_texts = []
         data = self.frame_bytes[:-crc_bytes]
-        want = calc_crc32(data) if crc_len == 32 else calc_crc8(data)
+        crc = CRC32_ISO_HDLC if crc_len == 32 else crc8
+        want = crc.calc_bytes(data)
         if want != have:
             want_text = crc_fmt.format(want)
             warn_texts.append('CRC mismatch - want {} have {}'.format(want_text, have_text))
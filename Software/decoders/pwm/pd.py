@@ -19,6 +19,19 @@
 ##
 
 import sigrokdecode as srd
+from common.stats import Summary, summary_texts
+
+'''
+OUTPUT_PYTHON format:
+
+Packet:
+['SUMMARY', {'duty_cycle': <stats>, 'period': <stats>}]
+
+Put once, at the end of the input, spanning all complete periods. <stats>
+are dicts with the statistics of the duty cycles (in percent) and of the
+periods (in seconds): 'count', 'min', 'max', 'mean', 'stddev' and the
+percentiles 'p50', 'p90', 'p99'.
+'''
 
 class SamplerateError(Exception):
     pass
@@ -31,7 +44,7 @@ class Decoder(srd.Decoder):
     desc = 'Analog level encoded in duty cycle percentage.'
     license = 'gplv2+'
     inputs = ['logic']
-    outputs = []
+    outputs = ['pwm']
     tags = ['Encoding']
     channels = (
         {'id': 'data', 'name': 'Data', 'desc': 'Data line'},
@@ -39,14 +52,18 @@ class Decoder(srd.Decoder):
     options = (
         {'id': 'polarity', 'desc': 'Polarity', 'default': 'active-high',
             'values': ('active-low', 'active-high')},
+        {'id': 'annotate', 'desc': 'Annotate every period', 'default': 'yes',
+            'values': ('yes', 'no')},
     )
     annotations = (
         ('duty-cycle', 'Duty cycle'),
         ('period', 'Period'),
+        ('summary', 'Summary'),
     )
     annotation_rows = (
          ('duty-cycle-vals', 'Duty cycles', (0,)),
          ('periods', 'Periods', (1,)),
+         ('summaries', 'Summary', (2,)),
     )
     binary = (
         ('raw', 'RAW file'),
@@ -65,6 +82,7 @@ class Decoder(srd.Decoder):
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.out_average = \
             self.register(srd.OUTPUT_META,
@@ -93,12 +111,26 @@ class Decoder(srd.Decoder):
     def putb(self, data):
         self.put(self.ss_block, self.es_block, self.out_binary, data)
 
+    def put_summary(self, ss, es, duty_cycles, periods):
+        if not len(periods):
+            return
+        stats = {
+            'duty_cycle': duty_cycles.stats(),
+            'period': periods.stats(self.samplerate),
+        }
+        self.put(ss, es, self.out_ann, [2, summary_texts('Duty cycles',
+            stats['duty_cycle'], lambda v: '%.3f%%' % v)])
+        self.put(ss, es, self.out_ann, [2, summary_texts('Periods', stats['period'])])
+        self.put(ss, es, self.out_python, ['SUMMARY', stats])
+
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
 
         num_cycles = 0
         average = 0
+        annotate = self.options['annotate'] == 'yes'
+        duty_cycles, periods = Summary(), Summary()
 
         # Wait for an "active" edge (depends on config). This starts
         # the first full period of the inspected signal waveform.
@@ -107,35 +139,44 @@ class Decoder(srd.Decoder):
 
         # Keep getting samples for the period's middle and terminal edges.
         # At the same time that last sample starts the next period.
-        while True:
-
-            # Get the next two edges. Setup some variables that get
-            # referenced in the calculation and in put() routines.
-            start_samplenum = self.samplenum
-            self.wait({0: 'e'})
-            end_samplenum = self.samplenum
-            self.wait({0: 'e'})
-            self.ss_block = start_samplenum
-            self.es_block = self.samplenum
-
-            # Calculate the period, the duty cycle, and its ratio.
-            period = self.samplenum - start_samplenum
-            duty = end_samplenum - start_samplenum
-            ratio = float(duty / period)
-
-            # Report the duty cycle in percent.
-            percent = float(ratio * 100)
-            self.putx([0, ['%f%%' % percent]])
-
-            # Report the duty cycle in the binary output.
-            self.putb([0, bytes([int(ratio * 256)])])
-
-            # Report the period in units of time.
-            period_t = float(period / self.samplerate)
-            self.putp(period_t)
-
-            # Update and report the new duty cycle average.
-            num_cycles += 1
-            average += percent
-            self.put(self.first_samplenum, self.es_block, self.out_average,
-                     float(average / num_cycles))
+        try:
+            while True:
+
+                # Get the next two edges. Setup some variables that get
+                # referenced in the calculation and in put() routines.
+                start_samplenum = self.samplenum
+                self.wait({0: 'e'})
+                end_samplenum = self.samplenum
+                self.wait({0: 'e'})
+                self.ss_block = start_samplenum
+                self.es_block = self.samplenum
+
+                # Calculate the period, the duty cycle, and its ratio.
+                period = self.samplenum - start_samplenum
+                duty = end_samplenum - start_samplenum
+                ratio = float(duty / period)
+
+                # Report the duty cycle in percent.
+                percent = float(ratio * 100)
+                if annotate:
+                    self.putx([0, ['%f%%' % percent]])
+
+                # Report the duty cycle in the binary output.
+                self.putb([0, bytes([int(ratio * 256)])])
+
+                # Report the period in units of time.
+                if annotate:
+                    period_t = float(period / self.samplerate)
+                    self.putp(period_t)
+
+                # Update and report the new duty cycle average.
+                num_cycles += 1
+                average += percent
+                self.put(self.first_samplenum, self.es_block, self.out_average,
+                         float(average / num_cycles))
+                duty_cycles.add(percent)
+                periods.add(period)
+        except EOFError:
+            # The statistics of all complete periods.
+            self.put_summary(self.first_samplenum, self.es_block, duty_cycles, periods)
+            raise
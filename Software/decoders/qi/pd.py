@@ -96,6 +96,8 @@ class Decoder(srd.Decoder):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
             self.bit_width = float(self.samplerate) / 2e3
+            self.bit_min = 0.75 * self.bit_width
+            self.bit_max = 1.25 * self.bit_width
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
@@ -112,7 +114,7 @@ class Decoder(srd.Decoder):
             return int(20 + (byte - 224) / 4)
 
     def in_tolerance(self, l):
-        return (0.75 * self.bit_width) < l < (1.25 * self.bit_width)
+        return self.bit_min < l < self.bit_max
 
     def putp(self, data):
         self.put(self.bytesi[0], self.bytesi[-1], self.out_ann, [5, data])
@@ -136,7 +138,7 @@ class Decoder(srd.Decoder):
                        'CS: %d' % self.packet[1], 'CS'])
         elif self.packet[0] == 0x06: # Power Control Hold-off
             self.putp(['Power Control Hold-off: %dms' % self.packet[1],
-                       'PCH: %d' % self.packet[1]], 'PCH')
+                       'PCH: %d' % self.packet[1], 'PCH'])
         elif self.packet[0] == 0x51: # Configuration
             powerclass = (self.packet[1] & 0xc0) >> 7
             maxpower = self.packet[1] & 0x3f
@@ -159,7 +161,7 @@ class Decoder(srd.Decoder):
                        'Device = %s' % (version, mancode, devid),
                        'ID: %s %s %s' % (version, mancode, devid), 'ID'])
         elif self.packet[0] == 0x81: # Extended Identification
-            edevid = '%02x%02x%02x%02x%02x%02x%02x%02x' % self.packet[1:-1]
+            edevid = '%02x%02x%02x%02x%02x%02x%02x%02x' % tuple(self.packet[1:-1])
             self.putp(['Extended Identification: %s' % edevid,
                        'EI: %s' % edevid, 'EI'])
         elif self.packet[0] in (0x18, 0x19, 0x28, 0x29, 0x38, 0x48, 0x58, 0x68,
@@ -219,13 +221,13 @@ class Decoder(srd.Decoder):
         if len(self.deq) >= 2 and \
                 (self.in_tolerance(self.deq[-1] + self.deq[-2]) or \
                 htl and self.in_tolerance(l * 2) and \
-                self.deq[-2] > 1.25 * self.bit_width):
+                self.deq[-2] > self.bit_max):
             self.add_bit(1)
             self.deq.clear()
         elif self.in_tolerance(l):
             self.add_bit(0)
             self.deq.clear()
-        elif l > (1.25 * self.bit_width):
+        elif l > self.bit_max:
             self.state = 'IDLE'
             self.bytesi.clear()
             self.packet.clear()
@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from common.memory import MemoryImage
 from common.srdhelper import SrdIntEnum
 from common.sdcard import (cmd_names, acmd_names)
 
@@ -37,6 +38,10 @@ class Decoder(srd.Decoder):
     inputs = ['spi']
     outputs = []
     tags = ['Memory']
+    options = (
+        {'id': 'addressing', 'desc': 'Block address unit', 'default': 'byte',
+            'values': ('byte', 'block')},
+    )
     annotations = \
         tuple(('cmd%d' % i, 'CMD%d' % i) for i in range(64)) + \
         tuple(('acmd%d' % i, 'ACMD%d' % i) for i in range(64)) + \
@@ -63,12 +68,16 @@ class Decoder(srd.Decoder):
         self.is_acmd = False # Indicates CMD vs. ACMD
         self.blocklen = 0
         self.read_buf = []
+        self.write_buf = []
         self.cmd_str = ''
         self.is_cmd24 = False
         self.cmd24_start_token_found = False
         self.is_cmd17 = False
         self.cmd17_start_token_found = False
         self.busy_first_byte = False
+        # Card contents as seen in block reads and accepted block writes.
+        self.memory = MemoryImage()
+        self.block_addr = 0
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
@@ -221,12 +230,14 @@ class Decoder(srd.Decoder):
     def handle_cmd17(self):
         # CMD17: READ_SINGLE_BLOCK
         self.putc(Ann.CMD17, 'Read a block from address 0x%04x' % self.arg)
+        self.block_addr = self.arg
         self.is_cmd17 = True
         self.state = 'GET RESPONSE R1'
 
     def handle_cmd24(self):
         # CMD24: WRITE_BLOCK
         self.putc(Ann.CMD24, 'Write a block to address 0x%04x' % self.arg)
+        self.block_addr = self.arg
         self.is_cmd24 = True
         self.state = 'GET RESPONSE R1'
 
@@ -359,6 +370,13 @@ class Decoder(srd.Decoder):
         # TODO
         pass
 
+    def memory_addr(self):
+        # High capacity cards address 512 byte blocks, standard capacity
+        # cards address bytes.
+        if self.options['addressing'] == 'block':
+            return self.block_addr * 512
+        return self.block_addr
+
     def handle_data_cmd17(self, miso):
         # CMD17 returns one byte R1, then some bytes 0xff, then a Start Block
         # (single byte 0xfe), then self.blocklen bytes of data, then always
@@ -378,6 +396,7 @@ class Decoder(srd.Decoder):
             if len(self.read_buf) == self.blocklen:
                 self.es_data = self.es
                 self.put(self.ss_data, self.es_data, self.out_ann, [Ann.CMD17, ['Block data: %s' % self.read_buf]])
+                self.memory.read(self.ss_data, self.memory_addr(), self.read_buf)
             elif len(self.read_buf) == (self.blocklen + 1):
                 self.ss_crc = self.ss
             elif len(self.read_buf) == (self.blocklen + 2):
@@ -385,6 +404,9 @@ class Decoder(srd.Decoder):
                 # TODO: Check CRC.
                 self.put(self.ss_crc, self.es_crc, self.out_ann, [Ann.CMD17, ['CRC']])
                 self.state = 'IDLE'
+                self.read_buf = []
+                self.is_cmd17 = False
+                self.cmd17_start_token_found = False
         elif miso == 0xfe:
             self.put(self.ss, self.es, self.out_ann, [Ann.CMD17, ['Start Block']])
             self.cmd17_start_token_found = True
@@ -405,6 +427,7 @@ class Decoder(srd.Decoder):
                 return
             self.es_data = self.es
             self.put(self.ss_data, self.es_data, self.out_ann, [Ann.CMD24, ['Block data: %s' % self.read_buf]])
+            self.write_buf = self.read_buf
             self.read_buf = []
             self.state = 'DATA RESPONSE'
         elif mosi == 0xfe:
@@ -432,6 +455,8 @@ class Decoder(srd.Decoder):
         self.put(m[4][1], m[4][2], self.out_ann, [Ann.BIT, ['Always 0']])
         if miso == 0x05:
             self.put(m[3][1], m[1][2], self.out_ann, [Ann.BIT, ['Data accepted']])
+            if self.is_cmd24:
+                self.memory.write(self.ss_data, self.memory_addr(), self.write_buf)
         elif miso == 0x0b:
             self.put(m[3][1], m[1][2], self.out_ann, [Ann.BIT, ['Data rejected (CRC error)']])
         elif miso == 0x0d:
@@ -454,6 +479,8 @@ class Decoder(srd.Decoder):
             if cls is not None:
                 self.put(self.ss_busy, self.es_busy, self.out_ann, [cls, ['Card is busy']])
             self.state = 'IDLE'
+            self.is_cmd24 = False
+            self.cmd24_start_token_found = False
             return
         else:
             if self.busy_first_byte:
@@ -102,6 +102,7 @@ class Decoder(srd.Decoder):
         start_edge_mode_rising = opt['start_edge'] == 'rising'
         stop_edge_mode_rising = opt['stop_edge'] == 'rising'
         annbits = opt['annbits'] == 'yes'
+        clk_edge = 'r' if opt['clk_edge'] == 'rising' else 'f'
         gate_is_open = False
         sample_start = None
         started = False
@@ -111,7 +112,7 @@ class Decoder(srd.Decoder):
         shiftreg = 0
 
         while True:
-            start, stop, _, data = self.wait({CLOCK: opt['clk_edge']})
+            start, stop, _, data = self.wait({CLOCK: clk_edge})
             if start != prev_start and not gate_is_open:
                 gate_is_open = (start == 1) if start_edge_mode_rising else (start == 0)
                 if gate_is_open:
@@ -0,0 +1,17 @@
+'''
+Standalone host for the decoders in this directory.
+
+It provides the cObj the sigrokdecode.Decoder shim forwards to, so that
+captures can be decoded headless, without the desktop application.
+'''
+
+from .provider import DECODER_PATH, DecodingBranch, DecodingTree, Provider
+from .capture import Capture, CaptureFormatError
+from .annotations import (Annotation, AnnotationFilter, AnnotationSegment, AnnotationSink,
+    AnnotationStream, merge_records)
+from .decoder import HostedDecoder, OutputValue
+from .binary import BinaryFiles, write_memory, write_trace_profile
+from .parallel import ParallelProvider, SharedCapture
+from .stream import StreamedCapture, StreamedCaptureWriter
+from .transitions import TransitionCapture
+from .catalog import DecoderIndex, DecoderInfo
@@ -0,0 +1,192 @@
+'''
+Batch decode captures from the command line.
+
+    python -m sigrokhost -P uart:rx=0:baudrate=115200,midi capture.lac ...
+
+Each -P adds a decoding branch. Decoders separated by commas are stacked
+on the previous one, "key=value" pairs assign a decoder channel (when the
+key is a channel id) or set an option. One JSON object is written per
+capture. With -j the branches run in separate processes.
+
+A stacked decoder written as "decoder@output" takes its input from the
+named output of the decoder below, e.g. one port of uart_ports:
+
+    python -m sigrokhost -P uart_ports:rx2=0:baudrate2=31250,midi@uart2 capture.lac
+
+With --stream, annotations are written as they are decoded, one JSON array
+[file, branch, row, start, end, type, texts] per line, so .lacraw captures
+larger than memory can be decoded.
+
+With --binary, the binary outputs are written to files in the given
+directory as they are decoded, one per capture, branch and binary class,
+e.g. the SocketCAN pcapng of a CAN bus:
+
+    python -m sigrokhost -P can:can_rx=0 --binary dumps capture.lac
+
+With --memory, memory decoders (spiflash, eeprom24xx, eeprom93xx,
+sdcard_spi) dump the memory contents they saw once decoding is done, as
+a binary image and an Intel HEX file per capture and branch, and the
+known address ranges are added to the JSON object:
+
+    python -m sigrokhost -P spi:clk=0:mosi=1:miso=2:cs=3,spiflash --memory dumps capture.lac
+
+With --trace-profile, the ARM trace decoders write the profile of the
+code they traced instead: collapsed call stacks for flame graphs and a
+JSON summary of the hits per function and line, the calls and the
+exception durations. With --headless, no annotations are made at all:
+
+    python -m sigrokhost -P uart:rx=0:baudrate=2000000,arm_etmv3:elffile=fw.elf \\
+        --trace-profile prof --headless capture.lac
+'''
+
+import argparse
+import json
+import os
+import sys
+
+import sigrokdecode as srd
+
+from . import (BinaryFiles, Capture, DecodingBranch, DecodingTree, ParallelProvider, Provider,
+    write_memory, write_trace_profile)
+
+def parse_stack(provider, spec, index):
+    root = None
+    parent = None
+
+    for level, part in enumerate(spec.split(',')):
+        fields = part.split(':')
+        fields[0], _, source = fields[0].partition('@')
+        decoder = provider.get_decoder(fields[0])
+        ids = [c['id'] for c in decoder.channels]
+        channels = {}
+        options = {}
+        for field in fields[1:]:
+            key, _, value = field.partition('=')
+            if key in ids:
+                channels[key] = value
+            else:
+                options[key] = value
+
+        name = '{}-{}-{}'.format(fields[0], index, level) if level else \
+            '{}-{}'.format(fields[0], index)
+        sources = {decoder.inputs[0]: source} if source else None
+        branch = DecodingBranch(name, fields[0], options, channels, sources=sources)
+        if parent is None:
+            root = branch
+        else:
+            parent.children.append(branch)
+        parent = branch
+
+    return root
+
+def binary_classes(provider, tree):
+    '''The binary classes of every branch of the tree, by branch name.'''
+    classes = {}
+    branches = list(tree.branches)
+    while branches:
+        branch = branches.pop()
+        classes[branch.name] = provider.index.info(branch.decoder).binary
+        branches.extend(branch.children)
+    return classes
+
+def dump_memory(provider, directory, name):
+    '''Write the memory images of the last execution, see write_memory().'''
+    dumps = {}
+    for branch, decoder in provider.instances.items():
+        memory = decoder.memory
+        if memory:
+            paths, coverage = write_memory(directory, '{}-{}'.format(name, branch), memory)
+            dumps[branch] = dict(coverage, files=paths)
+    return dumps
+
+def dump_trace_profiles(provider, directory, name, samplerate):
+    '''Write the trace profiles of the last execution, see write_trace_profile().'''
+    dumps = {}
+    for branch, decoder in provider.instances.items():
+        profile = decoder.trace_profile
+        if profile:
+            dumps[branch] = write_trace_profile(directory, '{}-{}'.format(name, branch),
+                profile, samplerate)
+    return dumps
+
+def annotations_to_json(results):
+    return {branch: {a.name: [[s.first_sample, s.last_sample, s.type_id, s.values]
+        for s in a.segments] for a in sink.annotations()}
+        for branch, sink in results.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sigrokhost', description='Headless protocol decoding.')
+    parser.add_argument('-P', '--decoder', action='append', required=True,
+        help='decoder stack, e.g. uart:rx=0:baudrate=9600,midi')
+    parser.add_argument('-r', '--samplerate', type=int, help='samplerate, required for .csv captures')
+    parser.add_argument('-o', '--output', help='write results to this file instead of stdout')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='decode the -P branches in this many processes (0 for one per CPU)')
+    parser.add_argument('--stream', action='store_true',
+        help='write every annotation as soon as it is decoded')
+    parser.add_argument('--binary', metavar='DIR',
+        help='write the binary outputs (pcapng streams and dumps) to files in DIR')
+    parser.add_argument('--memory', metavar='DIR',
+        help='write the memory contents seen by memory decoders to image files in DIR')
+    parser.add_argument('--headless', action='store_true',
+        help='run the decoders without annotations, for the other outputs only')
+    parser.add_argument('--trace-profile', metavar='DIR',
+        help='write the execution profiles of trace decoders to DIR')
+    parser.add_argument('--profile', metavar='DIR',
+        help='write decoder statistics (and with --cprofile, cProfile dumps) to DIR')
+    parser.add_argument('--cprofile', action='store_true', help='profile every run with cProfile')
+    parser.add_argument('captures', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.profile or args.cprofile:
+        srd.enable_profiling(args.profile, args.cprofile)
+
+    # Memory images and trace profiles stay in the decoder instances,
+    # which only an in-process provider keeps.
+    parallel = args.jobs != 1 and not (args.memory or args.trace_profile)
+    provider = ParallelProvider(args.jobs, headless=args.headless) if parallel else \
+        Provider(headless=args.headless)
+    tree = DecodingTree([parse_stack(provider, spec, i) for i, spec in enumerate(args.decoder)])
+    classes = binary_classes(provider, tree) if args.binary else None
+    out = open(args.output, 'w') if args.output else sys.stdout
+    status = 0
+
+    try:
+        for path in args.captures:
+            capture = Capture.load(path, args.samplerate)
+            binary = None
+            if args.binary:
+                name = os.path.splitext(os.path.basename(path))[0]
+                binary = BinaryFiles(args.binary, classes, name + '-')
+            try:
+                if args.stream:
+                    def emit(branch, row, ss, es, type_id, values):
+                        out.write(json.dumps([path, branch, row, ss, es, type_id, values]) + '\n')
+                    provider.execute(capture.samplerate, capture, tree, emit, binary)
+                    record = {'file': path}
+                else:
+                    results = provider.execute(capture.samplerate, capture, tree, binary=binary)
+                    record = {'file': path, 'annotations': annotations_to_json(results)}
+            finally:
+                if binary is not None:
+                    binary.close()
+            if binary is not None:
+                record['binary'] = binary.paths
+            if args.memory:
+                record['memory'] = dump_memory(provider, args.memory,
+                    os.path.splitext(os.path.basename(path))[0])
+            if args.trace_profile:
+                record['trace_profile'] = dump_trace_profiles(provider, args.trace_profile,
+                    os.path.splitext(os.path.basename(path))[0], capture.samplerate)
+            if provider.errors:
+                record['errors'] = {k: repr(v) for k, v in provider.errors.items()}
+                status = 1
+            out.write(json.dumps(record) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
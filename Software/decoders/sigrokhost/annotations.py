@@ -0,0 +1,187 @@
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+AnnotationSegment = namedtuple('AnnotationSegment', 'type_id first_sample last_sample values')
+Annotation = namedtuple('Annotation', 'name segments')
+AnnotationRow = namedtuple('AnnotationRow', 'index id name types')
+
+# Layout of the records returned by AnnotationSink.to_array().
+RECORD_DTYPE = np.dtype([
+    ('row', '<i4'),
+    ('type_id', '<i4'),
+    ('first_sample', '<i8'),
+    ('last_sample', '<i8'),
+    ('text', '<i4'),
+])
+
+class AnnotationColumns:
+    '''Growable typed columns holding the annotations of one row.'''
+
+    def __init__(self):
+        self.first = array('q')
+        self.last = array('q')
+        self.type_id = array('i')
+        self.text = array('i')
+        self.ordered = True
+
+    def __len__(self):
+        return len(self.first)
+
+    def append(self, ss, es, type_id, text):
+        if self.ordered and self.first and ss < self.first[-1]:
+            self.ordered = False
+        self.first.append(ss)
+        self.last.append(es)
+        self.type_id.append(type_id)
+        self.text.append(text)
+
+    def order(self):
+        '''Indices that sort the row by start sample (stable, like OrderBy).'''
+        if self.ordered:
+            return None
+        return np.argsort(np.frombuffer(self.first, dtype=np.int64), kind='stable')
+
+class AnnotationSink:
+    '''
+    Columnar store for the OUTPUT_ANN values of one decoder run.
+
+    Annotations are routed to their row when they are put and kept in typed
+    arrays, with the text alternatives interned in a shared table. Rows are
+    only sorted when a decoder emitted them out of order.
+    '''
+
+    def __init__(self, rows, type_count):
+        self.rows = rows
+        self.texts = []
+        self._text_ids = {}
+        self._columns = [AnnotationColumns() for _ in rows]
+        self._row_of = [None] * type_count
+        for row in rows:
+            for t in row.types:
+                self._row_of[t] = row.index
+
+    def __len__(self):
+        return sum(len(c) for c in self._columns)
+
+    def intern(self, values):
+        key = tuple(str(v) for v in values)
+        index = self._text_ids.get(key)
+        if index is None:
+            index = self._text_ids[key] = len(self.texts)
+            self.texts.append(key)
+        return index
+
+    def put(self, ss, es, data):
+        type_id = int(data[0])
+        row = self._row_of[type_id]
+        self._columns[row].append(ss, es, type_id, self.intern(data[1]))
+
+    def row_arrays(self, row):
+        '''Start, end, type and text index arrays of a row, sorted by start.'''
+        columns = self._columns[row]
+        arrays = [np.frombuffer(columns.first, dtype=np.int64),
+            np.frombuffer(columns.last, dtype=np.int64),
+            np.frombuffer(columns.type_id, dtype=np.int32),
+            np.frombuffer(columns.text, dtype=np.int32)]
+        order = columns.order()
+        if order is not None:
+            arrays = [a[order] for a in arrays]
+        return arrays
+
+    def annotations(self):
+        '''Materialise the rows as Annotation objects, skipping empty ones.'''
+        result = []
+        for row in self.rows:
+            if not len(self._columns[row.index]):
+                continue
+            first, last, type_id, text = self.row_arrays(row.index)
+            segments = [AnnotationSegment(t, s, e, list(self.texts[x]))
+                for s, e, t, x in zip(first.tolist(), last.tolist(),
+                    type_id.tolist(), text.tolist())]
+            result.append(Annotation(row.name, segments))
+        return result
+
+    def to_array(self):
+        '''All annotations as one structured array, grouped by row.'''
+        records = np.empty(len(self), dtype=RECORD_DTYPE)
+        pos = 0
+        for row in self.rows:
+            count = len(self._columns[row.index])
+            if not count:
+                continue
+            first, last, type_id, text = self.row_arrays(row.index)
+            chunk = records[pos:pos + count]
+            chunk['row'] = row.index
+            chunk['first_sample'] = first
+            chunk['last_sample'] = last
+            chunk['type_id'] = type_id
+            chunk['text'] = text
+            pos += count
+        return records
+
+    def to_bytes(self):
+        '''The records of to_array() as a single little-endian buffer.'''
+        return self.to_array().tobytes()
+
+class AnnotationStream:
+    '''
+    Hands every OUTPUT_ANN value to emit(row, ss, es, type_id, values) as
+    it is put, in put order, instead of storing it.
+    '''
+
+    def __init__(self, rows, type_count, emit):
+        self.rows = rows
+        self.emit = emit
+        self.count = 0
+        self._row_of = [None] * type_count
+        for row in rows:
+            for t in row.types:
+                self._row_of[t] = row.index
+
+    def __len__(self):
+        return self.count
+
+    def put(self, ss, es, data):
+        type_id = int(data[0])
+        self.count += 1
+        self.emit(self._row_of[type_id], ss, es, type_id, [str(v) for v in data[1]])
+
+class AnnotationFilter:
+    '''
+    Passes the OUTPUT_ANN values of the given annotation classes on to a
+    sink (an AnnotationSink or AnnotationStream) and drops the others.
+    '''
+
+    def __init__(self, sink, classes):
+        self.sink = sink
+        self.classes = frozenset(classes)
+
+    def put(self, ss, es, data):
+        if data[0] in self.classes:
+            self.sink.put(ss, es, data)
+
+# Layout of the records returned by merge_records().
+MERGED_DTYPE = np.dtype([('sink', '<i4')] + RECORD_DTYPE.descr)
+
+def merge_records(sinks):
+    '''
+    Merge the records of several sinks into one array ordered by start
+    sample. The sink field indexes the given sequence, whose texts table
+    the record's text refers to. Records starting on the same sample keep
+    the sink order, then their order within the sink.
+    '''
+    parts = []
+    for index, sink in enumerate(sinks):
+        records = sink.to_array()
+        merged = np.empty(len(records), dtype=MERGED_DTYPE)
+        merged['sink'] = index
+        for name in RECORD_DTYPE.names:
+            merged[name] = records[name]
+        parts.append(merged)
+
+    if not parts:
+        return np.empty(0, dtype=MERGED_DTYPE)
+    merged = np.concatenate(parts)
+    return merged[np.argsort(merged['first_sample'], kind='stable')]
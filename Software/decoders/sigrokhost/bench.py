@@ -0,0 +1,189 @@
+'''
+Decoder throughput benchmarks over synthetic captures.
+
+    python -m sigrokhost.bench [--json results.json] [--filter uart] [--scale 2]
+
+For every case the capture is generated once, then the decoder stack is
+run --repeat times and the fastest run is reported, followed by one extra
+run under tracemalloc to measure peak memory. The JSON output uses a fixed
+schema and key order so results of different releases can be diffed.
+'''
+
+import argparse
+import fnmatch
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from . import synth
+from .provider import DecodingBranch, DecodingTree, Provider
+
+SCHEMA_VERSION = 1
+
+class BenchmarkCase:
+    def __init__(self, name, generator, params, scaled, branch):
+        self.name = name
+        self.generator = generator
+        self.params = params
+        self.scaled = scaled
+        self.branch = branch
+
+    def capture(self, scale):
+        params = dict(self.params)
+        params[self.scaled] = max(1, int(params[self.scaled] * scale))
+        return self.generator(**params)
+
+def _stack(*levels):
+    '''Build a chain of branches from (decoder, options, channels) tuples.'''
+    root = parent = None
+    for index, (decoder, options, channels) in enumerate(levels):
+        branch = DecodingBranch('{}-{}'.format(decoder, index), decoder, options, channels)
+        if parent is None:
+            root = branch
+        else:
+            parent.children.append(branch)
+        parent = branch
+    return root
+
+def _uart(name, samplerate, baudrate, frames, **params):
+    options = dict(baudrate=baudrate, **params)
+    return BenchmarkCase(name, synth.uart,
+        dict(samplerate=samplerate, baudrate=baudrate, frames=frames, **params), 'frames',
+        _stack(('uart', options, {'rx': 'rx'})))
+
+def _spi(mode):
+    return BenchmarkCase('spi-mode{}'.format(mode), synth.spi,
+        dict(samplerate=10000000, clock=1000000, mode=mode, transfers=500), 'transfers',
+        _stack(('spi', {'cpol': mode >> 1, 'cpha': mode & 1},
+            {'clk': 'clk', 'miso': 'miso', 'mosi': 'mosi', 'cs': 'cs'})))
+
+CASES = [
+    _uart('uart-9600-x104', 1000000, 9600, 2000),
+    _uart('uart-115200-x8', 1000000, 115200, 20000),
+    _uart('uart-115200-x16-even', 1843200, 115200, 20000, parity='even'),
+    _uart('uart-1000000-x4', 4000000, 1000000, 50000),
+    _spi(0),
+    _spi(1),
+    _spi(2),
+    _spi(3),
+    BenchmarkCase('i2c-100k-stretch', synth.i2c,
+        dict(samplerate=4000000, clock=100000, transactions=500), 'transactions',
+        _stack(('i2c', {}, {'scl': 'scl', 'sda': 'sda'}))),
+    BenchmarkCase('can-500k', synth.can,
+        dict(samplerate=20000000, bitrate=500000, frames=1000), 'frames',
+        _stack(('can', {'nominal_bitrate': 500000}, {'can_rx': 'can_rx'}))),
+    BenchmarkCase('canfd-500k-2M', synth.can,
+        dict(samplerate=20000000, bitrate=500000, fast_bitrate=2000000, frames=300, fd=True), 'frames',
+        _stack(('can', {'nominal_bitrate': 500000, 'fast_bitrate': 2000000}, {'can_rx': 'can_rx'}))),
+    BenchmarkCase('onewire', synth.onewire,
+        dict(samplerate=2000000, transactions=300), 'transactions',
+        _stack(('onewire_link', {}, {'owr': 'owr'}), ('onewire_network', {}, {}))),
+    BenchmarkCase('ws281x', synth.ws281x,
+        dict(samplerate=24000000, leds=300, frames=20), 'frames',
+        _stack(('rgb_led_ws281x', {}, {'din': 'din'}))),
+    BenchmarkCase('usb-fs', synth.usb_fs,
+        dict(samplerate=48000000, frames=200), 'frames',
+        _stack(('usb_signalling', {'signalling': 'full-speed'}, {'dp': 'dp', 'dm': 'dm'}),
+            ('usb_packet', {}, {}))),
+]
+
+def _branches(branch):
+    yield branch
+    for child in branch.children:
+        yield from _branches(child)
+
+def run_case(case, scale=1.0, repeat=3, headless=False):
+    capture = case.capture(scale)
+    provider = Provider(headless=headless)
+    tree = DecodingTree([case.branch])
+    branches = list(_branches(case.branch))
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        provider.execute(capture.samplerate, capture, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    puts = {b.decoder: provider.instances[b.name].put_count for b in branches}
+    errors = {k: repr(v) for k, v in provider.errors.items()}
+
+    tracemalloc.start()
+    try:
+        provider.execute(capture.samplerate, capture, tree)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total_puts = sum(puts.values())
+    return {
+        'name': case.name,
+        'decoders': [b.decoder for b in branches],
+        'headless': headless,
+        'samples': capture.sample_count,
+        'seconds': round(best, 6),
+        'samples_per_sec': round(capture.sample_count / best, 1) if best else None,
+        'puts': puts,
+        'puts_per_sec': round(total_puts / best, 1) if best else None,
+        'peak_memory_bytes': peak,
+        'errors': errors,
+    }
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sigrokhost.bench', description='Decoder benchmarks.')
+    parser.add_argument('--json', help='write results to this file ("-" for stdout)')
+    parser.add_argument('--filter', default='*', help='only run cases matching this pattern')
+    parser.add_argument('--scale', type=float, default=1.0, help='scale the size of every capture')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest is reported')
+    parser.add_argument('--headless', action='store_true',
+        help='decode without annotations, only the other outputs')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    args = parser.parse_args(argv)
+
+    cases = [c for c in CASES if fnmatch.fnmatch(c.name, args.filter)]
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return 0
+
+    results = []
+    for case in cases:
+        result = run_case(case, args.scale, max(1, args.repeat), args.headless)
+        results.append(result)
+        if args.json != '-':
+            print('{:<24} {:>12,} samples {:>10.3f} s {:>14,.0f} samples/s {:>12,.0f} puts/s {:>8.1f} MiB{}'.format(
+                result['name'], result['samples'], result['seconds'],
+                result['samples_per_sec'] or 0, result['puts_per_sec'] or 0,
+                result['peak_memory_bytes'] / 1048576, '  ERRORS' if result['errors'] else ''))
+
+    if args.json:
+        report = {
+            'schema_version': SCHEMA_VERSION,
+            'environment': environment(),
+            'scale': args.scale,
+            'repeat': args.repeat,
+            'benchmarks': results,
+        }
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if args.json == '-':
+            print(text)
+        else:
+            with open(args.json, 'w') as f:
+                f.write(text + '\n')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
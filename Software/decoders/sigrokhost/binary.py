@@ -0,0 +1,119 @@
+'''
+Writing the OUTPUT_BINARY values of decoders to files as they are put.
+
+Decoders with a 'pcap' binary class put a pcapng header first and one
+block per packet after it (see common/pcap), so appending the values of
+that class gives a file Wireshark and its tools read as is. 'wav' classes
+are streamed WAV files (see common/wav), whose sizes are filled in when
+the file is closed.
+
+Memory decoders keep the contents they saw in a common.memory.MemoryImage
+instead, which write_memory() dumps once decoding is done, as does
+write_trace_profile() with the TraceProfile of trace decoders.
+'''
+
+import json
+import os
+
+from common.wav import finish
+
+BUFFER_SIZE = 1 << 20
+
+class BinaryFiles:
+    '''
+    Files for the binary outputs of a decoding run, one per branch and
+    binary class that is put to, named <prefix><branch>-<class id> with a
+    .pcapng extension for 'pcap' classes, .wav for 'wav' classes (and
+    those starting with 'wav-') and .bin for the others.
+
+    An instance is the binary callback of Provider.execute(). classes maps
+    branch names to the binary classes of their decoder. Values go through
+    large write buffers, as decoders put many small ones.
+    '''
+
+    def __init__(self, directory, classes, prefix='', buffer_size=BUFFER_SIZE):
+        self.directory = directory
+        self.classes = classes
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+        self.paths = []
+        self._files = {}
+        self._wav = []
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, branch, startsample, endsample, data):
+        cls, value = data
+        f = self._files.get((branch, cls))
+        if f is None:
+            f = self._files[branch, cls] = self._open(branch, cls)
+        f.write(value)
+
+    def _open(self, branch, cls):
+        binary = self.classes.get(branch) or ()
+        class_id = binary[cls][0] if 0 <= cls < len(binary) else str(cls)
+        extension = '.bin'
+        if class_id == 'pcap':
+            extension = '.pcapng'
+        elif class_id == 'wav' or class_id.startswith('wav-'):
+            extension = '.wav'
+        path = os.path.join(self.directory,
+            '{}{}-{}{}'.format(self.prefix, branch, class_id, extension))
+        self.paths.append(path)
+        if extension == '.wav':
+            self._wav.append(path)
+        return open(path, 'wb', buffering=self.buffer_size)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        for path in self._wav:
+            with open(path, 'r+b') as f:
+                finish(f)
+        self._wav = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_memory(directory, name, memory):
+    '''
+    Dump a MemoryImage as <name>.bin, holding the contents from the first
+    to the last known byte with the unknown bytes erased, and <name>.hex,
+    an Intel HEX file of the known bytes only. Returns the paths and a
+    coverage map: the address of the first byte of the .bin file and the
+    known ranges, as [start, end] with end excluded.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    ranges = memory.coverage()
+    path = os.path.join(directory, name + '.bin')
+    with open(path, 'wb', buffering=BUFFER_SIZE) as f:
+        base = memory.write_image(f)
+    paths = [path]
+    # Intel HEX has 32 bit addresses, larger memories (SD cards) only get
+    # the binary image.
+    if ranges and ranges[-1][1] <= 1 << 32:
+        path = os.path.join(directory, name + '.hex')
+        with open(path, 'w', buffering=BUFFER_SIZE) as f:
+            for line in memory.intel_hex():
+                f.write(line + '\n')
+        paths.append(path)
+    return paths, {'base': base, 'ranges': [list(r) for r in ranges]}
+
+def write_trace_profile(directory, name, profile, samplerate=None):
+    '''
+    Dump a TraceProfile as <name>.folded, its call stacks in the collapsed
+    format of flame graph tools, and <name>.json, its summary (durations
+    in seconds with a samplerate). Returns the paths.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    folded = os.path.join(directory, name + '.folded')
+    with open(folded, 'w', encoding='utf-8') as f:
+        for line in profile.collapsed():
+            f.write(line + '\n')
+    summary = os.path.join(directory, name + '.json')
+    with open(summary, 'w', encoding='utf-8') as f:
+        json.dump(profile.summary(samplerate), f, indent=1)
+    return [folded, summary]
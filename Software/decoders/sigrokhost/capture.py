@@ -0,0 +1,163 @@
+import base64
+import json
+import os
+
+import numpy as np
+
+from .edges import EdgeIndex
+
+# Extension of the uncompressed files read by stream.StreamedCapture.
+STREAMED_EXTENSION = '.lacraw'
+
+# Extension of the transition lists read by transitions.TransitionCapture.
+TRANSITIONS_EXTENSION = '.lactr'
+
+class CaptureFormatError(Exception):
+    pass
+
+def read_csv_blocks(path, block_rows=None):
+    '''
+    Read a CSV file as written by CLCapture: a header row with the channel
+    names followed by one "0,1,..." row per sample.
+
+    Returns the names and an iterator over blocks of up to block_rows rows
+    (all rows when None), each a boolean array of rows by channels.
+    '''
+    f = open(path, 'rb')
+    names = f.readline().decode('utf-8').strip().split(',')
+    row = 2 * len(names)
+
+    def blocks():
+        with f:
+            rest = np.empty(0, dtype=np.uint8)
+            while True:
+                block = f.read(block_rows * row if block_rows else -1)
+                body = np.concatenate((rest, np.frombuffer(block, dtype=np.uint8)))
+                body = body[body != ord('\r')]
+                complete = len(body) // row * row
+                if complete:
+                    yield body[:complete].reshape(-1, row)[:, 0::2] == ord('1')
+                rest = body[complete:]
+                if not block or not block_rows:
+                    break
+            if len(rest):
+                raise CaptureFormatError('Malformed CSV capture: {}'.format(path))
+
+    return names, blocks()
+
+class Capture:
+    '''
+    A logic capture held as one NumPy array per channel.
+
+    Every array uses the same layout as AnalyzerChannel.Samples: one byte
+    per sample, 0 for low and 1 for high.
+    '''
+
+    def __init__(self, samplerate, samples, names=None, bursts=None):
+        self.samplerate = int(samplerate) if samplerate else 0
+        self.samples = [np.ascontiguousarray(s, dtype=np.uint8) for s in samples]
+        self.names = list(names) if names else \
+            ['Channel {}'.format(i + 1) for i in range(len(self.samples))]
+        self.bursts = bursts or []
+        self._edges = {}
+
+        lengths = set(len(s) for s in self.samples)
+        if len(lengths) > 1:
+            raise CaptureFormatError('Channels have different sample counts.')
+
+    @property
+    def sample_count(self):
+        return len(self.samples[0]) if self.samples else 0
+
+    @property
+    def channel_count(self):
+        return len(self.samples)
+
+    def channel_index(self, channel):
+        '''Resolve a capture channel given by index or by name.'''
+        if isinstance(channel, int):
+            index = channel
+        elif isinstance(channel, str) and channel.isdigit():
+            index = int(channel)
+        elif channel in self.names:
+            index = self.names.index(channel)
+        else:
+            raise KeyError('Unknown capture channel: {}'.format(channel))
+        if not 0 <= index < self.channel_count:
+            raise KeyError('Capture channel out of range: {}'.format(channel))
+        return index
+
+    def edge_index(self, channel):
+        '''Transition index of a channel, computed once per capture.'''
+        index = self.channel_index(channel)
+        if index not in self._edges:
+            self._edges[index] = EdgeIndex.from_samples(self.samples[index])
+        return self._edges[index]
+
+    @classmethod
+    def from_arrays(cls, samplerate, samples, names=None):
+        return cls(samplerate, [np.asarray(s) != 0 for s in samples], names)
+
+    @classmethod
+    def from_csv(cls, path, samplerate):
+        '''Load a CSV file as written by CLCapture.'''
+        names, blocks = read_csv_blocks(path)
+        blocks = list(blocks)
+        values = blocks[0] if blocks else np.empty((0, len(names)), dtype=bool)
+
+        return cls(samplerate, [values[:, c] for c in range(len(names))], names)
+
+    @classmethod
+    def from_lac(cls, path):
+        '''Load a .lac file as written by CLCapture or the desktop app.'''
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            content = json.load(f)
+
+        settings = content.get('Settings')
+        if not settings:
+            raise CaptureFormatError('Missing capture settings: {}'.format(path))
+
+        channels = settings.get('CaptureChannels') or []
+        legacy = content.get('Samples')
+        samples = []
+        names = []
+
+        for index, channel in enumerate(channels):
+            names.append(channel.get('ChannelName') or
+                'Channel {}'.format(channel.get('ChannelNumber', index) + 1))
+            data = channel.get('Samples')
+            if data is not None:
+                samples.append(np.frombuffer(base64.b64decode(data), dtype=np.uint8) != 0)
+            elif legacy is not None:
+                # Older files store every sample as a bitmask of all channels.
+                samples.append(np.array([(int(v) >> index) & 1 for v in legacy], dtype=np.uint8))
+            else:
+                raise CaptureFormatError('Channel without samples: {}'.format(path))
+
+        return cls(settings.get('Frequency', 0), samples, names, settings.get('Bursts'))
+
+    @classmethod
+    def load(cls, path, samplerate=None):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.lac':
+            capture = cls.from_lac(path)
+            if samplerate:
+                capture.samplerate = int(samplerate)
+            return capture
+        if ext == '.csv':
+            if not samplerate:
+                raise CaptureFormatError('CSV captures need an explicit samplerate.')
+            return cls.from_csv(path, samplerate)
+        if ext == STREAMED_EXTENSION:
+            from .stream import StreamedCapture
+            capture = StreamedCapture(path)
+            if samplerate:
+                capture.samplerate = int(samplerate)
+            return capture
+        if ext == TRANSITIONS_EXTENSION:
+            from .transitions import TransitionCapture
+            capture = TransitionCapture.load(path)
+            if samplerate:
+                capture.samplerate = int(samplerate)
+            return capture
+        raise CaptureFormatError('Unsupported capture file type: {}'.format(path))
@@ -0,0 +1,140 @@
+'''
+Decoder metadata index.
+
+Listing the decoders with their channels, options and annotations would
+otherwise import every decoder package, including large tables. The index
+keeps that metadata in a JSON file next to the decoders, with one entry
+per decoder keyed by a fingerprint of its files (names, sizes and
+modification times), so only decoders that changed since the index was
+written are imported to refresh it.
+'''
+
+import hashlib
+import importlib
+import json
+import os
+
+from .provider import DECODER_PATH
+
+# Bump when the layout of the entries changes; older indexes are rebuilt.
+INDEX_VERSION = 1
+
+INDEX_NAME = 'decoders-index.json'
+
+FIELDS = ('id', 'name', 'longname', 'desc', 'license', 'inputs', 'outputs', 'tags',
+    'channels', 'optional_channels', 'options', 'annotations', 'annotation_rows', 'binary')
+
+class DecoderInfo:
+    '''Metadata of a decoder, with the attribute names of its Decoder class.'''
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    @classmethod
+    def from_class(cls, decoder):
+        return cls(**{f: _plain(getattr(decoder, f, ())) for f in FIELDS})
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in FIELDS}
+
+def _plain(value):
+    '''Tuples become lists, as they would after a JSON round trip.'''
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+def fingerprint(name, path=DECODER_PATH):
+    '''Hash of the names, sizes and modification times of a decoder's files.'''
+    digest = hashlib.sha1()
+    folder = os.path.join(path, name)
+    for entry in sorted(os.listdir(folder)):
+        if not entry.endswith('.py'):
+            continue
+        stat = os.stat(os.path.join(folder, entry))
+        digest.update('{}:{}:{};'.format(entry, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return digest.hexdigest()
+
+class DecoderIndex:
+    '''
+    Metadata of every decoder, loaded from the index file and refreshed
+    for the decoders whose files changed.
+    '''
+
+    def __init__(self, path=None, decoder_path=DECODER_PATH):
+        self.path = path or os.path.join(decoder_path, INDEX_NAME)
+        self.decoder_path = decoder_path
+        self.entries = {}
+        self.errors = {}
+        self.imported = []
+
+    @classmethod
+    def load(cls, path=None, decoder_path=DECODER_PATH, save=True):
+        index = cls(path, decoder_path)
+        index.read()
+        if index.refresh() and save:
+            index.save()
+        return index
+
+    def read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if content.get('version') == INDEX_VERSION:
+            self.entries = content.get('decoders') or {}
+
+    def names(self):
+        return sorted(self.entries)
+
+    def info(self, name):
+        entry = self.entries.get(name)
+        return DecoderInfo(**entry['metadata']) if entry else None
+
+    def refresh(self):
+        '''
+        Bring the entries in line with the decoder directories. Returns
+        whether anything changed.
+        '''
+        changed = False
+        names = set()
+
+        for name in sorted(os.listdir(self.decoder_path)):
+            if not os.path.isfile(os.path.join(self.decoder_path, name, 'pd.py')):
+                continue
+            names.add(name)
+            key = fingerprint(name, self.decoder_path)
+            entry = self.entries.get(name)
+            if entry is not None and entry.get('fingerprint') == key:
+                continue
+            try:
+                module = importlib.import_module(name)
+                self.imported.append(name)
+                metadata = DecoderInfo.from_class(module.Decoder).to_dict()
+                json.dumps(metadata)
+            except Exception as e:
+                self.errors[name] = e
+                self.entries.pop(name, None)
+                continue
+            self.entries[name] = {'fingerprint': key, 'metadata': metadata}
+            changed = True
+
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            changed = True
+
+        return changed
+
+    def save(self):
+        '''Write the index, leaving it in memory only if that fails.'''
+        content = {'version': INDEX_VERSION, 'decoders': self.entries}
+        temp = self.path + '.tmp'
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(content, f, indent=1, sort_keys=True)
+            os.replace(temp, self.path)
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,57 @@
+'''
+Convert .csv and .lac captures to the formats decoded without loading
+every sample.
+
+    python -m sigrokhost.convert capture.lac capture.lactr
+    python -m sigrokhost.convert -r 24000000 capture.csv capture.lacraw
+
+.lactr files hold transition lists (transitions.TransitionCapture) and
+suit sparse signals, .lacraw files hold one word per sample
+(stream.StreamedCapture) and suit captures larger than memory.
+'''
+
+import argparse
+import os
+import sys
+
+from .capture import STREAMED_EXTENSION, TRANSITIONS_EXTENSION, Capture
+from .stream import StreamedCapture
+from .transitions import TransitionCapture
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sigrokhost.convert', description='Convert captures.')
+    parser.add_argument('-r', '--samplerate', type=int, help='samplerate, required for .csv captures')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args(argv)
+
+    source = os.path.splitext(args.source)[1].lower()
+    target = os.path.splitext(args.target)[1].lower()
+    if source not in ('.csv', '.lac'):
+        parser.error('Unsupported capture file type: {}'.format(args.source))
+    if source == '.csv' and not args.samplerate:
+        parser.error('CSV captures need an explicit samplerate.')
+
+    if target == TRANSITIONS_EXTENSION:
+        if source == '.csv':
+            capture = TransitionCapture.from_csv(args.source, args.samplerate)
+        else:
+            capture = TransitionCapture.from_lac(args.source)
+            capture.samplerate = args.samplerate or capture.samplerate
+        capture.save(args.target)
+        print('{} channels, {:,} samples, {:,} transitions'.format(
+            capture.channel_count, capture.sample_count, capture.transition_count))
+    elif target == STREAMED_EXTENSION:
+        if source == '.csv':
+            StreamedCapture.convert_csv(args.source, args.target, args.samplerate)
+        else:
+            StreamedCapture.write(args.target, Capture.load(args.source, args.samplerate))
+        capture = StreamedCapture(args.target)
+        print('{} channels, {:,} samples'.format(capture.channel_count, capture.sample_count))
+    else:
+        parser.error('Unsupported target file type: {}'.format(args.target))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,443 @@
+import importlib
+from collections import namedtuple
+
+import sigrokdecode as srd
+
+from . import vectorized
+from .annotations import AnnotationFilter, AnnotationRow, AnnotationSink
+from .edges import NEVER
+
+OutputValue = namedtuple('OutputValue', 'start_sample end_sample value')
+
+# Wait condition kinds, named after the sigrok condition characters.
+SKIP = 'skip'
+LEVEL_KINDS = ('l', 'h', 'r', 'f', 'e', 's')
+
+class RegisteredOutput:
+    '''
+    One register() call of a decoder.
+
+    OUTPUT_ANN values go to the annotation sink. Other values are handed to
+    the subscribers as they are put, and only kept in outputs when the
+    decoder was asked to retain them.
+    '''
+
+    def __init__(self, output_type, meta, output_id, sink=None, subscribers=None, keep=False):
+        self.output_type = output_type
+        self.meta = meta
+        self.output_id = output_id
+        self.count = 0
+        self.subscribers = subscribers if subscribers is not None else []
+        self.outputs = [] if keep else None
+        self.put = sink.put if sink is not None else self.forward
+
+    def forward(self, startsample, endsample, data):
+        self.count += 1
+        for subscriber in self.subscribers:
+            subscriber(startsample, endsample, data)
+        if self.outputs is not None:
+            self.outputs.append(OutputValue(startsample, endsample, data))
+
+class HostedDecoder:
+    '''
+    Runs a decoder from this directory without the desktop application.
+
+    An instance is what the sigrokdecode.Decoder shim sees as its cObj, so
+    HasChannel(), Wait(), Register() and Put() follow the behaviour of
+    SigrokDecoderBase in the C# bridge.
+
+    info provides the metadata (see catalog.DecoderInfo); when it is given,
+    the decoder module is only imported once the decoder is run. Unless
+    vectorize is false, decoders with an implementation in the vectorized
+    module are run through it instead of their decode(). While the shim's
+    profiling is enabled they always run their decode(), as the vectorized
+    implementations bypass the instrumented wait() and put().
+    '''
+
+    def __init__(self, name, info=None, vectorize=True):
+        self.name = name
+        self._module = None
+        self.info = info if info is not None else self.cls
+        self.channels = list(self.info.channels) + list(self.info.optional_channels)
+        self.decoder = None
+        self.registered_outputs = []
+        self.annotations = None
+        self.error = None
+
+        self._pins = {}
+        self._releasing = []
+        self._sample = -1
+        self._sample_count = 0
+        self._terminated = False
+        self._subscribers = {}
+        self._binary_subscribers = []
+        self._python_count = 0
+        self._classes = None
+        self.keep_outputs = False
+        self.vectorize = vectorize
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.name)
+        return self._module
+
+    @property
+    def cls(self):
+        return self.module.Decoder
+
+    @property
+    def id(self):
+        return self.info.id
+
+    @property
+    def inputs(self):
+        return list(self.info.inputs)
+
+    @property
+    def outputs(self):
+        return list(self.info.outputs)
+
+    @property
+    def is_base_analyzer(self):
+        return self.inputs[0] == 'logic'
+
+    def channel_index(self, channel):
+        '''Resolve a decoder channel given by index or by id.'''
+        if isinstance(channel, int):
+            return channel
+        for index, ch in enumerate(self.channels):
+            if ch['id'] == channel:
+                return index
+        raise KeyError('Decoder {} has no channel {}'.format(self.name, channel))
+
+    def default_options(self):
+        return {o['id']: o['default'] for o in self.info.options if 'default' in o}
+
+    def coerce_options(self, options):
+        '''Merge user options with the defaults, converting to the option's type.'''
+        result = self.default_options()
+        for key, value in (options or {}).items():
+            default = result.get(key)
+            if isinstance(value, str) and default is not None and not isinstance(default, str):
+                if isinstance(default, bool):
+                    value = value.lower() in ('1', 'true', 'yes', 'on')
+                else:
+                    value = type(default)(value)
+            result[key] = value
+        return result
+
+    def validate(self, channels):
+        '''Check that every required channel has been assigned.'''
+        return all(i in channels for i in range(len(self.info.channels)))
+
+    def subscribe(self, output, callback):
+        '''
+        Call callback(ss, es, data) for every value put to the named
+        OUTPUT_PYTHON output, as soon as it is put.
+        '''
+        self._subscribers.setdefault(output, []).append(callback)
+
+    def subscribe_binary(self, callback):
+        '''
+        Call callback(ss, es, [class, bytes]) for every OUTPUT_BINARY value,
+        as soon as it is put.
+        '''
+        self._binary_subscribers.append(callback)
+
+    def begin(self, samplerate, options, channels, capture, sink=None, rows=None):
+        '''
+        Create a fresh decoder instance and run start(), reset() and
+        metadata() on it, leaving it ready to decode.
+
+        Subscriptions are cleared, so upper decoders must subscribe after
+        the decoder they stack on has begun. sink replaces the
+        AnnotationSink that collects the OUTPUT_ANN values. rows selects
+        the annotation rows (by id) that are collected, all of them when
+        None; with no rows the decoder runs headless and only its other
+        outputs are used.
+        '''
+        self.decoder = self.cls()
+        self.decoder.cObj = self
+        self.decoder.options = self.coerce_options(options)
+
+        self._pins = {self.channel_index(k): capture.edge_index(v)
+            for k, v in (channels or {}).items()}
+        self._sample = -1
+        self._sample_count = capture.sample_count if self._pins else 0
+        # Streamed channels can drop the samples the decoder has passed.
+        self._releasing = [p for p in self._pins.values() if hasattr(p, 'release')]
+        self._terminated = False
+        self._subscribers = {}
+        self._binary_subscribers = []
+        self._python_count = 0
+        self.registered_outputs = []
+        self.annotations = sink if sink is not None else \
+            AnnotationSink(self.annotation_rows(), len(self.info.annotations))
+        self._classes = None
+        if rows is not None:
+            self._classes = {t for row in self.annotation_rows() if row.id in rows
+                for t in row.types}
+        self.error = None
+
+        try:
+            self.decoder.start()
+            self.decoder.reset()
+        except Exception:
+            pass
+
+        if hasattr(self.decoder, 'metadata'):
+            self.decoder.metadata(srd.SRD_CONF_SAMPLERATE, samplerate)
+
+    def run(self, inputs=None):
+        '''
+        Decode the logic input, then replay any stacked inputs given as
+        lists of OutputValue. Inputs fed through feed() need no replay.
+        '''
+        for name in self.inputs:
+            try:
+                if name == 'logic':
+                    self._decode()
+                else:
+                    for value in (inputs or {}).get(name) or ():
+                        self.decoder.decode(*value)
+            except Exception as e:
+                if not self._terminated:
+                    self.error = e
+
+        return self.annotations
+
+    def _decode(self):
+        fast = None
+        if self.vectorize and not srd.profiling_enabled():
+            fast = vectorized.implementation(self)
+        if fast is None:
+            self.decoder.decode()
+            return
+        fast.run()
+        self._sample = self._sample_count
+        self._terminated = True
+
+    def feed(self, startsample, endsample, data):
+        '''
+        Pass one value of a lower decoder to decode(). After the decoder
+        failed, further values are dropped.
+        '''
+        if self.error is not None:
+            return
+        try:
+            self.decoder.decode(startsample, endsample, data)
+        except Exception as e:
+            self.error = e
+
+    def execute(self, samplerate, options, channels, capture, inputs=None, keep_outputs=True,
+            rows=None):
+        '''
+        Run the decoder over a capture.
+
+        channels maps decoder channels (index or id) to capture channels,
+        inputs maps stacked input names to lists of OutputValue. Returns
+        the AnnotationSink holding the annotations (of the given rows, see
+        begin()) and, unless keep_outputs is false, keeps the OUTPUT_PYTHON
+        values available through python_outputs().
+        '''
+        self.keep_outputs = keep_outputs
+        self.begin(samplerate, options, channels, capture, rows=rows)
+        return self.run(inputs)
+
+    @property
+    def put_count(self):
+        '''Number of put() calls made during the last execution.'''
+        count = len(self.annotations) if self.annotations is not None else 0
+        return count + sum(o.count for o in self.registered_outputs)
+
+    def python_outputs(self):
+        '''Map the retained OUTPUT_PYTHON values to the decoder's output names.'''
+        outputs = self.outputs
+        python = [o for o in self.registered_outputs if o.output_type == srd.OUTPUT_PYTHON]
+        return {name: o.outputs for name, o in zip(outputs, python) if o.outputs is not None}
+
+    @property
+    def memory(self):
+        '''
+        The contents memory decoders (spiflash, eeprom24xx, ...) rebuilt
+        from what they decoded, as a common.memory.MemoryImage. None for
+        other decoders.
+        '''
+        return getattr(self.decoder, 'memory', None)
+
+    @property
+    def trace_profile(self):
+        '''
+        The execution profile of trace decoders (arm_itm, arm_etmv3), as a
+        common.traceprofile.TraceProfile. None for other decoders.
+        '''
+        return getattr(self.decoder, 'trace_profile', None)
+
+    def annotation_rows(self):
+        annotations = self.info.annotations
+        rows = []
+        used = set()
+
+        for index, (row_id, row_name, types) in enumerate(self.info.annotation_rows):
+            rows.append(AnnotationRow(index, row_id, row_name, tuple(types)))
+            used.update(types)
+
+        # Classes not listed in any row are shown in a row of their own.
+        anonymous = tuple(i for i in range(len(annotations)) if i not in used)
+        if anonymous:
+            rows.append(AnnotationRow(len(rows), self.info.id, self.info.name, anonymous))
+
+        return rows
+
+    # Bridge functions, called through the sigrokdecode.Decoder shim.
+
+    def HasChannel(self, channel):
+        return channel in self._pins
+
+    def Register(self, output_type, meta=None):
+        sink = None
+        if output_type == srd.OUTPUT_ANN:
+            sink = self.annotations
+            if self._classes is not None:
+                sink = AnnotationFilter(sink, self._classes)
+        subscribers = None
+        if output_type == srd.OUTPUT_PYTHON:
+            # Like GenerateOutputs, the n-th OUTPUT_PYTHON registration feeds
+            # the n-th name in outputs.
+            if self._python_count < len(self.info.outputs):
+                name = self.info.outputs[self._python_count]
+                subscribers = self._subscribers.setdefault(name, [])
+            self._python_count += 1
+        elif output_type == srd.OUTPUT_BINARY:
+            subscribers = self._binary_subscribers
+        output = RegisteredOutput(output_type, meta, len(self.registered_outputs), sink,
+            subscribers, self.keep_outputs)
+        self.registered_outputs.append(output)
+        return output.output_id
+
+    def IsSubscribed(self, output_id):
+        output = self.registered_outputs[output_id]
+        if output.output_type == srd.OUTPUT_ANN:
+            return self._classes is None or bool(self._classes)
+        return bool(output.subscribers) or output.outputs is not None
+
+    def SubscribedAnnotations(self):
+        if self._classes is None:
+            return list(range(len(self.info.annotations)))
+        return sorted(self._classes)
+
+    def Put(self, startsample, endsample, output_id, data):
+        self.registered_outputs[output_id].put(startsample, endsample, data)
+
+    def Wait(self, conds=None):
+        conditions = self._parse_conditions(conds)
+
+        if any(len(c) == 1 and c[0] == (SKIP, 0) for c in conditions):
+            self.decoder.matched = self._matched_at(conditions, self._sample, self._sample)
+            self.decoder.samplenum = self._sample
+            return self._pin_tuple(self._sample)
+
+        nexts = self._next_matches(conditions)
+        sample = min(nexts, default=NEVER)
+        if sample >= self._sample_count:
+            self._sample = self._sample_count
+            self._terminated = True
+            return None
+
+        # A condition matches at the chosen sample exactly when that is the
+        # first sample it accepts.
+        self._sample = sample
+        for pin in self._releasing:
+            pin.release(sample - 1)
+        self.decoder.matched = tuple(n == sample for n in nexts)
+        self.decoder.samplenum = sample
+        return self._pin_tuple(sample)
+
+    # Condition handling.
+
+    def _parse_conditions(self, conds):
+        if conds is None:
+            return [[(SKIP, 1)]]
+        if isinstance(conds, dict):
+            conds = [conds]
+        elif not isinstance(conds, list):
+            return []
+        return [self._parse_condition(c) for c in conds]
+
+    def _parse_condition(self, cond):
+        params = []
+        for key, value in cond.items():
+            if key is None or value is None:
+                params.append((SKIP, 1))
+            elif key == 'skip':
+                params.append((SKIP, int(value)))
+            elif value in LEVEL_KINDS:
+                params.append((value, int(key)))
+            else:
+                # Unknown kinds degrade to a skip, as in the C# bridge.
+                params.append((SKIP, int(key)))
+        return params
+
+    def _pin_tuple(self, sample):
+        return tuple(self._pins[i].level(sample) if i in self._pins else 0xFF
+            for i in range(len(self.channels)))
+
+    def _param_matched(self, kind, arg, sample, origin):
+        if kind == SKIP:
+            return sample - origin >= arg
+        pin = self._pins.get(arg)
+        if pin is None:
+            return False
+        new = pin.level(sample)
+        old = pin.level(sample - 1)
+        if kind == 'l':
+            return new == 0
+        if kind == 'h':
+            return new == 1
+        if kind == 'r':
+            return old == 0 and new == 1
+        if kind == 'f':
+            return old == 1 and new == 0
+        if kind == 'e':
+            return old != new
+        return old == new
+
+    def _matched_at(self, conditions, sample, origin):
+        matches = tuple(all(self._param_matched(k, a, sample, origin) for k, a in c)
+            for c in conditions)
+        return matches if any(matches) else None
+
+    def _param_next(self, kind, arg, sample, origin):
+        '''First sample at or after the given one satisfying a parameter.'''
+        if kind == SKIP:
+            return max(sample, origin + arg)
+        pin = self._pins.get(arg)
+        if pin is None:
+            return NEVER
+        if kind == 'l':
+            return pin.next_level(sample, 0)
+        if kind == 'h':
+            return pin.next_level(sample, 1)
+        if kind == 's':
+            return pin.next_stable(sample)
+        return pin.next_edge(sample, kind)
+
+    def _condition_next(self, cond, sample, origin):
+        # Every parameter moves the candidate to the next sample it accepts
+        # until all of them agree on the same one.
+        while sample < self._sample_count:
+            candidate = sample
+            for kind, arg in cond:
+                candidate = self._param_next(kind, arg, candidate, origin)
+                if candidate >= NEVER:
+                    return NEVER
+            if candidate == sample:
+                return sample
+            sample = candidate
+        return NEVER
+
+    def _next_matches(self, conditions):
+        '''First sample after the current one accepted by each condition.'''
+        origin = self._sample
+        return [self._condition_next(cond, origin + 1, origin) for cond in conditions]
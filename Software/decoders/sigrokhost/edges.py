@@ -0,0 +1,214 @@
+import numpy as np
+
+# Returned by the search functions when no sample satisfies the request.
+NEVER = np.iinfo(np.int64).max
+
+class EdgeIndex:
+    '''
+    Transition index of one channel.
+
+    transitions holds, in ascending order, every sample whose level differs
+    from the previous one. Together with the initial level it describes
+    the whole channel, so level and edge queries become binary searches.
+    '''
+
+    def __init__(self, initial, transitions, length, samples=None):
+        self.initial = int(initial)
+        self.transitions = np.asarray(transitions, dtype=np.int64)
+        self.length = int(length)
+        self.samples = samples
+        self._rising = None
+        self._falling = None
+
+    @classmethod
+    def from_samples(cls, samples):
+        if not len(samples):
+            return cls(0, (), 0, samples)
+        transitions = np.flatnonzero(np.diff(samples)) + 1
+        return cls(samples[0], transitions, len(samples), samples)
+
+    @property
+    def rising(self):
+        if self._rising is None:
+            self._rising = self.transitions[self.initial::2]
+        return self._rising
+
+    @property
+    def falling(self):
+        if self._falling is None:
+            self._falling = self.transitions[1 - self.initial::2]
+        return self._falling
+
+    def level(self, sample):
+        sample = min(max(sample, 0), self.length - 1)
+        if self.samples is not None:
+            return int(self.samples[sample])
+        count = int(self.transitions.searchsorted(sample, 'right'))
+        return self.initial ^ (count & 1)
+
+    def levels_at(self, samples):
+        '''Levels at each of the given samples (an array), as by level().'''
+        samples = np.asarray(samples, dtype=np.int64)
+        if self.samples is not None and self.length:
+            return self.samples[samples.clip(0, self.length - 1)].astype(np.int64)
+        counts = self.transitions.searchsorted(samples, 'right')
+        return self.initial ^ (counts & 1)
+
+    def edges(self, kind):
+        '''The rising ('r'), falling ('f') or all ('e') edges.'''
+        return self.rising if kind == 'r' else self.falling if kind == 'f' else self.transitions
+
+    def next_level(self, sample, level):
+        '''First sample at or after the given one showing the given level.'''
+        if self.level(sample) == level:
+            return sample
+        i = int(self.transitions.searchsorted(sample, 'right'))
+        return int(self.transitions[i]) if i < len(self.transitions) else NEVER
+
+    def next_edge(self, sample, kind):
+        '''First rising ('r'), falling ('f') or any ('e') edge at or after sample.'''
+        edges = self.edges(kind)
+        i = int(edges.searchsorted(sample))
+        return int(edges[i]) if i < len(edges) else NEVER
+
+    def next_stable(self, sample):
+        '''First sample at or after the given one that is not an edge.'''
+        t = self.transitions
+        i = int(t.searchsorted(sample))
+        while i < len(t) and t[i] == sample:
+            # Skip a run of edges on consecutive samples in one go.
+            run = t[i:i + 64] - np.arange(sample, sample + min(64, len(t) - i))
+            gaps = np.flatnonzero(run)
+            step = int(gaps[0]) if len(gaps) else len(run)
+            i += step
+            sample += step
+        return sample
+
+def levels_on(pins, samples):
+    '''
+    The levels of several channels at the given samples, as a uint8 matrix
+    with a row per sample and a column per channel. None reads as 0.
+    '''
+    matrix = np.zeros((len(samples), len(pins)), dtype=np.uint8)
+    for column, pin in enumerate(pins):
+        if pin is not None:
+            matrix[:, column] = pin.levels_at(samples)
+    return matrix
+
+def sample_on_edges(clock, kind, pins, gate=None, active=1, start=0, stop=NEVER):
+    '''
+    Sample channels on the edges of a clock, the way a decoder waiting for
+    {clock: kind} and reading the pins it returns would, for all edges at
+    once.
+
+    Returns the samples in [start, stop) that have a kind edge ('r', 'f' or
+    'e') on clock and, as by levels_on(), the levels of pins there. With a
+    gate channel, only the edges where the gate is at the active level are
+    kept (like a chip select).
+    '''
+    edges = clock.edges(kind)
+    edges = edges[edges.searchsorted(start):edges.searchsorted(stop)]
+    if gate is not None:
+        edges = edges[gate.levels_at(edges) == active]
+    return edges, levels_on(pins, edges)
+
+class StreamingEdgeIndex:
+    '''
+    Transition index of one channel of a capture that is not resident.
+
+    Samples are read from levels(start, stop) one chunk at a time, as far
+    as the queries need, and release() forgets the transitions before a
+    sample, so memory stays bounded by the transitions of a few chunks.
+    Queries must not go back before the last released sample.
+    '''
+
+    def __init__(self, levels, length, chunk_samples):
+        self.levels = levels
+        self.length = int(length)
+        self.chunk_samples = int(chunk_samples)
+        self.samples = None
+        # transitions holds every transition after base up to end.
+        self.base = 0
+        self.initial = 0
+        self.transitions = np.empty(0, dtype=np.int64)
+        self.end = 0
+        self._last = 0
+
+    def _load(self):
+        start = self.end
+        stop = min(self.length, start + self.chunk_samples)
+        levels = np.asarray(self.levels(start, stop), dtype=np.uint8)
+        if start == 0:
+            self.initial = self._last = int(levels[0])
+
+        changed = np.flatnonzero(levels[1:] != levels[:-1]) + (start + 1)
+        if levels[0] != self._last:
+            changed = np.concatenate(([start], changed))
+        if len(changed):
+            self.transitions = np.concatenate((self.transitions, changed))
+
+        self._last = int(levels[-1])
+        self.end = stop
+
+    def _ensure(self, sample):
+        while self.end <= sample and self.end < self.length:
+            self._load()
+
+    def release(self, sample):
+        '''Drop what is known about the samples before the given one.'''
+        if sample - self.base < self.chunk_samples:
+            return
+        self._ensure(sample)
+        count = int(self.transitions.searchsorted(sample, 'right'))
+        self.initial ^= count & 1
+        self.transitions = self.transitions[count:]
+        self.base = sample
+
+    def level(self, sample):
+        sample = min(max(sample, self.base), self.length - 1)
+        self._ensure(sample)
+        count = int(self.transitions.searchsorted(sample, 'right'))
+        return self.initial ^ (count & 1)
+
+    def next_level(self, sample, level):
+        '''First sample at or after the given one showing the given level.'''
+        if self.level(sample) == level:
+            return sample
+        while True:
+            i = int(self.transitions.searchsorted(sample, 'right'))
+            if i < len(self.transitions):
+                return int(self.transitions[i])
+            if self.end >= self.length:
+                return NEVER
+            self._load()
+
+    def next_edge(self, sample, kind):
+        '''First rising ('r'), falling ('f') or any ('e') edge at or after sample.'''
+        self._ensure(sample)
+        while True:
+            t = self.transitions
+            i = int(t.searchsorted(sample))
+            if kind != 'e':
+                # Transition i leads to level initial ^ ((i + 1) & 1).
+                want = self.initial if kind == 'r' else 1 - self.initial
+                i += (i & 1) != want
+            if i < len(t):
+                return int(t[i])
+            if self.end >= self.length:
+                return NEVER
+            self._load()
+
+    def next_stable(self, sample):
+        '''First sample at or after the given one that is not an edge.'''
+        while True:
+            self._ensure(sample)
+            t = self.transitions
+            i = int(t.searchsorted(sample))
+            while i < len(t) and t[i] == sample:
+                run = t[i:i + 64] - np.arange(sample, sample + min(64, len(t) - i))
+                gaps = np.flatnonzero(run)
+                step = int(gaps[0]) if len(gaps) else len(run)
+                i += step
+                sample += step
+            if sample < self.end or self.end >= self.length:
+                return sample
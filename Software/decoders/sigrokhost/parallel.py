@@ -0,0 +1,129 @@
+'''
+Parallel execution of independent decoding branches.
+
+Every top-level branch of a DecodingTree (with the decoders stacked on it)
+is independent of the others, so the branches can run in separate
+processes. The capture is placed once in a shared memory block which the
+workers map without copying; only the annotations travel back.
+'''
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .capture import Capture
+from .provider import DecodingTree, Provider
+
+class SharedCapture:
+    '''
+    A capture copied into a shared memory block, one row per channel.
+
+    The descriptor is small and picklable; attach() turns it back into a
+    Capture whose channels are views of the shared block.
+    '''
+
+    def __init__(self, capture):
+        size = max(1, capture.channel_count * capture.sample_count)
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.descriptor = (self.memory.name, capture.samplerate, capture.channel_count,
+            capture.sample_count, list(capture.names), capture.bursts)
+
+        block = self._view(self.memory, capture.channel_count, capture.sample_count)
+        for index, samples in enumerate(capture.samples):
+            block[index] = samples
+
+    @staticmethod
+    def _view(memory, channels, samples):
+        return np.ndarray((channels, samples), dtype=np.uint8, buffer=memory.buf)
+
+    @staticmethod
+    def attach(descriptor):
+        name, samplerate, channels, samples, names, bursts = descriptor
+        try:
+            # The creating process owns the block and unlinks it.
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            memory = shared_memory.SharedMemory(name=name)
+        block = SharedCapture._view(memory, channels, samples)
+        capture = Capture(samplerate, list(block), names, bursts)
+        capture.memory = memory
+        return capture
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Per worker state, set up once by the pool initializer.
+_worker_capture = None
+
+def _attach(descriptor):
+    global _worker_capture
+    if isinstance(descriptor, tuple):
+        _worker_capture = SharedCapture.attach(descriptor)
+    else:
+        _worker_capture = descriptor
+
+def _portable_error(error):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
+
+def _execute_branch(samplerate, branch, vectorize, headless):
+    provider = Provider(vectorize=vectorize, headless=headless)
+    results = provider.execute(samplerate, _worker_capture, DecodingTree([branch]))
+    errors = {k: _portable_error(v) for k, v in provider.errors.items()}
+    return results, errors
+
+class ParallelProvider(Provider):
+    '''
+    Provider that runs the top-level branches of a tree in a process pool.
+
+    Results are returned in the same form and branch order as by
+    Provider.execute(). With a single branch, a single worker, or an emit
+    or binary callback the tree is decoded in this process.
+    '''
+
+    def __init__(self, workers=None, vectorize=True, headless=False):
+        super().__init__(vectorize=vectorize, headless=headless)
+        self.workers = workers or os.cpu_count() or 1
+
+    def execute(self, samplerate, capture, tree, emit=None, binary=None):
+        branches = tree.branches
+        if self.workers < 2 or len(branches) < 2 or emit is not None or binary is not None:
+            return super().execute(samplerate, capture, tree, emit, binary)
+
+        self.instances = {}
+        self.errors = {}
+        results = {}
+
+        # Only sample arrays go through shared memory. Streamed captures are
+        # mapped from their file by every worker, transition lists are small
+        # enough to be copied.
+        shared = SharedCapture(capture) if isinstance(capture, Capture) else None
+        try:
+            workers = min(self.workers, len(branches))
+            descriptor = shared.descriptor if shared is not None else capture
+            with ProcessPoolExecutor(workers, initializer=_attach,
+                    initargs=(descriptor,)) as pool:
+                futures = [pool.submit(_execute_branch, samplerate, b, self.vectorize,
+                    self.headless) for b in branches]
+                for future in futures:
+                    branch_results, errors = future.result()
+                    results.update(branch_results)
+                    self.errors.update(errors)
+        finally:
+            if shared is not None:
+                shared.close()
+
+        return results
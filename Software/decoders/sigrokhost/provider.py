@@ -0,0 +1,153 @@
+import functools
+import os
+import sys
+
+# Decoders are imported by name, as the desktop application does after
+# appending the decoders directory to sys.path.
+DECODER_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if DECODER_PATH not in sys.path:
+    sys.path.append(DECODER_PATH)
+
+from .annotations import AnnotationStream
+from .catalog import DecoderIndex
+from .decoder import HostedDecoder
+
+class DecodingBranch:
+    '''
+    A decoder with its settings and the decoders stacked on top of it.
+
+    sources maps an input of the decoder to the output of the decoder below
+    that feeds it, when that output has another name (uart_ports puts the
+    frames of port N to 'uartN', for decoders taking 'uart'). rows limits
+    the annotation rows that are collected, see HostedDecoder.begin().
+    '''
+
+    def __init__(self, name, decoder, options=None, channels=None, children=None, sources=None,
+            rows=None):
+        self.name = name
+        self.decoder = decoder
+        self.options = options or {}
+        self.channels = channels or {}
+        self.children = list(children or [])
+        self.sources = sources or {}
+        self.rows = rows
+
+class DecodingTree:
+    def __init__(self, branches=None):
+        self.branches = list(branches or [])
+
+class Provider:
+    '''
+    Loads decoders and executes decoding trees, like SigrokProvider does
+    for the desktop application.
+
+    Unlike the desktop application, stacked decoders are not run after the
+    decoder below them has finished: each branch gets its own decoder
+    instance, and OUTPUT_PYTHON values are passed to the decoders stacked
+    on top as soon as they are put. A whole stack is decoded in one pass
+    and intermediate outputs are never kept.
+
+    vectorize selects the vectorized implementations of decoders where
+    they apply (see HostedDecoder). headless runs every decoder without
+    annotations, for callers that subscribe to the OUTPUT_PYTHON values
+    only; decoders that check what is subscribed skip formatting them.
+    '''
+
+    def __init__(self, index=None, vectorize=True, headless=False):
+        self._decoders = {}
+        self._index = index
+        self.vectorize = vectorize
+        self.headless = headless
+        self.instances = {}
+        self.errors = {}
+
+    @property
+    def index(self):
+        '''Metadata of all decoders, see catalog.DecoderIndex.'''
+        if self._index is None:
+            self._index = DecoderIndex.load()
+        return self._index
+
+    @staticmethod
+    def decoder_names():
+        names = []
+        for entry in sorted(os.listdir(DECODER_PATH)):
+            if os.path.isfile(os.path.join(DECODER_PATH, entry, 'pd.py')):
+                names.append(entry)
+        return names
+
+    def get_decoder(self, name):
+        '''
+        Shared instance of a decoder, for inspecting its metadata. The
+        decoder module is not imported until the decoder runs.
+        '''
+        if name not in self._decoders:
+            self._decoders[name] = HostedDecoder(name, self.index.info(name))
+        return self._decoders[name]
+
+    def execute(self, samplerate, capture, tree, emit=None, binary=None):
+        '''
+        Run every branch of the tree, returning annotations per branch name.
+
+        With emit, annotations are not stored but passed on as they are
+        put, as emit(branch name, row, ss, es, type id, values). With
+        binary, the OUTPUT_BINARY values are passed on as they are put, as
+        binary(branch name, ss, es, [class, bytes]), see BinaryFiles.
+        '''
+        self.instances = {}
+        self.errors = {}
+
+        for branch in tree.branches:
+            self._begin_branch(branch, samplerate, capture, {}, emit, binary)
+
+        # Stacked decoders run while the decoders below them decode, so
+        # only the decoders with a logic input are driven from here.
+        for decoder in self.instances.values():
+            if 'logic' in decoder.inputs:
+                decoder.run()
+
+        results = {}
+        for name, decoder in self.instances.items():
+            results[name] = decoder.annotations
+            if decoder.error is not None:
+                self.errors[name] = decoder.error
+
+        return results
+
+    def _begin_branch(self, branch, samplerate, capture, providers, emit, binary):
+        decoder = branch.decoder
+        if not isinstance(decoder, str):
+            decoder = decoder.name
+        decoder = HostedDecoder(decoder, self.index.info(decoder), self.vectorize)
+
+        channels = {decoder.channel_index(k): v for k, v in branch.channels.items()}
+        if not decoder.validate(channels):
+            return None
+
+        sink = None
+        if emit is not None:
+            sink = AnnotationStream(decoder.annotation_rows(), len(decoder.info.annotations),
+                functools.partial(emit, branch.name))
+        rows = () if self.headless else branch.rows
+        decoder.begin(samplerate, branch.options, channels, capture, sink, rows)
+        if binary is not None:
+            decoder.subscribe_binary(functools.partial(binary, branch.name))
+        self.instances[branch.name] = decoder
+
+        # Inputs come from the nearest decoder below that has an output of
+        # that name, as with the merged outputs of SigrokProvider.
+        outputs = dict(providers)
+        for name in decoder.outputs:
+            outputs[name] = decoder
+
+        for child in branch.children:
+            stacked = self._begin_branch(child, samplerate, capture, outputs, emit, binary)
+            if stacked is None:
+                continue
+            for name in stacked.inputs:
+                source = child.sources.get(name, name)
+                if source in outputs:
+                    outputs[source].subscribe(source, stacked.feed)
+
+        return decoder
@@ -0,0 +1,32 @@
+'''
+Build or refresh the decoder metadata index.
+
+    python -m sigrokhost.reindex [--rebuild] [--index path]
+'''
+
+import argparse
+import sys
+
+from .catalog import INDEX_NAME, DecoderIndex
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sigrokhost.reindex', description='Build the decoder index.')
+    parser.add_argument('--index', help='index file, by default {} in the decoders directory'.format(INDEX_NAME))
+    parser.add_argument('--rebuild', action='store_true', help='ignore the existing index')
+    args = parser.parse_args(argv)
+
+    index = DecoderIndex(args.index)
+    if not args.rebuild:
+        index.read()
+    index.refresh()
+    if not index.save():
+        print('Could not write {}'.format(index.path), file=sys.stderr)
+        return 1
+
+    print('{} decoders, {} imported'.format(len(index.entries), len(index.imported)))
+    for name, error in sorted(index.errors.items()):
+        print('{}: {!r}'.format(name, error), file=sys.stderr)
+    return 1 if index.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
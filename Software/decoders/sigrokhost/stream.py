@@ -0,0 +1,164 @@
+'''
+Decoding captures that are stored on disk and may not fit in memory.
+
+A .lacraw file holds a small header followed by one little-endian word per
+sample, bit n being the level of channel n, the layout the device sends
+its samples in. The file is memory-mapped and every channel is indexed a
+chunk at a time as the decoders advance, so the decoder keeps its state
+across chunk boundaries while only a few chunks are in use.
+'''
+
+import json
+import struct
+
+import numpy as np
+
+from .capture import Capture, CaptureFormatError, read_csv_blocks
+from .edges import StreamingEdgeIndex
+
+MAGIC = b'LACRAW\x00\x01'
+
+# magic, samplerate, sample count, channel count, word size, names length
+HEADER = struct.Struct('<8sQQIII')
+
+# Samples are aligned so the mapping can be read as an array of words.
+ALIGNMENT = 64
+
+DEFAULT_CHUNK_SAMPLES = 1 << 22
+
+def _word_size(channels):
+    for size in (1, 2, 4, 8):
+        if channels <= size * 8:
+            return size
+    raise CaptureFormatError('Too many channels for a streamed capture: {}'.format(channels))
+
+class StreamedCaptureWriter:
+    '''
+    Writes a .lacraw file block by block, so captures can be converted
+    without holding them in memory.
+    '''
+
+    def __init__(self, path, samplerate, names):
+        self.path = path
+        self.samplerate = int(samplerate)
+        self.names = list(names)
+        self.word_size = _word_size(len(self.names))
+        self.dtype = np.dtype('<u{}'.format(self.word_size))
+        self.sample_count = 0
+
+        self._names = json.dumps(self.names).encode('utf-8')
+        self._file = open(path, 'wb')
+        self._file.write(self._header())
+        self._file.write(b'\0' * (self.data_offset - self._file.tell()))
+
+    @property
+    def data_offset(self):
+        size = HEADER.size + len(self._names)
+        return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    def _header(self):
+        return HEADER.pack(MAGIC, self.samplerate, self.sample_count,
+            len(self.names), self.word_size, len(self._names)) + self._names
+
+    def write(self, columns):
+        '''Append a block of samples given as one level array per channel.'''
+        words = np.zeros(len(columns[0]) if columns else 0, dtype=self.dtype)
+        for bit, column in enumerate(columns):
+            words |= (np.asarray(column) != 0).astype(self.dtype) << bit
+        self._file.write(words.tobytes())
+        self.sample_count += len(words)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StreamedCapture:
+    '''
+    A .lacraw capture, mapped instead of loaded.
+
+    It offers what the host needs from a Capture, but every call to
+    edge_index() returns a new StreamingEdgeIndex: each decoder advances
+    through the file on its own.
+    '''
+
+    channel_index = Capture.channel_index
+
+    def __init__(self, path, chunk_samples=DEFAULT_CHUNK_SAMPLES):
+        self.path = path
+        self.chunk_samples = chunk_samples
+        self.bursts = []
+
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise CaptureFormatError('Truncated capture: {}'.format(path))
+            magic, samplerate, sample_count, channels, word_size, names_length = \
+                HEADER.unpack(header)
+            if magic != MAGIC:
+                raise CaptureFormatError('Not a streamed capture: {}'.format(path))
+            names = json.loads(f.read(names_length).decode('utf-8'))
+
+        self.samplerate = samplerate
+        self.names = names
+        self._sample_count = sample_count
+        self._channel_count = channels
+        self._dtype = np.dtype('<u{}'.format(word_size))
+        self._offset = (HEADER.size + names_length + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        self._words = None
+
+    @property
+    def sample_count(self):
+        return self._sample_count
+
+    @property
+    def channel_count(self):
+        return self._channel_count
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = np.memmap(self.path, dtype=self._dtype, mode='r',
+                offset=self._offset, shape=(self._sample_count,)) \
+                if self._sample_count else np.empty(0, dtype=self._dtype)
+        return self._words
+
+    def levels(self, channel, start, stop):
+        '''Levels of a channel over a range of samples.'''
+        index = self.channel_index(channel)
+        return (self.words[start:stop] >> index) & 1
+
+    def edge_index(self, channel):
+        index = self.channel_index(channel)
+        return StreamingEdgeIndex(lambda start, stop: self.levels(index, start, stop),
+            self._sample_count, self.chunk_samples)
+
+    def __getstate__(self):
+        # The mapping is reopened after unpickling, e.g. in a worker process.
+        state = dict(self.__dict__)
+        state['_words'] = None
+        return state
+
+    @staticmethod
+    def write(path, capture, block_samples=DEFAULT_CHUNK_SAMPLES):
+        '''Store a Capture as a .lacraw file.'''
+        with StreamedCaptureWriter(path, capture.samplerate, capture.names) as writer:
+            for start in range(0, capture.sample_count, block_samples):
+                writer.write([s[start:start + block_samples] for s in capture.samples])
+
+    @staticmethod
+    def convert_csv(source, path, samplerate, block_rows=1 << 20):
+        '''
+        Convert a CLCapture CSV file to a .lacraw file, reading it
+        block_rows rows at a time.
+        '''
+        names, blocks = read_csv_blocks(source, block_rows)
+        with StreamedCaptureWriter(path, samplerate, names) as writer:
+            for values in blocks:
+                writer.write([values[:, c] for c in range(len(names))])
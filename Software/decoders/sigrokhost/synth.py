@@ -0,0 +1,367 @@
+'''
+Synthetic signal generators for benchmarking and exercising decoders.
+
+Every generator returns a Capture. Signals are described as a sequence of
+steps (channel levels held for a number of samples) and rendered with
+np.repeat, so even long captures are built quickly.
+'''
+
+import random
+
+import numpy as np
+
+from .capture import Capture
+
+class Timeline:
+    '''Builds a multi-channel capture from (levels, duration) steps.'''
+
+    def __init__(self, names, idle):
+        self.names = list(names)
+        self.levels = dict(zip(self.names, idle))
+        self._steps = []
+        self._durations = []
+
+    def set(self, **levels):
+        self.levels.update(levels)
+
+    def hold(self, duration, **levels):
+        '''Apply levels, then keep every channel steady for duration samples.'''
+        self.levels.update(levels)
+        duration = int(round(duration))
+        if duration > 0:
+            self._steps.append([self.levels[n] for n in self.names])
+            self._durations.append(duration)
+
+    @property
+    def length(self):
+        return sum(self._durations)
+
+    def capture(self, samplerate):
+        steps = np.array(self._steps, dtype=np.uint8).reshape(-1, len(self.names))
+        durations = np.array(self._durations, dtype=np.int64)
+        return Capture(samplerate, [np.repeat(steps[:, c], durations)
+            for c in range(len(self.names))], self.names)
+
+def _payload(rng, count):
+    return bytes(rng.randrange(256) for _ in range(count))
+
+def uart(samplerate=1000000, baudrate=115200, frames=1000, data_bits=8,
+        parity='none', stop_bits=1, gap_bits=2, seed=0):
+    '''RX carries data frames, TX idles high. Gaps between frames vary.'''
+    rng = random.Random(seed)
+    t = Timeline(('rx', 'tx'), (1, 1))
+    bit = samplerate / baudrate
+    pos = 0.0
+
+    def hold_bits(level, count):
+        nonlocal pos
+        start = int(round(pos))
+        pos += count * bit
+        t.hold(int(round(pos)) - start, rx=level)
+
+    hold_bits(1, 10)
+    for value in _payload(rng, frames):
+        bits = [(value >> i) & 1 for i in range(data_bits)]
+        hold_bits(0, 1)
+        for b in bits:
+            hold_bits(b, 1)
+        if parity in ('odd', 'even'):
+            hold_bits((sum(bits) + (parity == 'odd')) & 1, 1)
+        hold_bits(1, stop_bits + rng.randint(0, gap_bits))
+    hold_bits(1, 10)
+
+    return t.capture(samplerate)
+
+def spi(samplerate=10000000, clock=1000000, mode=0, transfers=200,
+        transfer_bytes=16, seed=0):
+    '''SPI transfers in the given mode (0-3), MSB first, CS active low.'''
+    rng = random.Random(seed)
+    cpol, cpha = mode >> 1, mode & 1
+    t = Timeline(('clk', 'miso', 'mosi', 'cs'), (cpol, 0, 0, 1))
+    half = samplerate / clock / 2
+
+    t.hold(4 * half)
+    for _ in range(transfers):
+        t.hold(2 * half, cs=0)
+        for mosi, miso in zip(_payload(rng, transfer_bytes), _payload(rng, transfer_bytes)):
+            for i in range(7, -1, -1):
+                data = {'mosi': (mosi >> i) & 1, 'miso': (miso >> i) & 1}
+                if cpha == 0:
+                    t.hold(half, **data)
+                    t.hold(half, clk=1 - cpol)
+                    t.set(clk=cpol)
+                else:
+                    t.hold(half, clk=1 - cpol, **data)
+                    t.hold(half, clk=cpol)
+        t.hold(2 * half)
+        t.hold(4 * half, cs=1)
+
+    return t.capture(samplerate)
+
+def i2c(samplerate=4000000, clock=100000, transactions=200, transfer_bytes=8,
+        stretch=0.3, seed=0):
+    '''I²C writes with ACKed bytes; the slave randomly stretches the clock.'''
+    rng = random.Random(seed)
+    t = Timeline(('scl', 'sda'), (1, 1))
+    quarter = samplerate / clock / 4
+
+    def clock_bit(level):
+        t.hold(quarter, scl=0)
+        t.hold(quarter, sda=level)
+        t.hold(2 * quarter, scl=1)
+        t.set(scl=0)
+
+    t.hold(8 * quarter)
+    for _ in range(transactions):
+        t.hold(2 * quarter, sda=0)
+        address = rng.randrange(0x08, 0x78)
+        for value in [address << 1] + list(_payload(rng, transfer_bytes)):
+            for i in range(7, -1, -1):
+                clock_bit((value >> i) & 1)
+            clock_bit(0)
+            if rng.random() < stretch:
+                t.hold(rng.randint(4, 40) * quarter, scl=0)
+        t.hold(quarter, scl=0, sda=0)
+        t.hold(2 * quarter, scl=1)
+        t.hold(8 * quarter, sda=1)
+
+    return t.capture(samplerate)
+
+def _can_crc(bits, width, poly, init=0):
+    crc = init
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    for b in bits:
+        feedback = b ^ bool(crc & top)
+        crc = (crc << 1) & mask
+        if feedback:
+            crc ^= poly
+    return [(crc >> i) & 1 for i in range(width - 1, -1, -1)]
+
+def _msb(value, count):
+    return [(value >> i) & 1 for i in range(count - 1, -1, -1)]
+
+def _stuff(bits):
+    '''
+    Insert a complementary bit after five equal ones (CAN bit stuffing).
+    Returns the stuffed bits and the stuffed position of every input bit.
+    '''
+    out = []
+    positions = []
+    run_level, run = None, 0
+    for b in bits:
+        positions.append(len(out))
+        out.append(b)
+        if b == run_level:
+            run += 1
+        else:
+            run_level, run = b, 1
+        if run == 5:
+            out.append(1 - b)
+            run_level, run = 1 - b, 1
+    return out, positions
+
+def _can_fd_dlc(length):
+    sizes = [0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64]
+    return sizes.index(length)
+
+def can_frame_bits(ident, data, fd=False):
+    '''
+    Bits of a standard (11-bit identifier) CAN or CAN FD data frame, from
+    SOF to the end of the CRC sequence, with all stuff bits in place.
+    Returns the bits and the position of the BRS bit (None for classic
+    frames).
+    '''
+    if not fd:
+        head = [0] + _msb(ident, 11) + [0, 0, 0] + _msb(len(data), 4)
+        for b in data:
+            head += _msb(b, 8)
+        return _stuff(head + _can_crc(head, 15, 0x4599))[0], None
+
+    # SOF, identifier, RRS, IDE, FDF, res, BRS, ESI and DLC.
+    head = [0] + _msb(ident, 11) + [0, 0, 1, 0, 1, 0] + _msb(_can_fd_dlc(len(data)), 4)
+    for b in data:
+        head += _msb(b, 8)
+    stuffed, positions = _stuff(head)
+    if len(stuffed) > positions[-1] + 1:
+        # The fixed stuff bit before the stuff count replaces a dynamic one.
+        stuffed.pop()
+    count = (len(stuffed) - len(head)) % 8
+    gray = count ^ (count >> 1)
+    stuff_count = _msb(gray, 3) + [bin(gray).count('1') & 1]
+    if len(data) <= 16:
+        crc = _can_crc(stuffed + stuff_count, 17, 0x1685b, 1 << 16)
+    else:
+        crc = _can_crc(stuffed + stuff_count, 21, 0x102899, 1 << 20)
+
+    # Fixed stuff bits: one before the stuff count and after every four
+    # bits of the stuff count and CRC fields.
+    tail = []
+    last = stuffed[-1]
+    for i, b in enumerate(stuff_count + crc):
+        if i % 4 == 0:
+            tail.append(1 - last)
+        tail.append(b)
+        last = b
+
+    return stuffed + tail, positions[16]
+
+def can(samplerate=20000000, bitrate=500000, fast_bitrate=2000000, frames=200,
+        fd=False, sample_point=0.7, seed=0):
+    '''Standard-identifier CAN (or CAN FD with bit rate switch) data frames.'''
+    rng = random.Random(seed)
+    t = Timeline(('can_rx',), (1,))
+    nominal = samplerate / bitrate
+    fast = samplerate / fast_bitrate
+    pos = 0.0
+
+    def hold_bits(bits, width):
+        nonlocal pos
+        for b in bits:
+            start = int(round(pos))
+            pos += width
+            t.hold(int(round(pos)) - start, can_rx=b)
+
+    hold_bits([1] * 11, nominal)
+    for _ in range(frames):
+        ident = rng.randrange(0, 0x7f0)
+        if fd:
+            data = _payload(rng, rng.choice([8, 12, 16, 32, 64]))
+        else:
+            data = _payload(rng, rng.randint(0, 8))
+        bits, brs = can_frame_bits(ident, data, fd)
+        if brs is None:
+            hold_bits(bits + [1], nominal)
+        else:
+            # The bit rate switches at the sample points of the BRS bit
+            # and of the CRC delimiter.
+            hold_bits(bits[:brs], nominal)
+            hold_bits([1], sample_point * nominal + (1 - sample_point) * fast)
+            hold_bits(bits[brs + 1:], fast)
+            hold_bits([1], sample_point * fast + (1 - sample_point) * nominal)
+        # ACK slot, ACK delimiter, EOF and intermission.
+        hold_bits([0, 1] + [1] * 7 + [1] * 3, nominal)
+        hold_bits([1] * rng.randint(0, 20), nominal)
+
+    return t.capture(samplerate)
+
+def onewire(samplerate=2000000, transactions=100, seed=0):
+    '''1-Wire resets with presence pulses, Read ROM and 8 bytes of answer.'''
+    rng = random.Random(seed)
+    t = Timeline(('owr',), (1,))
+    us = samplerate / 1000000
+
+    def write_bit(b):
+        low = 6 if b else 60
+        t.hold(low * us, owr=0)
+        t.hold((70 - low) * us, owr=1)
+
+    t.hold(100 * us)
+    for _ in range(transactions):
+        t.hold(480 * us, owr=0)
+        t.hold(30 * us, owr=1)
+        t.hold(120 * us, owr=0)
+        t.hold(350 * us, owr=1)
+        for i in range(8):
+            write_bit((0x33 >> i) & 1)
+        for value in _payload(rng, 8):
+            for i in range(8):
+                # Read slots look like write slots on the wire.
+                write_bit((value >> i) & 1)
+        t.hold(rng.randint(100, 1000) * us)
+
+    return t.capture(samplerate)
+
+def ws281x(samplerate=24000000, leds=100, frames=20, seed=0):
+    '''WS2812 GRB data at 800 kHz with reset pulses between frames.'''
+    rng = random.Random(seed)
+    t = Timeline(('din',), (0,))
+    ns = samplerate / 1e9
+
+    t.hold(60000 * ns)
+    for _ in range(frames):
+        for value in _payload(rng, 3 * leds):
+            for i in range(7, -1, -1):
+                if (value >> i) & 1:
+                    t.hold(800 * ns, din=1)
+                    t.hold(450 * ns, din=0)
+                else:
+                    t.hold(400 * ns, din=1)
+                    t.hold(850 * ns, din=0)
+        t.hold(60000 * ns, din=0)
+
+    return t.capture(samplerate)
+
+def _usb_crc5(bits):
+    crc = 0x1f
+    for b in bits:
+        if (crc & 1) ^ b:
+            crc = (crc >> 1) ^ 0x14
+        else:
+            crc >>= 1
+    crc ^= 0x1f
+    return [(crc >> i) & 1 for i in range(5)]
+
+def _usb_crc16(bits):
+    crc = 0xffff
+    for b in bits:
+        if (crc & 1) ^ b:
+            crc = (crc >> 1) ^ 0xa001
+        else:
+            crc >>= 1
+    crc ^= 0xffff
+    return [(crc >> i) & 1 for i in range(16)]
+
+def _lsb(value, count):
+    return [(value >> i) & 1 for i in range(count)]
+
+def usb_packet_bits(pid, payload_bits=()):
+    '''Packet bits (LSB first) from SYNC to the end of the CRC, unstuffed.'''
+    return _lsb(0x80, 8) + _lsb(pid | ((~pid & 0xf) << 4), 8) + list(payload_bits)
+
+def usb_fs(samplerate=48000000, frames=100, seed=0):
+    '''USB full-speed traffic: SOF, OUT, DATA0 and ACK packets, NRZI coded.'''
+    rng = random.Random(seed)
+    t = Timeline(('dp', 'dm'), (1, 0))
+    bit = samplerate / 12000000
+    pos = 0.0
+    line = [1]
+
+    def hold_bits(count, dp, dm):
+        nonlocal pos
+        start = int(round(pos))
+        pos += count * bit
+        t.hold(int(round(pos)) - start, dp=dp, dm=dm)
+
+    def send(bits):
+        ones = 0
+        for b in bits:
+            if not b:
+                line[0] ^= 1
+            hold_bits(1, line[0], 1 - line[0])
+            ones = ones + 1 if b else 0
+            if ones == 6:
+                line[0] ^= 1
+                hold_bits(1, line[0], 1 - line[0])
+                ones = 0
+        hold_bits(2, 0, 0)
+        line[0] = 1
+        hold_bits(1, 1, 0)
+
+    hold_bits(20, 1, 0)
+    for frame in range(frames):
+        fields = _lsb(frame & 0x7ff, 11)
+        send(usb_packet_bits(0x5, fields + _usb_crc5(fields)))
+        hold_bits(10, 1, 0)
+        fields = _lsb(rng.randrange(1, 128), 7) + _lsb(1, 4)
+        send(usb_packet_bits(0x1, fields + _usb_crc5(fields)))
+        hold_bits(4, 1, 0)
+        data = []
+        for value in _payload(rng, rng.randint(0, 64)):
+            data += _lsb(value, 8)
+        send(usb_packet_bits(0x3, data + _usb_crc16(data)))
+        hold_bits(4, 1, 0)
+        send(usb_packet_bits(0x2))
+        hold_bits(rng.randint(20, 200), 1, 0)
+
+    return t.capture(samplerate)
@@ -0,0 +1,172 @@
+'''
+Captures stored as transition lists.
+
+Most channels of a capture change level rarely, so instead of one byte per
+sample a channel can be kept as its initial level and the sample index of
+every transition, which is exactly the EdgeIndex the host answers wait()
+conditions from. A .lactr file stores these int64 lists per channel.
+
+The converters never hold more than one channel (.lac) or one block of
+rows (.csv) as samples.
+'''
+
+import base64
+import json
+
+import numpy as np
+
+from .capture import Capture, CaptureFormatError, read_csv_blocks
+from .edges import EdgeIndex
+
+class TransitionBuilder:
+    '''Collects the transitions of one channel from consecutive blocks.'''
+
+    def __init__(self):
+        self.initial = None
+        self.length = 0
+        self._last = 0
+        self._parts = []
+
+    def append(self, levels):
+        levels = np.asarray(levels, dtype=np.uint8)
+        if not len(levels):
+            return
+        if self.initial is None:
+            self.initial = self._last = int(levels[0])
+
+        changed = np.flatnonzero(levels[1:] != levels[:-1]) + (self.length + 1)
+        if levels[0] != self._last:
+            self._parts.append(np.array([self.length], dtype=np.int64))
+        self._parts.append(changed.astype(np.int64))
+
+        self._last = int(levels[-1])
+        self.length += len(levels)
+
+    def index(self):
+        transitions = np.concatenate(self._parts) if self._parts else ()
+        return EdgeIndex(self.initial or 0, transitions, self.length)
+
+class TransitionCapture:
+    '''
+    A capture kept as one EdgeIndex per channel.
+
+    The host uses it like a Capture. Every channel must have the same
+    length.
+    '''
+
+    channel_index = Capture.channel_index
+
+    def __init__(self, samplerate, channels, names=None, bursts=None):
+        self.samplerate = int(samplerate) if samplerate else 0
+        self.channels = list(channels)
+        self.names = list(names) if names else \
+            ['Channel {}'.format(i + 1) for i in range(len(self.channels))]
+        self.bursts = bursts or []
+
+        lengths = set(c.length for c in self.channels)
+        if len(lengths) > 1:
+            raise CaptureFormatError('Channels have different sample counts.')
+
+    @property
+    def sample_count(self):
+        return self.channels[0].length if self.channels else 0
+
+    @property
+    def channel_count(self):
+        return len(self.channels)
+
+    @property
+    def transition_count(self):
+        return sum(len(c.transitions) for c in self.channels)
+
+    def edge_index(self, channel):
+        return self.channels[self.channel_index(channel)]
+
+    def levels(self, channel, start=0, stop=None):
+        '''Expand a channel, or part of it, back to one level per sample.'''
+        index = self.edge_index(channel)
+        stop = index.length if stop is None else min(stop, index.length)
+        if start >= stop:
+            return np.empty(0, dtype=np.uint8)
+        t = index.transitions
+        lo, hi = t.searchsorted(start, 'right'), t.searchsorted(stop)
+        bounds = np.concatenate(([start], t[lo:hi], [stop]))
+        first = index.level(start)
+        runs = (np.arange(len(bounds) - 1) + first) & 1
+        return np.repeat(runs.astype(np.uint8), np.diff(bounds))
+
+    def to_capture(self):
+        return Capture(self.samplerate, [self.levels(i) for i in range(self.channel_count)],
+            self.names, self.bursts)
+
+    @classmethod
+    def from_capture(cls, capture):
+        channels = []
+        for i in range(capture.channel_count):
+            index = capture.edge_index(i)
+            channels.append(EdgeIndex(index.initial, index.transitions, index.length))
+        return cls(capture.samplerate, channels, capture.names, capture.bursts)
+
+    @classmethod
+    def from_csv(cls, path, samplerate, block_rows=1 << 20):
+        '''Convert a CLCapture CSV file, block_rows rows at a time.'''
+        names, blocks = read_csv_blocks(path, block_rows)
+        builders = [TransitionBuilder() for _ in names]
+        for values in blocks:
+            for c, builder in enumerate(builders):
+                builder.append(values[:, c])
+
+        return cls(samplerate, [b.index() for b in builders], names)
+
+    @classmethod
+    def from_lac(cls, path):
+        '''Convert a .lac file, one channel at a time.'''
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            content = json.load(f)
+
+        settings = content.get('Settings')
+        if not settings:
+            raise CaptureFormatError('Missing capture settings: {}'.format(path))
+
+        legacy = content.get('Samples')
+        channels = []
+        names = []
+
+        for index, channel in enumerate(settings.get('CaptureChannels') or []):
+            names.append(channel.get('ChannelName') or
+                'Channel {}'.format(channel.get('ChannelNumber', index) + 1))
+            builder = TransitionBuilder()
+            data = channel.get('Samples')
+            if data is not None:
+                builder.append(np.frombuffer(base64.b64decode(data), dtype=np.uint8) != 0)
+            elif legacy is not None:
+                builder.append(np.array([(int(v) >> index) & 1 for v in legacy], dtype=np.uint8))
+            else:
+                raise CaptureFormatError('Channel without samples: {}'.format(path))
+            channel['Samples'] = None
+            channels.append(builder.index())
+
+        return cls(settings.get('Frequency', 0), channels, names, settings.get('Bursts'))
+
+    def save(self, path):
+        arrays = {'transitions_{}'.format(i): c.transitions for i, c in enumerate(self.channels)}
+        header = {
+            'samplerate': self.samplerate,
+            'names': self.names,
+            'initial': [c.initial for c in self.channels],
+            'length': self.sample_count,
+            'bursts': self.bursts,
+        }
+        arrays['header'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if 'header' not in data:
+                raise CaptureFormatError('Not a transition capture: {}'.format(path))
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            channels = [EdgeIndex(initial, data['transitions_{}'.format(i)], header['length'])
+                for i, initial in enumerate(header['initial'])]
+        return cls(header['samplerate'], channels, header['names'], header.get('bursts'))
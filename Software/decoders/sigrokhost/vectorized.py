@@ -0,0 +1,1002 @@
+'''
+Vectorized replacements for the decode() loop of some decoders.
+
+A decoder driven through wait() pays for every condition it waits on,
+once per bit for the serial decoders. The implementations here read the
+transition lists of the channels instead, find the frames (or the clock
+edges, see edges.sample_on_edges()) and sample all of their bits with
+array operations, and then make the put() calls the decoder would have
+made: same outputs, same values, same order. Stacked decoders and
+annotation consumers cannot tell the difference.
+
+They run in place of decode() on a decoder that has begun, so the
+decoder's own options, registrations and helpers are used. Captures whose
+channels are not fully indexed (streamed captures) and option values an
+implementation does not cover are left to the decoder.
+'''
+
+import heapq
+import sys
+from bisect import bisect_right
+from math import ceil, floor
+from operator import itemgetter
+
+import numpy as np
+
+from .edges import NEVER, EdgeIndex, levels_on, sample_on_edges
+
+# Frames whose bits are sampled in one go.
+BLOCK_FRAMES = 1 << 16
+
+def _indexed(pin):
+    return type(pin) is EdgeIndex
+
+def _put(hosted, records):
+    '''Put the records of a single stream, (output, ss, es, data) each.'''
+    puts = [o.put for o in hosted.registered_outputs]
+    for output, ss, es, data in records:
+        puts[output](ss, es, data)
+
+def _merge(hosted, streams):
+    '''Put the records of several streams, each ordered by its key.'''
+    puts = [o.put for o in hosted.registered_outputs]
+    for _, output, ss, es, data in heapq.merge(*streams, key=itemgetter(0)):
+        puts[output](ss, es, data)
+
+class UartFrames:
+    '''
+    The uart decoder's decode() for the RX and TX lines.
+
+    Every line is handled on its own: the start bits are chained from the
+    falling edges (each frame's successor is the first falling edge after
+    its last sample point, or after the break that cut it short), the bit
+    sample points of a block of frames are computed and looked up at once,
+    and the edges are scanned for breaks and idle periods. The records of
+    the lines are then merged in the order the decoder's wait() loop would
+    have produced them: by sample, RX before TX, and per line the sample
+    point before the edge before the idle timeout.
+
+    port is the common.uart port that holds the options, registrations and
+    helpers: the one of the uart decoder, or one of uart_ports. Records are
+    keyed by sample * stride + order * 6, so the ports of one decoder merge
+    in their wait() order.
+    '''
+
+    def __init__(self, hosted, port=None, order=0, stride=6):
+        self.hosted = hosted
+        self.port = p = port if port is not None else hosted.decoder.port
+        # The port's module, for its constants and helpers.
+        self.module = sys.modules[type(p).__module__]
+        self.channels = p.channels
+        self.order, self.stride = order, stride
+        self.ann_base, self.bin_base = p.ann_base, p.bin_base
+        opt = p.options
+
+        self.bit_width = p.bit_width
+        self.data_bits = opt['data_bits']
+        self.parity = opt['parity']
+        self.has_parity = 1 if opt['parity'] != 'none' else 0
+        self.stop_samples = max(1, ceil(opt['stop_bits'])) if opt['stop_bits'] else 0
+        self.bits = 1 + self.data_bits + self.has_parity + self.stop_samples
+        self.msb_first = opt['bit_order'] == 'msb-first'
+        self.invert = [opt['invert_rx'] == 'yes', opt['invert_tx'] == 'yes']
+
+        self.frame_len = p.frame_len_sample_count
+        # As in get_sample_point().
+        perc = opt['sample_point'] or 50
+        if not perc or perc not in range(1, 100):
+            perc = 50
+        perc /= 100.0
+        self.sample_offset = (self.bit_width - 1) * perc
+
+        halfbit = self.bit_width / 2.0
+        self.floor_half, self.ceil_half = floor(halfbit), ceil(halfbit)
+        self.int_half = int(self.bit_width / 2)
+        self.sample_count = hosted._sample_count
+
+        # Like the port, skip formatting what nobody consumes.
+        self.shown = p.shown_anns
+        self.binary_used = p.binary_used
+        # The ports of uart_ports have no pcapng stream.
+        self.pcap_packet = p.pcap_packet if self.binary_used and p.pcap is not None else None
+
+    @staticmethod
+    def port_supported(port):
+        opt = port.options
+        data_bits, stop_bits = opt.get('data_bits'), opt.get('stop_bits')
+        if type(data_bits) is not int or not 1 <= data_bits <= 62:
+            return False
+        if type(stop_bits) not in (int, float) or stop_bits < 0:
+            return False
+        # Sample points less than a sample apart make the decoder wait on
+        # the sample it is at, which only the decoder itself gets right.
+        return port.bit_width > 1
+
+    @classmethod
+    def supported(cls, hosted):
+        d = hosted.decoder
+        pins = hosted._pins
+        if not getattr(d, 'samplerate', None) or not pins:
+            return False
+        if set(pins) - {0, 1} or not all(_indexed(p) for p in pins.values()):
+            return False
+        d.setup_port()
+        return cls.port_supported(d.port)
+
+    def streams(self):
+        streams = []
+        for rxtx, channel in enumerate(self.channels):
+            pin = self.hosted._pins.get(channel)
+            if pin is not None:
+                streams.extend(self._line(rxtx, pin))
+        return streams
+
+    def run(self):
+        if self.pcap_packet is not None:
+            p = self.port
+            self.hosted.Put(0, 0, p.out_binary, [self.module.Bin.PCAP, p.pcap.header()])
+        _merge(self.hosted, self.streams())
+
+    def _line(self, rxtx, pin):
+        '''The frame and the edge record streams of one line.'''
+        inv = self.invert[rxtx]
+        t = pin.transitions
+        # Level of the (inverted) line after each transition.
+        after = (pin.initial + 1 + np.arange(len(t))) & 1 ^ inv
+        falls = t[after == 0]
+        rises = np.flatnonzero(after == 1)
+        rises = rises[rises > 0]
+        lows = t[rises] - t[rises - 1]
+        breaks = t[rises][lows >= self.frame_len]
+
+        # Candidate frames start on every falling edge.
+        first = np.ceil(self.sample_offset + falls.astype(np.float64)).astype(np.int64)
+        last = np.ceil((self.sample_offset + falls.astype(np.float64)) +
+            (self.bits - 1) * self.bit_width).astype(np.int64)
+        valid = (pin.levels_at(first) ^ inv) == 0
+        end = np.where(valid, last, first)
+        cut = breaks[np.minimum(breaks.searchsorted(falls, 'right'), len(breaks) - 1)] \
+            if len(breaks) else np.full(len(falls), np.iinfo(np.int64).max)
+        aborted = (cut > falls) & (cut < end)
+        stop = np.where(aborted, cut, end)
+        successor = falls.searchsorted(stop, 'right').tolist()
+
+        chain = []
+        i, count = 0, len(falls)
+        while i < count:
+            chain.append(i)
+            i = successor[i]
+        chain = np.array(chain, dtype=np.int64)
+
+        starts = falls[chain]
+        stop = stop[chain]
+        # The sample points where a frame leaves its idle timeout: the last
+        # one of a complete frame, the start bit of an invalid one.
+        done = np.where(valid[chain], last[chain], first[chain])
+        finished = ~aborted[chain] & (done < self.sample_count)
+        idle_at = np.where(valid[chain], starts + self.frame_len, first[chain] + self.ceil_half)
+        idle = (done[finished], idle_at[finished])
+
+        return [self._frames(rxtx, pin, starts, stop), self._edges(rxtx, pin, after, idle, starts)]
+
+    def _frames(self, rxtx, pin, starts, stop):
+        '''The records of the frames starting at starts, cut short at stop.'''
+        d, m = self.port, self.module
+        opt = d.options
+        inv = self.invert[rxtx]
+        py, ann, binary = d.out_python, d.out_ann, d.out_binary
+        fh, ch, ih = self.floor_half, self.ceil_half, self.int_half
+        data_bits, has_parity, stop_samples = self.data_bits, self.has_parity, self.stop_samples
+        offsets = np.arange(self.bits) * self.bit_width
+        weights = np.int64(1) << np.arange(data_bits, dtype=np.int64)
+        if self.msb_first:
+            weights = weights[::-1]
+        bw = d.bw
+
+        stride, key = self.stride, self.order * 6 + rxtx * 3
+        a = self.ann_base + rxtx
+        warn, start, data_bit = m.Ann.RX_WARN + a, m.Ann.RX_START + a, m.Ann.RX_DATA_BIT + a
+        parity_ok, parity_err = m.Ann.RX_PARITY_OK + a, m.Ann.RX_PARITY_ERR + a
+        data_ann, stop_ann = m.Ann.RX_DATA + a, m.Ann.RX_STOP + a
+        line_bin, both_bin = m.Bin.RX + self.bin_base + rxtx, m.Bin.RXTX + self.bin_base
+        frame_error = ['Frame error', 'Frame err', 'FE']
+
+        bit_anns, data_anns = data_bit in self.shown, data_ann in self.shown
+        binary_used, pcap_packet = self.binary_used, self.pcap_packet
+
+        name = 'rx' if rxtx == 0 else 'tx'
+        delim, plen = opt[name + '_packet_delim'], opt[name + '_packet_len']
+        packets = not (delim == -1 and plen == -1) and m.Ann.RX_PACKET + a in self.shown
+        packet_ann = m.Ann.RX_PACKET + a if packets else None
+        packet, ss_packet = [], None
+
+        datavalue = 0
+        for block in range(0, len(starts), BLOCK_FRAMES):
+            f = starts[block:block + BLOCK_FRAMES]
+            pos = np.ceil((self.sample_offset + f.astype(np.float64))[:, None] +
+                offsets).astype(np.int64)
+            levels = pin.levels_at(pos) ^ inv
+            counts = ((pos < self.sample_count) &
+                (pos <= stop[block:block + BLOCK_FRAMES, None])).sum(axis=1)
+            values = levels[:, 1:1 + data_bits] @ weights
+
+            if inv:
+                levels = levels.astype(bool)
+            for frame_start, p, sig, n, value in zip(f.tolist(), pos.tolist(),
+                    levels.tolist(), counts.tolist(), values.tolist()):
+                if not n:
+                    continue
+                s = p[0]
+                k = s * stride + key
+                if sig[0] != 0:
+                    yield k, py, s - fh, s + ch, ['INVALID STARTBIT', rxtx, sig[0]]
+                    yield k, ann, s - fh, s + ch, [warn, frame_error]
+                    yield k, py, frame_start, s + ch, ['FRAME', rxtx, (datavalue, False)]
+                    continue
+
+                datavalue = 0
+                frame_valid = True
+                yield k, py, s - fh, s + ch, ['STARTBIT', rxtx, sig[0]]
+                yield k, ann, s - fh, s + ch, [start, ['Start bit', 'Start', 'S']]
+
+                databits = []
+                for i in range(1, min(n, data_bits + 1)):
+                    s = p[i]
+                    if bit_anns:
+                        yield s * stride + key, ann, s - fh, s + ch, [data_bit, ['%d' % sig[i]]]
+                    databits.append([sig[i], s - ih, s + ih])
+                if n <= data_bits:
+                    continue
+
+                startsample = p[1]
+                k = s * stride + key
+                datavalue = value
+                yield k, py, startsample - fh, s + ch, ['DATA', rxtx, (value, databits)]
+                if data_anns:
+                    formatted = d.format_value(value)
+                    if formatted is not None:
+                        yield k, ann, startsample - fh, s + ch, [data_ann, [formatted]]
+                if binary_used:
+                    bdata = value.to_bytes(bw, byteorder='big')
+                    yield k, binary, startsample - fh, s + ch, [line_bin, bdata]
+                    yield k, binary, startsample - fh, s + ch, [both_bin, bdata]
+                    if pcap_packet is not None:
+                        yield k, binary, startsample - fh, s + ch, \
+                            pcap_packet(rxtx, startsample - fh, bdata)
+
+                if packets:
+                    if not packet:
+                        ss_packet = startsample
+                    packet.append(value)
+                    if value == delim or len(packet) == plen:
+                        text = ''
+                        for b in packet:
+                            text += d.format_value(b)
+                            if opt['format'] != 'ascii':
+                                text += ' '
+                        if opt['format'] != 'ascii' and text[-1] == ' ':
+                            text = text[:-1]
+                        yield k, ann, ss_packet - fh, s + ch, [packet_ann, [text]]
+                        packet = []
+
+                i = data_bits + 1
+                if has_parity:
+                    if n <= i:
+                        continue
+                    s = p[i]
+                    k = s * stride + key
+                    if m.parity_ok(self.parity, sig[i], value, data_bits):
+                        yield k, py, s - fh, s + ch, ['PARITYBIT', rxtx, sig[i]]
+                        yield k, ann, s - fh, s + ch, [parity_ok, ['Parity bit', 'Parity', 'P']]
+                    else:
+                        yield k, py, s - fh, s + ch, ['PARITY ERROR', rxtx, (0, 1)]
+                        yield k, ann, s - fh, s + ch, [parity_err,
+                            ['Parity error', 'Parity err', 'PE']]
+                        frame_valid = False
+                    i += 1
+
+                for i in range(i, min(n, i + stop_samples)):
+                    s = p[i]
+                    k = s * stride + key
+                    if sig[i] != 1:
+                        yield k, py, s - fh, s + ch, ['INVALID STOPBIT', rxtx, sig[i]]
+                        yield k, ann, s - fh, s + ch, [warn, frame_error]
+                        frame_valid = False
+                    yield k, py, s - fh, s + ch, ['STOPBIT', rxtx, sig[i]]
+                    yield k, ann, s - fh, s + ch, [stop_ann, ['Stop bit', 'Stop', 'T']]
+
+                if n == self.bits:
+                    yield k, py, frame_start, s + ch, ['FRAME', rxtx, (value, frame_valid)]
+
+    def _edges(self, rxtx, pin, after, idle, starts):
+        '''Breaks and idle periods, from the edges and the frame ends.'''
+        d, m = self.port, self.module
+        py, ann = d.out_python, d.out_ann
+        frame_len, sample_count = self.frame_len, self.sample_count
+        stride, key = self.stride, self.order * 6 + rxtx * 3
+        break_ann = m.Ann.RX_BREAK + self.ann_base + rxtx
+        break_texts = ['Break condition', 'Break', 'Brk', 'B']
+        starts = starts.tolist()
+
+        # Frame ends (kind 0) come before the edges (kind 1) on a sample.
+        done, idle_at = idle
+        samples = np.concatenate((done, pin.transitions))
+        kinds = np.concatenate((np.zeros(len(done), dtype=np.int64),
+            np.ones(len(after), dtype=np.int64)))
+        values = np.concatenate((idle_at, after))
+        order = np.lexsort((kinds, samples))
+        samples, kinds, values = samples[order].tolist(), kinds[order].tolist(), \
+            values[order].tolist()
+        # The end of the capture flushes the idle timeouts before it.
+        samples.append(sample_count)
+        kinds.append(2)
+        values.append(None)
+
+        level = pin.initial ^ self.invert[rxtx]
+        idle_start = break_start = None
+        current, timeout = -1, False
+        for s, kind, value in zip(samples, kinds, values):
+            if s != current:
+                # The idle timeout waited for by the previous sample matched
+                # there too, after its other conditions.
+                if timeout:
+                    if not level:
+                        idle_start = None
+                    elif current - idle_start >= frame_len:
+                        yield current * stride + key + 2, py, idle_start, current, ['IDLE', rxtx, 0]
+                        idle_start = current
+                while idle_start is not None and idle_start + frame_len < s:
+                    if not level:
+                        idle_start = None
+                        break
+                    w = idle_start + frame_len
+                    yield w * stride + key + 2, py, idle_start, w, ['IDLE', rxtx, 0]
+                    idle_start = w
+                current = s
+                timeout = idle_start is not None and idle_start + frame_len == s
+
+            if kind == 0:
+                idle_start = value
+                continue
+            if kind == 2:
+                break
+
+            level = value
+            if not level:
+                break_start = s
+                idle_start = None
+                continue
+            if break_start is not None:
+                if s - break_start >= frame_len:
+                    j = bisect_right(starts, s) - 1
+                    ss = starts[j] if j >= 0 else -1
+                    yield s * stride + key + 1, py, ss, s, ['BREAK', rxtx, 0]
+                    yield s * stride + key + 1, ann, ss, s, [break_ann, break_texts]
+                break_start = None
+            if idle_start is None:
+                idle_start = s
+            if s - idle_start >= frame_len:
+                yield s * stride + key + 1, py, idle_start, s, ['IDLE', rxtx, 0]
+                idle_start = s
+
+class UartPorts:
+    '''
+    The uart_ports decoder's decode(): every port as by UartFrames, with
+    the records of all ports merged in the decoder's port order.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        ports = hosted.decoder.ports
+        self.frames = [UartFrames(hosted, port, order, 6 * len(ports))
+            for order, port in enumerate(ports)]
+
+    @staticmethod
+    def supported(hosted):
+        d = hosted.decoder
+        pins = hosted._pins
+        if not getattr(d, 'samplerate', None) or not pins:
+            return False
+        if not all(_indexed(p) for p in pins.values()):
+            return False
+        try:
+            d.setup_ports()
+        except Exception:
+            # Invalid port options are reported by decode().
+            return False
+        return all(UartFrames.port_supported(port) for port in d.ports)
+
+    def run(self):
+        _merge(self.hosted, [s for f in self.frames for s in f.streams()])
+
+class SpiWords:
+    '''
+    The spi decoder's decode().
+
+    MISO and MOSI are sampled on every sampling edge of the clock while CS#
+    is asserted, the bits of each CS# window are cut into words and packed
+    with one matrix product, and the words are put between the CS# changes
+    that delimit their windows.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = d = hosted.decoder
+        self.module = sys.modules[type(d).__module__]
+        pins = hosted._pins
+        self.clk, self.cs = pins[0], pins.get(3)
+        self.lines = [pins.get(1), pins.get(2)]
+        opt = d.options
+        self.ws = opt['wordsize']
+        self.msb_first = opt['bitorder'] == 'msb-first'
+        # Modes 0 and 3 sample on the rising edge, 1 and 2 on the falling.
+        self.kind = 'r' if opt['cpol'] == opt['cpha'] else 'f'
+        self.active = 0 if opt['cs_polarity'] == 'active-low' else 1
+        self.pcap_used = hosted.IsSubscribed(d.out_binary)
+
+    @staticmethod
+    def supported(hosted):
+        d = hosted.decoder
+        pins = hosted._pins
+        if not hosted._sample_count or 0 not in pins or (1 not in pins and 2 not in pins):
+            return False
+        if not all(_indexed(p) for p in pins.values()):
+            return False
+        opt = d.options
+        ws = opt.get('wordsize')
+        if type(ws) is not int or not 1 <= ws <= 62:
+            return False
+        spi_mode = sys.modules[type(d).__module__].spi_mode
+        return (opt.get('cpol'), opt.get('cpha')) in spi_mode
+
+    def run(self):
+        _put(self.hosted, self._records())
+
+    def _words(self):
+        '''
+        Blocks of complete words, as lists of their windows (the number of
+        CS# changes before them), sample points, MISO and MOSI bits, and
+        MISO and MOSI values.
+        '''
+        ws = self.ws
+        samples, bits = sample_on_edges(self.clk, self.kind, self.lines, self.cs, self.active)
+        if self.cs is not None:
+            windows = self.cs.transitions.searchsorted(samples, 'right')
+        else:
+            windows = np.zeros(len(samples), dtype=np.int64)
+        # Bits left over when CS# changes do not make a word.
+        first = windows.searchsorted(windows, 'left')
+        end = windows.searchsorted(windows, 'right')
+        whole = np.arange(len(samples)) - first < (end - first) // ws * ws
+        samples, bits, windows = samples[whole], bits[whole], windows[whole][::ws]
+
+        weights = np.int64(1) << np.arange(ws, dtype=np.int64)
+        if self.msb_first:
+            weights = weights[::-1]
+        for block in range(0, len(windows), BLOCK_FRAMES):
+            rows = slice(block * ws, (block + BLOCK_FRAMES) * ws)
+            pos = samples[rows].reshape(-1, ws)
+            words = bits[rows].reshape(-1, ws, 2)
+            yield (windows[block:block + BLOCK_FRAMES].tolist(), pos.tolist(),
+                words[:, :, 0].tolist(), words[:, :, 1].tolist(),
+                (words[:, :, 0] @ weights).tolist(), (words[:, :, 1] @ weights).tolist())
+
+    def _records(self):
+        d, m = self.decoder, self.module
+        py, ann, binary, meta = d.out_python, d.out_ann, d.out_binary, d.out_bitrate
+        have_miso, have_mosi = self.lines[0] is not None, self.lines[1] is not None
+        ws, bw, samplerate = self.ws, d.bw, d.samplerate
+        Data = m.Data
+        word_packets = self.pcap_used and self.cs is None
+
+        if self.pcap_used:
+            yield binary, 0, 0, [2, d.pcap.header()]
+        self.ss_transfer = -1
+        if self.cs is None:
+            yield py, 0, 0, ['CS-CHANGE', None, None]
+            changes = []
+        else:
+            level = self.cs.level(0)
+            yield py, 0, 0, ['CS-CHANGE', None, level]
+            if level == self.active:
+                self.ss_transfer = 0
+            changes = self.cs.transitions.tolist()
+        self.misobytes, self.mosibytes = [], []
+
+        done = 0
+        for windows, positions, misos, mosis, so_words, si_words in self._words():
+            for window, p, miso, mosi, so, si in zip(windows, positions, misos, mosis,
+                    so_words, si_words):
+                while done < window:
+                    yield from self._change(changes[done], self.cs.initial ^ ((done + 1) & 1))
+                    done += 1
+
+                # Every bit ends where the next one is sampled, the last one
+                # as far after it as it is after the one before.
+                ends = p[1:] + [2 * p[-1] - p[-2] if ws > 1 else p[0]]
+                ss, es = p[0], ends[-1]
+                so_bits = [[b, s, e] for b, s, e in zip(miso, p, ends)][::-1] \
+                    if have_miso else None
+                si_bits = [[b, s, e] for b, s, e in zip(mosi, p, ends)][::-1] \
+                    if have_mosi else None
+                if not have_miso:
+                    so = None
+                if not have_mosi:
+                    si = None
+
+                if have_miso:
+                    yield binary, ss, es, [0, so.to_bytes(bw, byteorder='big')]
+                if have_mosi:
+                    yield binary, ss, es, [1, si.to_bytes(bw, byteorder='big')]
+                if word_packets:
+                    for packet in d.pcap_packets(ss, [si] if have_mosi else [],
+                            [so] if have_miso else []):
+                        yield binary, ss, es, packet
+                yield py, ss, es, ['BITS', si_bits, so_bits]
+                yield py, ss, es, ['DATA', si, so]
+                if have_miso:
+                    self.misobytes.append(Data(ss=ss, es=es, val=so))
+                    for bit in so_bits:
+                        yield ann, bit[1], bit[2], [2, ['%d' % bit[0]]]
+                if have_mosi:
+                    self.mosibytes.append(Data(ss=ss, es=es, val=si))
+                    for bit in si_bits:
+                        yield ann, bit[1], bit[2], [3, ['%d' % bit[0]]]
+                if have_miso:
+                    yield ann, ss, es, [0, ['%02X' % so]]
+                if have_mosi:
+                    yield ann, ss, es, [1, ['%02X' % si]]
+
+                if samplerate:
+                    elapsed = 1 / float(samplerate)
+                    elapsed *= (p[-1] - ss + 1)
+                    yield meta, ss, p[-1], int(1 / elapsed * ws)
+
+        while done < len(changes):
+            yield from self._change(changes[done], self.cs.initial ^ ((done + 1) & 1))
+            done += 1
+
+    def _change(self, s, cs):
+        '''The records of a CS# change to cs at sample s.'''
+        d = self.decoder
+        py, ann = d.out_python, d.out_ann
+        yield py, s, s, ['CS-CHANGE', 1 - cs, cs]
+        if cs == self.active:
+            self.ss_transfer = s
+            self.misobytes, self.mosibytes = [], []
+        elif self.ss_transfer != -1:
+            if self.lines[0] is not None:
+                yield ann, self.ss_transfer, s, \
+                    [5, [' '.join(format(x.val, '02X') for x in self.misobytes)]]
+            if self.lines[1] is not None:
+                yield ann, self.ss_transfer, s, \
+                    [6, [' '.join(format(x.val, '02X') for x in self.mosibytes)]]
+            yield py, self.ss_transfer, s, ['TRANSFER', self.mosibytes, self.misobytes]
+            if self.pcap_used:
+                for packet in d.pcap_packets(self.ss_transfer,
+                        [x.val for x in self.mosibytes], [x.val for x in self.misobytes]):
+                    yield d.out_binary, self.ss_transfer, s, packet
+
+class ParallelItems:
+    '''
+    The parallel decoder's decode().
+
+    The data lines are sampled on every clock edge (on every data line edge
+    without a clock) at once, the items are packed with a matrix product,
+    and handed to the decoder's handle_bits() in sample order, with the
+    decoder's reset handling for the reset edges in between. At the end
+    the pending item is flushed like the decoder does on EOFError, at the
+    last sample its wait() matched.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+        self.module = sys.modules[type(self.decoder).__module__]
+
+    @staticmethod
+    def supported(hosted):
+        d = hosted.decoder
+        pins = hosted._pins
+        if not hosted._sample_count or not all(_indexed(p) for p in pins.values()):
+            return False
+        opt = d.options
+        if opt.get('clock_edge') not in ('rising', 'falling', 'either'):
+            return False
+        if opt.get('reset_polarity') not in ('low-active', 'high-active'):
+            return False
+        try:
+            d.setup()
+        except Exception:
+            # Missing data channels are reported by decode().
+            return False
+        return True
+
+    def run(self):
+        d, m = self.decoder, self.module
+        pins = self.hosted._pins
+        opt = d.options
+        width = d.num_item_bits
+        data = [None if idx is None else pins[idx] for idx in d.data_indices[:width]]
+
+        clock = pins.get(m.Pin.CLOCK)
+        if clock is not None:
+            edge = {'rising': 'r', 'falling': 'f', 'either': 'e'}[opt['clock_edge']]
+            samples, bits = sample_on_edges(clock, edge, data)
+        else:
+            samples = np.unique(np.concatenate([p.transitions for p in data if p is not None]))
+            bits = levels_on(data, samples)
+
+        # Where the decoder's last wait() matched: a sampled edge or a
+        # reset edge, whether in reset or not.
+        last = int(samples[-1]) if len(samples) else 0
+        reset = pins.get(m.Pin.RESET)
+        if reset is not None and len(reset.transitions):
+            last = max(last, int(reset.transitions[-1]))
+
+        # The decoder is in reset from a reset edge to the active level up
+        # to the next reset edge; the level before the first one is ignored.
+        resets = []
+        if reset is not None and len(reset.transitions):
+            active = 0 if opt['reset_polarity'] == 'low-active' else 1
+            keep = (samples < reset.transitions[0]) | (reset.levels_at(samples) != active)
+            samples, bits = samples[keep], bits[keep]
+            after = (reset.initial + 1 + np.arange(len(reset.transitions))) & 1
+            resets = reset.transitions[after == active].tolist()
+
+        items = (bits @ (np.int64(1) << np.arange(width, dtype=np.int64))).tolist()
+        resets.append(NEVER)
+        r = 0
+        for now, item in zip(samples.tolist(), items):
+            while resets[r] <= now:
+                d.handle_bits(resets[r], None, width)
+                d.flush_word(width)
+                r += 1
+            d.handle_bits(now, item, width)
+        for now in resets[r:-1]:
+            d.handle_bits(now, None, width)
+            d.flush_word(width)
+        d.handle_bits(last, None, width)
+
+class SignatureAnalysis:
+    '''
+    The signature decoder's decode().
+
+    START, STOP and DATA are sampled on every clock edge at once. The gate
+    opens and closes on the few edges where START or STOP change, and the
+    signature of a gate period is the XOR of the register states its 1 bits
+    lead to, looked up in the (periodic) impulse response of the LFSR.
+    '''
+
+    # Register states after a 1 bit and t further 0 bits, for one period.
+    _impulse = None
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+
+    @staticmethod
+    def supported(hosted):
+        pins = hosted._pins
+        if not hosted._sample_count or set(pins) != {0, 1, 2, 3}:
+            return False
+        return all(_indexed(p) for p in pins.values())
+
+    @classmethod
+    def impulse(cls):
+        if cls._impulse is None:
+            states = [0x8000]
+            while True:
+                shiftreg = states[-1]
+                shiftreg = ((bin(shiftreg & 0x0291).count('1') & 1) << 15) | (shiftreg >> 1)
+                if shiftreg == states[0]:
+                    break
+                states.append(shiftreg)
+            cls._impulse = np.array(states, dtype=np.int64)
+        return cls._impulse
+
+    def run(self):
+        d = self.decoder
+        pins = self.hosted._pins
+        opt = d.options
+        start_active = 1 if opt['start_edge'] == 'rising' else 0
+        stop_active = 1 if opt['stop_edge'] == 'rising' else 0
+        annbits = opt['annbits'] == 'yes'
+        clk_edge = 'r' if opt['clk_edge'] == 'rising' else 'f'
+        put = self.hosted.registered_outputs[d.out_ann].put
+
+        samples, levels = sample_on_edges(pins[2], clk_edge, [pins[0], pins[1], pins[3]])
+        count = len(samples)
+        start, stop, data = levels[:, 0], levels[:, 1], levels[:, 2]
+        # The edges where START or STOP turn to their active level.
+        opens = np.flatnonzero((start == start_active) &
+            (np.concatenate(([1 - start_active], start[:-1])) != start_active))
+        closes = np.flatnonzero((stop == stop_active) &
+            (np.concatenate(([1 - stop_active], stop[:-1])) != stop_active))
+        impulse = self.impulse()
+        samples = samples.tolist()
+
+        i = int(opens[0]) if len(opens) else count
+        while i < count:
+            j = closes.searchsorted(i, 'right')
+            j = int(closes[j]) if j < len(closes) else count
+            if annbits:
+                bits = data[i:j].tolist()
+                s = '<{}>'.format(bits[0])
+                put(samples[i - 1] if i else 0, samples[i],
+                    [2, ['START' + s, 'STR' + s, 'S' + s]])
+                for k, bit in enumerate(bits[1:], i + 1):
+                    put(samples[k - 1], samples[k], [bit, [str(bit)]])
+            if j == count:
+                break
+            if annbits:
+                put(samples[j - 1], samples[j], [3, ['STOP', 'STP', 'P']])
+            ones = np.flatnonzero(data[i:j]) + i
+            shiftreg = int(np.bitwise_xor.reduce(impulse[(j - 1 - ones) % len(impulse)])) \
+                if len(ones) else 0
+            d.putsig(samples[i], samples[j], shiftreg)
+            i = opens.searchsorted(j, 'right')
+            i = int(opens[i]) if i < len(opens) else count
+
+class GuessBitrate:
+    '''
+    The guess_bitrate decoder's decode().
+
+    The pulse widths are the differences of all edges of the data line.
+    They are added to the histogram a report's worth at a time, and each
+    report is made from the histogram the decoder would have had then,
+    including the final one over all pulses.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+
+    @staticmethod
+    def supported(hosted):
+        pins = hosted._pins
+        if not hosted._sample_count or set(pins) != {0} or not _indexed(pins[0]):
+            return False
+        return bool(hosted.decoder.samplerate)
+
+    def run(self):
+        d = self.decoder
+        m = sys.modules[type(d).__module__]
+        edges = self.hosted._pins[0].edges('e')
+        edges = edges[edges < self.hosted._sample_count]
+        if not len(edges):
+            return
+        widths = np.diff(edges)
+
+        histogram = {}
+        done, report = 0, m.FIRST_REPORT
+        ss = int(edges[0])
+        while done < len(widths):
+            end = min(report, len(widths))
+            values, counts = np.unique(widths[done:end], return_counts=True)
+            for width, count in zip(values.tolist(), counts.tolist()):
+                histogram[width] = histogram.get(width, 0) + count
+            es = int(edges[end])
+            d.report(ss, es, histogram)
+            ss, done, report = es, end, report * 2
+
+class TimingEdges:
+    '''
+    The timing decoder's decode().
+
+    The times are the differences of the edges, the rolling averages the
+    sums of the times over the averaging window, one offset at a time. The
+    summary's histogram is built from all times at once.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+
+    @staticmethod
+    def supported(hosted):
+        pins = hosted._pins
+        if not hosted._sample_count or set(pins) != {0} or not _indexed(pins[0]):
+            return False
+        return bool(hosted.decoder.samplerate)
+
+    def run(self):
+        d = self.decoder
+        m = sys.modules[type(d).__module__]
+        opt = d.options
+        samplerate = d.samplerate
+        kind = {'rising': 'r', 'falling': 'f'}.get(opt['edge'], 'e')
+        edges = self.hosted._pins[0].edges(kind)
+        edges = edges[edges < self.hosted._sample_count]
+        if not len(edges):
+            return
+        times = np.diff(edges)
+
+        if opt['annotate'] == 'yes':
+            count = len(times)
+            averages = [None] * count
+            window = opt['avg_period']
+            if window > 0:
+                # Edges are distinct, so every time is in the window. The
+                # times of each window are added up in the decoder's order,
+                # which gives the same floats as its sum(). Leading zeros
+                # pad the windows of the first edges.
+                seconds = np.concatenate((np.zeros(window - 1), times / samplerate))
+                sums = np.zeros(count)
+                for i in range(window):
+                    sums += seconds[i:i + count]
+                averages = (sums / np.minimum(np.arange(1, count + 1), window)).tolist()
+            last_t = None
+            for ss, es, sa, t, average in zip(edges[:-1].tolist(), edges[1:].tolist(),
+                    times.tolist(), (times / samplerate).tolist(), averages):
+                d.annotate(ss, es, sa, t, last_t, average)
+                last_t = t
+
+        summary = m.Summary()
+        values, counts = np.unique(times, return_counts=True)
+        summary.update(values.tolist(), counts.tolist())
+        d.put_summary(int(edges[0]), int(edges[-1]), summary)
+
+class PwmPeriods:
+    '''
+    The pwm decoder's decode().
+
+    Periods run from every other edge after the first active edge, so the
+    periods, duty cycles and running averages of all of them are computed
+    at once from the edges.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+
+    @staticmethod
+    def supported(hosted):
+        pins = hosted._pins
+        if not hosted._sample_count or set(pins) != {0} or not _indexed(pins[0]):
+            return False
+        return bool(hosted.decoder.samplerate)
+
+    def run(self):
+        d = self.decoder
+        m = sys.modules[type(d).__module__]
+        pin = self.hosted._pins[0]
+        sample_count = self.hosted._sample_count
+        annotate = d.options['annotate'] == 'yes'
+
+        active = pin.edges('f' if d.options['polarity'] == 'active-low' else 'r')
+        if not len(active) or active[0] >= sample_count:
+            return
+        d.first_samplenum = first = int(active[0])
+        edges = pin.edges('e')
+        edges = edges[(edges >= first) & (edges < sample_count)]
+
+        count = (len(edges) - 1) // 2
+        start, middle, end = edges[0:2 * count:2], edges[1:2 * count:2], edges[2:2 * count + 1:2]
+        periods = end - start
+        ratios = (middle - start) / periods
+        percents = ratios * 100
+        averages = np.cumsum(percents) / np.arange(1, count + 1)
+
+        for ss, es, percent, ratio, period_t, average in zip(start.tolist(), end.tolist(),
+                percents.tolist(), ratios.tolist(), (periods / d.samplerate).tolist(),
+                averages.tolist()):
+            d.ss_block, d.es_block = ss, es
+            if annotate:
+                d.putx([0, ['%f%%' % percent]])
+            d.putb([0, bytes([int(ratio * 256)])])
+            if annotate:
+                d.putp(period_t)
+            d.put(first, es, d.out_average, average)
+
+        duty_cycles, period_summary = m.Summary(), m.Summary()
+        values, counts = np.unique(percents, return_counts=True)
+        duty_cycles.update(values.tolist(), counts.tolist())
+        values, counts = np.unique(periods, return_counts=True)
+        period_summary.update(values.tolist(), counts.tolist())
+        d.put_summary(first, d.es_block, duty_cycles, period_summary)
+
+class JitterEdges:
+    '''
+    The jitter decoder's decode().
+
+    The transitions of both lines are merged and their levels looked up
+    at once. Matching clock and signal edges is left to the decoder's
+    state machine, which is fed the transitions without any wait().
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+
+    @staticmethod
+    def supported(hosted):
+        pins = hosted._pins
+        if not hosted._sample_count or set(pins) != {0, 1}:
+            return False
+        return all(_indexed(p) for p in pins.values()) and bool(hosted.decoder.samplerate)
+
+    def run(self):
+        d = self.decoder
+        clk, sig = self.hosted._pins[0], self.hosted._pins[1]
+        events = np.union1d(clk.edges('e'), sig.edges('e'))
+        events = events[events < self.hosted._sample_count]
+
+        handle = d.handle_transition
+        for sample, c, s in zip(events.tolist(), clk.levels_at(events).tolist(),
+                sig.levels_at(events).tolist()):
+            d.samplenum = sample
+            handle(c, s)
+        d.put_summary()
+
+class NumbersAndState:
+    '''
+    The numbers_and_state decoder's decode(): the bit channels are sampled
+    on every sample the decoder waits for at once, the patterns are packed
+    with a matrix product, and the decoder's handle_pattern() is called for
+    the pattern changes only.
+    '''
+
+    def __init__(self, hosted):
+        self.hosted = hosted
+        self.decoder = hosted.decoder
+        self.module = sys.modules[type(self.decoder).__module__]
+
+    @staticmethod
+    def supported(hosted):
+        d = hosted.decoder
+        pins = hosted._pins
+        if not hosted._sample_count or not all(_indexed(p) for p in pins.values()):
+            return False
+        try:
+            d.setup()
+        except Exception:
+            # Missing bit channels are reported by decode().
+            return False
+        if d.bitcount < 1:
+            return False
+        # An unknown clock edge waits for every sample.
+        return not isinstance(d.wait_cond, dict) or None not in d.wait_cond.values()
+
+    def run(self):
+        d, m = self.decoder, self.module
+        pins = self.hosted._pins
+        # Missing channels, and bits past the last channel, read as 0.
+        bits = [pins.get(ch) for ch in range(m.Pin.BIT_0, m.Pin.BIT_N)][:d.bitcount]
+        weights = np.int64(1) << np.arange(len(bits), dtype=np.int64)
+
+        if isinstance(d.wait_cond, dict):
+            samples, levels = sample_on_edges(pins[m.Pin.CLK], d.wait_cond[m.Pin.CLK], bits)
+        else:
+            samples = np.unique(np.concatenate(
+                [pins[ch].transitions for cond in d.wait_cond for ch in cond]))
+            levels = levels_on(bits, samples)
+        patterns = levels @ weights
+        first = levels_on(bits, [0]) @ weights
+
+        previous = np.concatenate((first, patterns[:-1]))
+        changes = np.flatnonzero(patterns != previous)
+        ss = 0
+        for es, pattern in zip(samples[changes].tolist(), previous[changes].tolist()):
+            d.handle_pattern(ss, es, pattern)
+            ss = es
+
+IMPLEMENTATIONS = {
+    'guess_bitrate': GuessBitrate,
+    'jitter': JitterEdges,
+    'numbers_and_state': NumbersAndState,
+    'parallel': ParallelItems,
+    'pwm': PwmPeriods,
+    'signature': SignatureAnalysis,
+    'spi': SpiWords,
+    'timing': TimingEdges,
+    'uart': UartFrames,
+    'uart_ports': UartPorts,
+}
+
+def implementation(hosted):
+    '''The vectorized implementation for a decoder that has begun, if any applies.'''
+    cls = IMPLEMENTATIONS.get(hosted.id)
+    if cls is None or not cls.supported(hosted):
+        return None
+    return cls(hosted)
@@ -18,7 +18,7 @@
 ##
 
 import sigrokdecode as srd
-from binascii import crc_hqx
+from common.crc import CRC16_IBM_3740
 
 # See tc27xD_um_v2.2.pdf, Table 20-2
 # (name, addr byte count, data byte count)
@@ -143,7 +143,7 @@ class Decoder(srd.Decoder):
         for value_tuple in crc_payload_data:
             crc_payload.append(value_tuple[2])
 
-        calculated_crc = crc_hqx(bytes(crc_payload), 0xFFFF)
+        calculated_crc = CRC16_IBM_3740.calc_bytes(crc_payload)
 
         if calculated_crc == crc_value:
             self.put_ann(ss, es, ann_crc, ['CRC OK'])
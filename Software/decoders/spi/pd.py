@@ -20,6 +20,7 @@
 
 import sigrokdecode as srd
 from collections import namedtuple
+from common.pcap import LINKTYPE_USER1, INBOUND, OUTBOUND, PcapngWriter
 
 Data = namedtuple('Data', ['ss', 'es', 'val'])
 
@@ -123,6 +124,7 @@ class Decoder(srd.Decoder):
     binary = (
         ('miso', 'MISO'),
         ('mosi', 'MOSI'),
+        ('pcap', 'MOSI/MISO pcapng'),
     )
 
     def __init__(self):
@@ -140,6 +142,8 @@ class Decoder(srd.Decoder):
         self.ss_transfer = -1
         self.cs_was_deasserted = False
         self.have_cs = self.have_miso = self.have_mosi = None
+        self.pcap = PcapngWriter(LINKTYPE_USER1, name='spi')
+        self.binary_used = False
 
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
@@ -152,10 +156,21 @@ class Decoder(srd.Decoder):
     def metadata(self, key, value):
        if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            self.pcap.samplerate = value
 
     def putw(self, data):
         self.put(self.ss_block, self.samplenum, self.out_ann, data)
 
+    def pcap_packets(self, sample, mosi, miso):
+        # The MOSI (outbound) and MISO (inbound) words of a CS# transfer,
+        # or of one word without CS#, as one pcapng packet each.
+        packets = []
+        for words, direction in ((mosi, OUTBOUND), (miso, INBOUND)):
+            if words:
+                data = b''.join(w.to_bytes(self.bw, byteorder='big') for w in words)
+                packets.append([2, self.pcap.packet(sample, data, direction)])
+        return packets
+
     def putdata(self):
         # Pass MISO and MOSI bits and then data to the next PD up the stack.
         so = self.misodata if self.have_miso else None
@@ -171,6 +186,10 @@ class Decoder(srd.Decoder):
             ss, es = self.mosibits[-1][1], self.mosibits[0][2]
             bdata = si.to_bytes(self.bw, byteorder='big')
             self.put(ss, es, self.out_binary, [1, bdata])
+        if self.binary_used and not self.have_cs:
+            for packet in self.pcap_packets(ss, [si] if self.have_mosi else [],
+                    [so] if self.have_miso else []):
+                self.put(ss, es, self.out_binary, packet)
 
         self.put(ss, es, self.out_python, ['BITS', si_bits, so_bits])
         self.put(ss, es, self.out_python, ['DATA', si, so])
@@ -287,6 +306,10 @@ class Decoder(srd.Decoder):
                         [6, [' '.join(format(x.val, '02X') for x in self.mosibytes)]])
                 self.put(self.ss_transfer, self.samplenum, self.out_python,
                     ['TRANSFER', self.mosibytes, self.misobytes])
+                if self.binary_used:
+                    for packet in self.pcap_packets(self.ss_transfer,
+                            [x.val for x in self.mosibytes], [x.val for x in self.misobytes]):
+                        self.put(self.ss_transfer, self.samplenum, self.out_binary, packet)
 
             # Reset decoder state when CS# changes (and the CS# pin is used).
             self.reset_decoder_state()
@@ -324,6 +347,9 @@ class Decoder(srd.Decoder):
         if not self.have_miso and not self.have_mosi:
             raise ChannelError('Either MISO or MOSI (or both) pins required.')
         self.have_cs = self.has_channel(3)
+        self.binary_used = self.is_subscribed(self.out_binary)
+        if self.binary_used:
+            self.put(0, 0, self.out_binary, [2, self.pcap.header()])
         if not self.have_cs:
             self.put(0, 0, self.out_python, ['CS-CHANGE', None, None])
 
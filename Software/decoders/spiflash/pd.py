@@ -19,6 +19,7 @@
 
 import sigrokdecode as srd
 import re
+from common.memory import MemoryImage
 from common.srdhelper import SrdIntEnum
 from .lists import *
 
@@ -101,6 +102,8 @@ class Decoder(srd.Decoder):
 
     def reset(self):
         self.device_id = -1
+        # Flash contents as seen in reads, page programs and erases.
+        self.memory = MemoryImage()
         self.on_end_transaction = None
         self.end_current_transaction()
         self.writestate = 0
@@ -126,15 +129,22 @@ class Decoder(srd.Decoder):
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.chip = chips[self.options['chip']]
         self.vendor = self.options['chip'].split('_')[0]
+        self.shown_anns = self.subscribed_annotations()
 
     def putx(self, data):
         # Simplification, most annotations span exactly one SPI byte/packet.
+        if data[0] not in self.shown_anns:
+            return
         self.put(self.ss, self.es, self.out_ann, data)
 
     def putf(self, data):
+        if data[0] not in self.shown_anns:
+            return
         self.put(self.ss_field, self.es_field, self.out_ann, data)
 
     def putc(self, data):
+        if data[0] not in self.shown_anns:
+            return
         self.put(self.ss_cmd, self.es_cmd, self.out_ann, data)
 
     def device(self):
@@ -161,10 +171,11 @@ class Decoder(srd.Decoder):
     def emit_addr_bytes(self, mosi):
         self.addr |= (mosi << ((4 - self.cmdstate) * 8))
         b = ((3 - (self.cmdstate - 2)) * 8) - 1
-        self.putx([Ann.BIT,
-            ['Address bits %d..%d: 0x%02x' % (b, b - 7, mosi),
-             'Addr bits %d..%d: 0x%02x' % (b, b - 7, mosi),
-             'Addr bits %d..%d' % (b, b - 7), 'A%d..A%d' % (b, b - 7)]])
+        if Ann.BIT in self.shown_anns:
+            self.putx([Ann.BIT,
+                ['Address bits %d..%d: 0x%02x' % (b, b - 7, mosi),
+                 'Addr bits %d..%d: 0x%02x' % (b, b - 7, mosi),
+                 'Addr bits %d..%d' % (b, b - 7), 'A%d..A%d' % (b, b - 7)]])
         if self.cmdstate == 2:
             self.ss_field = self.ss
         if self.cmdstate == 4:
@@ -384,6 +395,8 @@ class Decoder(srd.Decoder):
             self.es_cmd = self.es
             d = 'Erase sector %d (0x%06x)' % (self.addr, self.addr)
             self.putc([Ann.SE, [d]])
+            sector = self.chip['sector_size'] or 4096
+            self.memory.erase(self.ss_cmd, self.addr - self.addr % sector, sector)
             # TODO: Max. size depends on chip, check that too if possible.
             if self.addr % 4096 != 0:
                 # Sector addresses must be 4K-aligned (same for all 3 chips).
@@ -393,15 +406,34 @@ class Decoder(srd.Decoder):
             self.cmdstate += 1
 
     def handle_be(self, mosi, miso):
-        pass # TODO
+        if self.cmdstate == 1:
+            # Byte 1: Master sends command ID.
+            self.emit_cmd_byte()
+            if self.writestate == 0:
+                self.putx([Ann.WARN, ['Warning: WREN might be missing']])
+        elif self.cmdstate in (2, 3, 4):
+            # Bytes 2/3/4: Master sends block address (24bits, MSB-first).
+            self.emit_addr_bytes(mosi)
+
+        if self.cmdstate == 4:
+            self.es_cmd = self.es
+            d = 'Erase block %d (0x%06x)' % (self.addr, self.addr)
+            self.putc([Ann.BE, [d]])
+            block = self.chip['block_size'] or 64 * 1024
+            self.memory.erase(self.ss_cmd, self.addr - self.addr % block, block)
+            self.state = None
+        else:
+            self.cmdstate += 1
 
     def handle_ce(self, mosi, miso):
         self.putx([Ann.CE, self.cmd_ann_list()])
+        self.memory.erase_all(self.ss)
         if self.writestate == 0:
             self.putx([Ann.WARN, ['Warning: WREN might be missing']])
 
     def handle_ce2(self, mosi, miso):
         self.putx([Ann.CE2, self.cmd_ann_list()])
+        self.memory.erase_all(self.ss)
         if self.writestate == 0:
             self.putx([Ann.WARN, ['Warning: WREN might be missing']])
 
@@ -501,15 +533,29 @@ class Decoder(srd.Decoder):
     def handle_dsry(self, mosi, miso):
         pass # TODO
 
+    def update_memory(self, idx):
+        if idx in (Ann.READ, Ann.FAST_READ, Ann.READ2X):
+            self.memory.read(self.ss_field, self.addr, self.data)
+        elif idx == Ann.PP:
+            # Page programs wrap around within the page.
+            self.memory.program(self.ss_field, self.addr, self.data,
+                self.chip['page_size'])
+        elif idx in (Ann.WRITE1, Ann.WRITE2):
+            self.memory.write(self.ss_field, self.addr, self.data,
+                self.chip['page_size'])
+
     def output_data_block(self, label, idx):
         # Print accumulated block of data
         # (called on CS# de-assert via self.on_end_transaction callback).
         self.es_cmd = self.es # End on the CS# de-assert sample.
+        self.update_memory(idx)
+        self.putf([Ann.FIELD, ['%s (%d bytes)' % (label, len(self.data))]])
+        if idx not in self.shown_anns:
+            return
         if self.options['format'] == 'hex':
             s = ' '.join([('%02x' % b) for b in self.data])
         else:
             s = ''.join(map(chr, self.data))
-        self.putf([Ann.FIELD, ['%s (%d bytes)' % (label, len(self.data))]])
         self.putc([idx, ['%s (addr 0x%06x, %d bytes): %s' % \
                    (cmds[self.state][1], self.addr, len(self.data), s)]])
 
@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from common.wav import WavStream
 
 MAX_CHANNELS = 8
 
@@ -43,6 +44,9 @@ class Decoder(srd.Decoder):
     )
     annotations = tuple(('ch%d' % i, 'Ch%d' % i) for i in range(MAX_CHANNELS))
     annotation_rows = tuple(('ch%d-vals' % i, 'Ch%d' % i, (i,)) for i in range(MAX_CHANNELS))
+    binary = (
+        ('wav', 'WAV file'),
+    )
 
     def __init__(self):
         self.reset()
@@ -58,17 +62,35 @@ class Decoder(srd.Decoder):
         self.lastframe = 0
         self.data = 0
         self.ss_block = None
+        self.wav = WavStream()
+        self.frame_values = []
+        self.ss_frame = None
+        self.binary_used = False
 
-    def metdatadata(self, key, value):
+    def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            self.wav.samplerate = value
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.bitdepth = self.options['bps']
         self.edge = self.options['edge']
 
+    def putwav(self, data):
+        if data:
+            self.put(self.ss_frame, self.samplenum, self.out_binary, [0, data])
+
     def decode(self):
+        self.binary_used = self.is_subscribed(self.out_binary)
+        try:
+            self.decode_frames()
+        except EOFError:
+            self.putwav(self.wav.flush())
+            raise
+
+    def decode_frames(self):
         while True:
             # Wait for edge of clock (sample on rising/falling edge).
             clock, frame, data = self.wait({0: self.edge[0]})
@@ -99,6 +121,8 @@ class Decoder(srd.Decoder):
                     self.put(self.ss_block, self.samplenum, self.out_ann,
                              [ch, ['%s: %s' % (c1, v), '%s: %s' % (c2, v),
                                    '%s: %s' % (c3, v)]])
+                    if self.binary_used:
+                        self.frame_values.append(self.data)
                     self.data = 0
                     self.ss_block = self.samplenum
                     self.samplecount += 1
@@ -107,6 +131,12 @@ class Decoder(srd.Decoder):
             # Note, frame may be a single clock, or active for the first
             # sample in the frame.
             if frame != self.lastframe and frame == 1:
+                # The slots of a frame are the channels of one WAV frame.
+                if self.frame_values:
+                    self.putwav(self.wav.frame(self.ss_frame, self.frame_values,
+                        self.bitdepth))
+                self.frame_values = []
+                self.ss_frame = self.samplenum
                 self.channel = 0
                 self.bitcount = 0
                 self.data = 0
@@ -20,6 +20,18 @@
 
 import sigrokdecode as srd
 from collections import deque
+from common.stats import Summary, summary_texts
+
+'''
+OUTPUT_PYTHON format:
+
+Packet:
+['SUMMARY', <stats>]
+
+Put once, at the end of the input, spanning all edges. <stats> is a dict
+with the statistics of the times between the edges, in seconds: 'count',
+'min', 'max', 'mean', 'stddev' and the percentiles 'p50', 'p90', 'p99'.
+'''
 
 class SamplerateError(Exception):
     pass
@@ -93,7 +105,7 @@ class Pin:
     (DATA,) = range(1)
 
 class Ann:
-    (TIME, TERSE, AVG, DELTA,) = range(4)
+    (TIME, TERSE, AVG, DELTA, SUMMARY,) = range(5)
 
 class Decoder(srd.Decoder):
     api_version = 3
@@ -103,7 +115,7 @@ class Decoder(srd.Decoder):
     desc = 'Calculate time between edges.'
     license = 'gplv2+'
     inputs = ['logic']
-    outputs = []
+    outputs = ['timing']
     tags = ['Clock/timing', 'Util']
     channels = (
         {'id': 'data', 'name': 'Data', 'desc': 'Data line'},
@@ -113,11 +125,13 @@ class Decoder(srd.Decoder):
         ('terse', 'Terse'),
         ('average', 'Average'),
         ('delta', 'Delta'),
+        ('summary', 'Summary'),
     )
     annotation_rows = (
         ('times', 'Times', (Ann.TIME, Ann.TERSE,)),
         ('averages', 'Averages', (Ann.AVG,)),
         ('deltas', 'Deltas', (Ann.DELTA,)),
+        ('summaries', 'Summary', (Ann.SUMMARY,)),
     )
     options = (
         { 'id': 'avg_period', 'desc': 'Averaging period', 'default': 100 },
@@ -129,6 +143,8 @@ class Decoder(srd.Decoder):
           'default': 'full', 'values': ('full', 'terse-auto',
           'terse-s', 'terse-ms', 'terse-us', 'terse-ns', 'terse-ps',
           'samples') },
+        { 'id': 'annotate', 'desc': 'Annotate every edge',
+          'default': 'yes', 'values': ('yes', 'no') },
     )
 
     def __init__(self):
@@ -143,52 +159,77 @@ class Decoder(srd.Decoder):
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+
+    def annotate(self, ss, es, sa, t, last_t, average):
+        # The annotations of the time between two edges, given the time
+        # before and the (rolling) average.
+        fmt = self.options['format']
+        if fmt == 'full':
+            cls, txt = Ann.TIME, [normalize_time(t)]
+        elif fmt == 'samples':
+            cls, txt = Ann.TERSE, terse_times(sa, fmt)
+        else:
+            cls, txt = Ann.TERSE, terse_times(t, fmt)
+        if txt:
+            self.put(ss, es, self.out_ann, [cls, txt])
+
+        if average is not None:
+            cls, txt = Ann.AVG, normalize_time(average)
+            self.put(ss, es, self.out_ann, [cls, [txt]])
+        if last_t and self.options['delta'] == 'yes':
+            cls, txt = Ann.DELTA, normalize_time(t - last_t)
+            self.put(ss, es, self.out_ann, [cls, [txt]])
+
+    def put_summary(self, ss, es, summary):
+        stats = summary.stats(self.samplerate)
+        if stats is None:
+            return
+        self.put(ss, es, self.out_ann, [Ann.SUMMARY, summary_texts('Times', stats)])
+        self.put(ss, es, self.out_python, ['SUMMARY', stats])
 
     def decode(self):
         if not self.samplerate:
             raise SamplerateError('Cannot decode without samplerate.')
         edge = self.options['edge']
         avg_period = self.options['avg_period']
-        delta = self.options['delta'] == 'yes'
-        fmt = self.options['format']
-        ss = None
+        annotate = self.options['annotate'] == 'yes'
+        first = ss = None
         last_n = deque()
         last_t = None
-        while True:
-            if edge == 'rising':
-                pin = self.wait({Pin.DATA: 'r'})
-            elif edge == 'falling':
-                pin = self.wait({Pin.DATA: 'f'})
-            else:
-                pin = self.wait({Pin.DATA: 'e'})
-
-            if not ss:
-                ss = self.samplenum
-                continue
-            es = self.samplenum
-            sa = es - ss
-            t = sa / self.samplerate
-
-            if fmt == 'full':
-                cls, txt = Ann.TIME, [normalize_time(t)]
-            elif fmt == 'samples':
-                cls, txt = Ann.TERSE, terse_times(sa, fmt)
-            else:
-                cls, txt = Ann.TERSE, terse_times(t, fmt)
-            if txt:
-                self.put(ss, es, self.out_ann, [cls, txt])
-
-            if avg_period > 0:
-                if t > 0:
-                    last_n.append(t)
-                if len(last_n) > avg_period:
-                    last_n.popleft()
-                average = sum(last_n) / len(last_n)
-                cls, txt = Ann.AVG, normalize_time(average)
-                self.put(ss, es, self.out_ann, [cls, [txt]])
-            if last_t and delta:
-                cls, txt = Ann.DELTA, normalize_time(t - last_t)
-                self.put(ss, es, self.out_ann, [cls, [txt]])
-
-            last_t = t
-            ss = es
+        average = None
+        summary = Summary()
+        try:
+            while True:
+                if edge == 'rising':
+                    pin = self.wait({Pin.DATA: 'r'})
+                elif edge == 'falling':
+                    pin = self.wait({Pin.DATA: 'f'})
+                else:
+                    pin = self.wait({Pin.DATA: 'e'})
+
+                if not ss:
+                    first = ss = self.samplenum
+                    continue
+                es = self.samplenum
+                sa = es - ss
+                summary.add(sa)
+                if not annotate:
+                    ss = es
+                    continue
+                t = sa / self.samplerate
+
+                if avg_period > 0:
+                    if t > 0:
+                        last_n.append(t)
+                    if len(last_n) > avg_period:
+                        last_n.popleft()
+                    average = sum(last_n) / len(last_n)
+                self.annotate(ss, es, sa, t, last_t, average)
+
+                last_t = t
+                ss = es
+        except EOFError:
+            # The statistics of the whole input.
+            self.put_summary(first, ss, summary)
+            raise
@@ -0,0 +1,34 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''
+Several UART ports (up to 8 RX/TX pairs) decoded by one decoder instance.
+
+Each port has its own baud rate and frame format (e.g. 8N1, 7E1, 8O2) and
+is decoded exactly like the 'uart' decoder does, but all ports are handled
+in a single pass over the capture instead of one pass per 'uart' instance.
+
+Port N puts its frames to the OUTPUT_PYTHON output 'uartN', in the format
+of the 'uart' decoder. Decoders taking 'uart' (midi, dmx512, modbus, ...)
+can be stacked on a port where the host maps the input to another output
+name: sigrokhost does (the sources of a DecodingBranch, or 'midi@uart2'
+on its command line). Hosts that stack by matching input and output names,
+like the desktop application, cannot stack those decoders on the ports;
+use a 'uart' decoder for each port there.
+'''
+
+from .pd import Decoder
@@ -0,0 +1,204 @@
+##
+## This file is part of the libsigrokdecode project.
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import re
+import sigrokdecode as srd
+from common.uart import RX, TX, Ann, Bin, Port
+
+'''
+OUTPUT_PYTHON format:
+
+Port N puts to the output 'uartN', using the packets of the 'uart' decoder:
+[<ptype>, <rxtx>, <pdata>]
+
+See the 'uart' decoder for the list of <ptype>s and their <pdata> values.
+The <rxtx> field is 0 for RX packets, 1 for TX packets of the port.
+'''
+
+PORTS = 8
+
+FRAMES = ('8N1', '8E1', '8O1', '8N2', '8E2', '8O2', '7N1', '7E1', '7O1', '9N1', '5N1', '6N1')
+
+PARITIES = {'N': 'none', 'E': 'even', 'O': 'odd', 'S': 'zero', 'M': 'one'}
+
+def parse_frame(frame):
+    # Split a frame format like '8N1' or '7E1.5' into data bits, parity
+    # type and stop bits.
+    m = re.match(r'^([5-9])([NEOSM])(0|0\.5|1|1\.5|2)$', str(frame).strip().upper())
+    if not m:
+        raise OptionError('Invalid frame format: {}'.format(frame))
+    return int(m.group(1)), PARITIES[m.group(2)], float(m.group(3))
+
+class SamplerateError(Exception):
+    pass
+
+class ChannelError(Exception):
+    pass
+
+class OptionError(Exception):
+    pass
+
+# Annotation classes of one port, port N uses N * ANN_PER_PORT + <class>,
+# with the classes of common.uart.Ann up to the packets (which the ports
+# do not assemble).
+ANN_PER_PORT = Ann.RX_PACKET
+
+# Binary classes of one port, port N uses N * BIN_PER_PORT + <class>, with
+# the classes of common.uart.Bin up to the pcapng stream (which the ports
+# do not have).
+BIN_PER_PORT = Bin.PCAP
+
+def port_channels():
+    return tuple(ch for p in range(1, PORTS + 1) for ch in (
+        {'id': 'rx%d' % p, 'name': 'RX%d' % p, 'desc': 'Port %d receive line' % p},
+        {'id': 'tx%d' % p, 'name': 'TX%d' % p, 'desc': 'Port %d transmit line' % p},
+    ))
+
+def port_options():
+    return tuple(o for p in range(1, PORTS + 1) for o in (
+        {'id': 'baudrate%d' % p, 'desc': 'Port %d baud rate' % p, 'default': 115200},
+        {'id': 'frame%d' % p, 'desc': 'Port %d frame format' % p, 'default': '8N1',
+            'values': FRAMES},
+    ))
+
+def port_annotations():
+    classes = (
+        ('rx-data', 'RX data'),
+        ('tx-data', 'TX data'),
+        ('rx-start', 'RX start bit'),
+        ('tx-start', 'TX start bit'),
+        ('rx-parity-ok', 'RX parity OK bit'),
+        ('tx-parity-ok', 'TX parity OK bit'),
+        ('rx-parity-err', 'RX parity error bit'),
+        ('tx-parity-err', 'TX parity error bit'),
+        ('rx-stop', 'RX stop bit'),
+        ('tx-stop', 'TX stop bit'),
+        ('rx-warning', 'RX warning'),
+        ('tx-warning', 'TX warning'),
+        ('rx-data-bit', 'RX data bit'),
+        ('tx-data-bit', 'TX data bit'),
+        ('rx-break', 'RX break'),
+        ('tx-break', 'TX break'),
+    )
+    return tuple(('p%d-%s' % (p, i), 'Port %d %s' % (p, d))
+        for p in range(1, PORTS + 1) for i, d in classes)
+
+def port_annotation_rows():
+    rows = (
+        ('rx-data-bits', 'RX bits', (Ann.RX_DATA_BIT,)),
+        ('rx-data-vals', 'RX data', (Ann.RX_DATA, Ann.RX_START, Ann.RX_PARITY_OK, Ann.RX_PARITY_ERR, Ann.RX_STOP)),
+        ('rx-warnings', 'RX warnings', (Ann.RX_WARN, Ann.RX_BREAK)),
+        ('tx-data-bits', 'TX bits', (Ann.TX_DATA_BIT,)),
+        ('tx-data-vals', 'TX data', (Ann.TX_DATA, Ann.TX_START, Ann.TX_PARITY_OK, Ann.TX_PARITY_ERR, Ann.TX_STOP)),
+        ('tx-warnings', 'TX warnings', (Ann.TX_WARN, Ann.TX_BREAK)),
+    )
+    base = lambda p: (p - 1) * ANN_PER_PORT
+    return tuple(('p%d-%s' % (p, i), 'Port %d %s' % (p, d), tuple(base(p) + c for c in cls))
+        for p in range(1, PORTS + 1) for i, d, cls in rows)
+
+def port_binary():
+    return tuple(b for p in range(1, PORTS + 1) for b in (
+        ('p%d-rx' % p, 'Port %d RX dump' % p),
+        ('p%d-tx' % p, 'Port %d TX dump' % p),
+        ('p%d-rxtx' % p, 'Port %d RX/TX dump' % p),
+    ))
+
+class Decoder(srd.Decoder):
+    api_version = 3
+    id = 'uart_ports'
+    name = 'UART ports'
+    longname = 'Universal Asynchronous Receiver/Transmitter ports'
+    desc = 'Several asynchronous serial ports, decoded in one pass.'
+    license = 'gplv2+'
+    inputs = ['logic']
+    outputs = ['uart%d' % p for p in range(1, PORTS + 1)]
+    tags = ['Embedded/industrial']
+    optional_channels = port_channels()
+    options = port_options() + (
+        {'id': 'bit_order', 'desc': 'Bit order', 'default': 'lsb-first',
+            'values': ('lsb-first', 'msb-first')},
+        {'id': 'format', 'desc': 'Data format', 'default': 'hex',
+            'values': ('ascii', 'dec', 'hex', 'oct', 'bin')},
+        {'id': 'invert_rx', 'desc': 'Invert RX', 'default': 'no',
+            'values': ('yes', 'no')},
+        {'id': 'invert_tx', 'desc': 'Invert TX', 'default': 'no',
+            'values': ('yes', 'no')},
+        {'id': 'sample_point', 'desc': 'Sample point (%)', 'default': 50},
+    )
+    annotations = port_annotations()
+    annotation_rows = port_annotation_rows()
+    binary = port_binary()
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.samplerate = None
+        self.ports = []
+
+    def start(self):
+        # One OUTPUT_PYTHON per port, in the order of the outputs.
+        self.out_pythons = [self.register(srd.OUTPUT_PYTHON) for _ in range(PORTS)]
+        self.out_binary = self.register(srd.OUTPUT_BINARY)
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+
+    def metadata(self, key, value):
+        if key == srd.SRD_CONF_SAMPLERATE:
+            self.samplerate = value
+
+    def setup_ports(self):
+        # A common.uart port for each RX/TX pair with at least one line
+        # assigned.
+        self.ports = []
+        opt = self.options
+        for p in range(PORTS):
+            channels = (p * 2 + RX, p * 2 + TX)
+            if not any(self.has_channel(ch) for ch in channels):
+                continue
+            data_bits, parity, stop_bits = parse_frame(opt['frame%d' % (p + 1)])
+            # The options of the 'uart' decoder for this port.
+            options = {
+                'baudrate': opt['baudrate%d' % (p + 1)],
+                'data_bits': data_bits,
+                'parity': parity,
+                'stop_bits': stop_bits,
+                'bit_order': opt['bit_order'],
+                'format': opt['format'],
+                'invert_rx': opt['invert_rx'],
+                'invert_tx': opt['invert_tx'],
+                'sample_point': opt['sample_point'],
+                'rx_packet_delim': -1, 'tx_packet_delim': -1,
+                'rx_packet_len': -1, 'tx_packet_len': -1,
+            }
+            self.ports.append(Port(self, options, self.out_pythons[p], channels,
+                p * ANN_PER_PORT, p * BIN_PER_PORT))
+
+    def decode(self):
+        if not self.samplerate:
+            raise SamplerateError('Cannot decode without samplerate.')
+
+        self.setup_ports()
+        if not self.ports:
+            raise ChannelError('Need at least one RX or TX pin.')
+
+        while True:
+            conds = []
+            for port in self.ports:
+                port.conditions(conds)
+            pins = self.wait(conds)
+            for port in self.ports:
+                port.inspect(pins, self.matched)
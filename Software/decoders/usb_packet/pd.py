@@ -19,6 +19,8 @@
 ##
 
 import sigrokdecode as srd
+from common.crc import CRC5_USB, CRC16_USB
+from common.pcap import LINKTYPE_USB_2_0, PcapngWriter
 
 '''
 OUTPUT_PYTHON format:
@@ -143,35 +145,6 @@ def bitstr_to_num(bitstr):
     l.reverse()
     return int(''.join(l), 2)
 
-def reverse_number(num, count):
-    out = list(count * '0')
-    for i in range(0, count):
-        if num >> i & 1:
-            out[i] = '1'
-    return int(''.join(out), 2)
-
-def calc_crc5(bitstr):
-    poly5 = 0x25
-    crc5 = 0x1f
-    for bit in bitstr:
-        crc5 <<= 1
-        if int(bit) != (crc5 >> 5):
-            crc5 ^= poly5
-        crc5 &= 0x1f
-    crc5 ^= 0x1f
-    return reverse_number(crc5, 5)
-
-def calc_crc16(bitstr):
-    poly16 = 0x18005
-    crc16 = 0xffff
-    for bit in bitstr:
-        crc16 <<= 1
-        if int(bit) != (crc16 >> 16):
-            crc16 ^= poly16
-        crc16 &= 0xffff
-    crc16 ^= 0xffff
-    return reverse_number(crc16, 16)
-
 class Decoder(srd.Decoder):
     api_version = 3
     id = 'usb_packet'
@@ -221,6 +194,9 @@ class Decoder(srd.Decoder):
         ('fields', 'Packet fields', tuple(range(10 + 1))),
         ('packet', 'Packets', tuple(range(11, 28 + 1))),
     )
+    binary = (
+        ('pcap', 'Packets (pcapng)'),
+    )
 
     def __init__(self):
         self.reset()
@@ -232,6 +208,8 @@ class Decoder(srd.Decoder):
         self.ss = self.es = None
         self.ss_packet = self.es_packet = None
         self.state = 'WAIT FOR SOP'
+        self.pcap = PcapngWriter(LINKTYPE_USB_2_0, name='usb')
+        self.binary_used = None
 
     def putpb(self, data):
         self.put(self.ss, self.es, self.out_python, data)
@@ -245,9 +223,30 @@ class Decoder(srd.Decoder):
     def putp(self, data):
         self.put(self.ss_packet, self.es_packet, self.out_ann, data)
 
+    def putpcap(self):
+        # The packet from its PID on, as whole bytes (LSB-first on the wire).
+        if self.binary_used is None:
+            # Stacked decoders have no decode() of their whole input, so
+            # the header goes out with the first packet.
+            self.binary_used = self.is_subscribed(self.out_binary)
+            if self.binary_used:
+                self.put(0, 0, self.out_binary, [0, self.pcap.header()])
+        if not self.binary_used:
+            return
+        packet = ''.join(bit for bit, _, _ in self.bits[8:])
+        data = bytes(bitstr_to_num(packet[i:i + 8]) for i in range(0, len(packet) - 7, 8))
+        if data:
+            self.put(self.ss_packet, self.es_packet, self.out_binary,
+                [0, self.pcap.packet(self.ss_packet, data)])
+
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_binary = self.register(srd.OUTPUT_BINARY)
+
+    def metadata(self, key, value):
+        if key == srd.SRD_CONF_SAMPLERATE:
+            self.pcap.samplerate = value
 
     def handle_packet(self):
         packet = ''
@@ -317,7 +316,7 @@ class Decoder(srd.Decoder):
 
             # Bits[27:31]: CRC5
             crc5 = bitstr_to_num(packet[27:31 + 1])
-            crc5_calc = calc_crc5(packet[16:27])
+            crc5_calc = CRC5_USB.calc_bits(packet[16:27])
             self.ss, self.es = self.bits[27][1], self.bits[31][2]
             if crc5 == crc5_calc:
                 self.putpb(['CRC5', crc5])
@@ -349,7 +348,7 @@ class Decoder(srd.Decoder):
 
             # Bits[packetlen-16:packetlen]: CRC16
             crc16 = bitstr_to_num(packet[-16:])
-            crc16_calc = calc_crc16(packet[16:-16])
+            crc16_calc = CRC16_USB.calc_bits(packet[16:-16])
             self.ss, self.es = self.bits[-16][1], self.bits[-1][2]
             if crc16 == crc16_calc:
                 self.putpb(['CRC16', crc16])
@@ -391,6 +390,7 @@ class Decoder(srd.Decoder):
             elif ptype == 'EOP' or ptype == 'ERR':
                 self.es_packet = es
                 self.handle_packet()
+                self.putpcap()
                 self.packet, self.packet_summary = [], ''
                 self.bits, self.state = [], 'WAIT FOR SOP'
             else:
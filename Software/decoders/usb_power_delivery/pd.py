@@ -21,7 +21,7 @@
 
 import sigrokdecode as srd
 import struct
-import zlib   # for crc32
+from common.crc import CRC32_ISO_HDLC
 
 # BMC encoding with a 600kHz datarate
 UI_US = 1000000/600000.0
@@ -432,7 +432,7 @@ class Decoder(srd.Decoder):
     def compute_crc32(self):
         bdata = struct.pack('<H'+'I'*len(self.data), self.head & 0xffff,
                             *tuple([d & 0xffffffff for d in self.data]))
-        return zlib.crc32(bdata)
+        return CRC32_ISO_HDLC.calc_bytes(bdata)
 
     def rec_sym(self, i, sym):
         self.putx(i, i+5, [7, SYM_NAME[sym]])
@@ -19,6 +19,7 @@
 
 import sigrokdecode as srd
 import struct
+from common.pcap import LINKTYPE_USB_LINUX_MMAPPED, PcapngWriter
 
 class SamplerateError(Exception):
     pass
@@ -98,16 +99,6 @@ class pcap_usb_pkt():
     def packet(self):
         return bytes(self.header) + bytes(self.data)
 
-    def record_header(self):
-        # See https://wiki.wireshark.org/Development/LibpcapFileFormat.
-        (secs, usecs) = self.timestamp
-        h  = struct.pack('>I', secs) # TS seconds
-        h += struct.pack('>I', usecs) # TS microseconds
-        # No truncation, so both lengths are the same.
-        h += struct.pack('>I', len(self)) # Captured len (usb hdr + data)
-        h += struct.pack('>I', len(self)) # Original len
-        return h
-
     def __len__(self):
         return 64 + len(self.data)
 
@@ -139,7 +130,7 @@ class Decoder(srd.Decoder):
         ('errors', 'Errors', (4,)),
     )
     binary = (
-        ('pcap', 'PCAP format'),
+        ('pcap', 'pcapng format'),
     )
 
     def __init__(self):
@@ -155,6 +146,9 @@ class Decoder(srd.Decoder):
         self.transaction_ep = None
         self.transaction_addr = None
         self.wrote_pcap_header = False
+        # Linux usbmon format, see Documentation/usb/usbmon.txt. Its
+        # headers are big-endian, as is the section they are written to.
+        self.pcap = PcapngWriter(LINKTYPE_USB_LINUX_MMAPPED, name='usb')
 
     def putr(self, ss, es, data):
         self.put(ss, es, self.out_ann, data)
@@ -162,24 +156,12 @@ class Decoder(srd.Decoder):
     def putb(self, ts, data):
         self.put(ts, ts, self.out_binary, data)
 
-    def pcap_global_header(self):
-        # See https://wiki.wireshark.org/Development/LibpcapFileFormat.
-        h  = b'\xa1\xb2\xc3\xd4' # Magic, indicate microsecond ts resolution
-        h += b'\x00\x02'         # Major version 2
-        h += b'\x00\x04'         # Minor version 4
-        h += b'\x00\x00\x00\x00' # Correction vs. UTC, seconds
-        h += b'\x00\x00\x00\x00' # Timestamp accuracy
-        h += b'\xff\xff\xff\xff' # Max packet len
-        # LINKTYPE_USB_LINUX_MMAPPED 220
-        # Linux usbmon format, see Documentation/usb/usbmon.txt.
-        h += b'\x00\x00\x00\xdc' # Link layer
-        return h
-
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
             if self.samplerate:
                 self.secs_per_sample = float(1) / float(self.samplerate)
+            self.pcap.samplerate = value
 
     def start(self):
         self.out_binary = self.register(srd.OUTPUT_BINARY)
@@ -264,7 +246,7 @@ class Decoder(srd.Decoder):
 
     def write_pcap_header(self):
         if not self.wrote_pcap_header:
-            self.put(0, 0, self.out_binary, [0, self.pcap_global_header()])
+            self.put(0, 0, self.out_binary, [0, self.pcap.header()])
             self.wrote_pcap_header = True
 
     def request_summary(self, request):
@@ -294,8 +276,7 @@ class Decoder(srd.Decoder):
             # Issue PCAP 'SUBMIT' packet.
             ts = self.ts_from_samplenum(ss)
             pkt = pcap_usb_pkt(request, ts, True)
-            self.putb(ss, [0, pkt.record_header()])
-            self.putb(ss, [0, pkt.packet()])
+            self.putb(ss, [0, self.pcap.packet(ss, pkt.packet())])
 
         if request_end == 1:
             # Write annotation.
@@ -312,8 +293,7 @@ class Decoder(srd.Decoder):
             # Issue PCAP 'COMPLETE' packet.
             ts = self.ts_from_samplenum(es)
             pkt = pcap_usb_pkt(request, ts, False)
-            self.putb(ss, [0, pkt.record_header()])
-            self.putb(ss, [0, pkt.packet()])
+            self.putb(ss, [0, self.pcap.packet(es, pkt.packet())])
             del self.request[(addr, ep)]
 
     def decode(self, ss, es, data):
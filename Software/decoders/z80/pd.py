@@ -19,7 +19,7 @@
 
 import sigrokdecode as srd
 from functools import reduce
-from .tables import instr_table_by_prefix
+from .tables import instr_array_by_prefix
 import string
 
 class Ann:
@@ -134,9 +134,15 @@ class Decoder(srd.Decoder):
         self.instr_len  = 0
 
     def decode(self):
+        # The bus cycle only changes on edges of the control strobes. The
+        # data is taken from the last sample of a cycle, so while a cycle
+        # is active, edges on the data bus are waited for as well.
+        strobes = [{pin: 'e'} for pin in (Pin.M1, Pin.RD, Pin.WR, Pin.MREQ, Pin.IORQ)
+                   if self.has_channel(pin)]
+        in_cycle = strobes + [{pin: 'e'} for pin in range(Pin.D0, Pin.D7 + 1)]
+
+        pins = self.wait()
         while True:
-            # TODO: Come up with more appropriate self.wait() conditions.
-            pins = self.wait()
             cycle = Cycle.NONE
             if pins[Pin.MREQ] != 1: # default to asserted
                 if pins[Pin.RD] == 0:
@@ -162,6 +168,8 @@ class Decoder(srd.Decoder):
                     self.on_cycle_trans()
             self.prev_cycle = cycle
 
+            pins = self.wait(in_cycle if cycle != Cycle.NONE else strobes)
+
     def on_cycle_begin(self, bus_addr):
         if self.pend_addr is not None:
             self.put_text(self.addr_start, Ann.ADDR,
@@ -261,9 +269,9 @@ class Decoder(srd.Decoder):
         return self.state_OPCODE
 
     def state_OPCODE(self):
-        (table, self.arg_reg) = instr_table_by_prefix[self.op_prefix]
+        (table, self.arg_reg) = instr_array_by_prefix[self.op_prefix]
         self.op_prefix = 0
-        instruction = table.get(self.pend_data, None)
+        instruction = table[self.pend_data]
         if instruction is None:
             self.mnemonic = 'Invalid instruction'
             self.ann_dasm = Ann.WARN
@@ -1081,3 +1081,10 @@ instr_table_by_prefix = {
     0xDDCB: (index_bit_instructions, 'IX'),
     0xFDCB: (index_bit_instructions, 'IY')
 }
+
+# The same tables as tuples of 256 entries indexed by opcode, None marking
+# an invalid instruction.
+instr_array_by_prefix = {
+    prefix: (tuple(table.get(opcode) for opcode in range(256)), reg)
+    for prefix, (table, reg) in instr_table_by_prefix.items()
+}